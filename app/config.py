@@ -7,8 +7,21 @@ class Config:
     # Nơi chứa dữ liệu
     DATA_DIR = os.path.join(BASE_DIR, "data")
     DB_PATH = os.path.join(DATA_DIR, "database", "attendance.db")
-    ENCODINGS_PATH = os.path.join(DATA_DIR, "encodings", "face_encodings.pkl")
+    ENCODINGS_PATH = os.path.join(DATA_DIR, "encodings", "face_encodings.pkl")  # Định dạng cũ (chỉ dùng để migrate)
+    GALLERY_DIR = os.path.join(DATA_DIR, "encodings", "gallery")
+    INDEX_PATH = os.path.join(DATA_DIR, "encodings", "face_index.npz")
     EXPORT_DIR = os.path.join(BASE_DIR, "exports") 
+
+    # Kết nối SQLite (mỗi luồng 1 kết nối giữ lâu dài)
+    DB_JOURNAL_MODE = "WAL"      # Đọc (xuất báo cáo, danh sách SV) không chặn ghi điểm danh
+    DB_SYNCHRONOUS = "NORMAL"    # Với WAL: không fsync mỗi commit, vẫn an toàn khi app crash
+    DB_BUSY_TIMEOUT_MS = 5000    # Chờ khóa ghi tối đa N ms trước khi báo "database is locked"
+    DB_STATEMENT_CACHE = 128     # Số câu lệnh đã prepare giữ lại mỗi kết nối
+    # Ghi điểm danh nền (write-behind): gom lượt check-in, commit theo lô; journal để không mất khi crash
+    CHECKIN_JOURNAL_PATH = os.path.join(DATA_DIR, "database", "checkin.journal")
+    CHECKIN_BATCH_SIZE = 32      # Đủ N lượt chờ -> commit ngay
+    CHECKIN_FLUSH_INTERVAL = 0.5 # Lượt cũ nhất chờ quá N giây -> commit
+    EXPORT_CHUNK_ROWS = 5000     # Xuất dữ liệu: số dòng đọc / ghi mỗi lô (RAM tỉ lệ với số này, không với lịch sử)
     
     # Nơi chứa các file thuật toán bổ trợ  
     MODELS_DIR = os.path.join(BASE_DIR, "models")
@@ -17,20 +30,102 @@ class Config:
     
     # --- CẤU HÌNH CAMERA ---
     CAMERA_INDEX = 0      # 0 là webcam mặc định
+    CAMERA_SOURCES = None # Nhiều nguồn cho 1 phiên, vd [0, 1] hoặc ["rtsp://..."]; None = [CAMERA_INDEX]
     FRAME_WIDTH = 640     # 640x480 là chuẩn vàng cho tốc độ thực
     FRAME_HEIGHT = 480
     FPS = 30
+    STREAM_BUFFERS = 4    # Vòng buffer frame dùng chung UI + AI (không copy mỗi frame)
+    DISPLAY_FPS = 30      # Tần số vẽ lại màn hình tối đa (độc lập FPS camera / AI)
 
     # --- THAM SỐ THUẬT TOÁN (CORE) ---
     DETECTION_MODEL = "hog"  
-    RESIZE_SCALE = 0.5       # Resize 50% để AI chạy nhanh
+    RESIZE_SCALE = 0.5       # Độ phân giải encode / tracker (50%); độ phân giải detect chọn riêng bên dưới
     MATCH_TOLERANCE = 0.45   # Ngưỡng nhận diện (Càng thấp càng khắt khe)
+
+    # --- INDEX TÌM KIẾM (GALLERY LỚN) ---
+    INDEX_BACKEND = "brute"  # "brute" (chính xác) | "ivf" (xấp xỉ, cho gallery hàng chục nghìn SV)
+    IVF_NLIST = 0            # Số ô k-means (0 = tự chọn ~4*sqrt(N))
+    IVF_NPROBE = 8           # Số ô quét mỗi truy vấn (tăng -> recall cao hơn, chậm hơn)
+    IVF_MIN_TRAIN = 2000     # Gallery nhỏ hơn ngưỡng này thì vẫn quét toàn bộ
+
+    # --- KHO VECTOR (APPEND-ONLY) ---
+    STORE_FSYNC = True             # fsync mỗi commit (an toàn khi mất điện)
+    STORE_COMPACT_MIN_DEAD = 64    # Compact khi có ít nhất N bản ghi đã xóa...
+    STORE_COMPACT_RATIO = 0.25     # ...và chiếm >= 25% tổng số bản ghi
     
+    # --- TRACKING (DETECT-THEN-TRACK) ---
+    DETECT_EVERY_N = 5          # Chạy detect đầy đủ mỗi N tick AI (hoặc sớm hơn khi mất dấu)
+    TRACK_IOU_THRESH = 0.3      # IoU tối thiểu để ghép box mới với track cũ
+    TRACK_CENTROID_FACTOR = 0.5 # Dự phòng: tâm lệch < 0.5 * chiều rộng box vẫn coi là cùng track
+    TRACK_MAX_MISSES = 2        # Số lần detect liên tiếp không thấy thì xóa track
+    TRACK_REVERIFY_EVERY = 10   # Encode lại track đã biết danh tính sau N lần detect (chống ID switch)
+    TRACKER_TYPE = None         # None | "KCF" | "CSRT" | "MIL" | "MOSSE": tracker OpenCV giữa 2 lần detect
+
+    # --- ĐỘ PHÂN GIẢI DETECT THÍCH ỨNG ---
+    ADAPTIVE_DETECTION = True   # False: luôn detect ở DETECT_DEFAULT_LEVEL
+    DETECT_LEVELS = (0.25, 0.35, 0.5, 0.75, 1.0, 1.5, 2.0)  # Độ phân giải hiệu dụng = scale * 2^upsample
+    DETECT_DEFAULT_LEVEL = 0.5  # Tương đương cách cũ (resize 0.25 + upsample 1) nhưng không tốn upsample
+    MIN_FACE_PX = 100           # Mặt nhỏ nhất cần bắt được (pixel, ảnh gốc)
+    HOG_MIN_FACE = 80           # Cửa sổ quét của HOG dlib ~80x80 pixel
+    TICK_LATENCY_BUDGET_MS = 80 # Ngân sách độ trễ 1 tick AI (detect + encode + liveness)
+    FULL_SCAN_EVERY = 3         # Cứ N lần detect thì quét toàn khung, còn lại chỉ ROI quanh track
+    ROI_MARGIN = 0.6            # Nới ROI thêm 60% kích thước box mỗi phía
+    DETECT_EWMA_ALPHA = 0.2     # Hệ số làm mượt số đo độ trễ / cỡ mặt
+
+    # --- MOTION GATE & CHẾ ĐỘ NGHỈ (IDLE) ---
+    AI_INTERVAL = 0.1           # Chu kỳ AI bình thường (giây) ~ 10 FPS
+    MOTION_SCALE = 0.125        # So sánh chuyển động trên ảnh xám 1/8 (~80x60)
+    MOTION_PIXEL_THRESH = 25    # Chênh lệch mức xám để tính 1 điểm ảnh là "thay đổi"
+    MOTION_AREA_FRAC = 0.01     # >= 1% điểm ảnh thay đổi -> có chuyển động
+    MOTION_REFRESH_SEC = 10.0   # Cảnh tĩnh vẫn detect lại định kỳ (chống lệch do ánh sáng)
+    IDLE_AFTER_SEC = 30.0       # Không có chuyển động quá N giây -> nghỉ
+    IDLE_AI_INTERVAL = 1.0      # Chu kỳ AI khi nghỉ (giây)
+    IDLE_POLL_INTERVAL = 0.2    # Khi nghỉ: kiểm tra chuyển động mỗi N giây để thức dậy ngay
+
+    # --- CHẤT LƯỢNG KHUÔN MẶT (TRƯỚC KHI ENCODE) ---
+    QUALITY_GATE = True             # Bỏ qua / hoãn encode mặt mờ, nhỏ, tối, nghiêng
+    QUALITY_CROP = 64               # Chuẩn hóa crop mặt về 64x64 trước khi chấm điểm
+    QUALITY_MIN_SHARPNESS = 40.0    # Phương sai Laplacian tối thiểu (thấp = mờ / nhòe chuyển động)
+    QUALITY_MIN_FACE_PX = 60        # Chiều cao mặt tối thiểu (pixel ảnh gốc)
+    QUALITY_MIN_BRIGHTNESS = 40     # Mức xám trung bình của mặt
+    QUALITY_MAX_BRIGHTNESS = 220
+    QUALITY_MIN_CONTRAST = 20.0     # Độ lệch chuẩn mức xám
+    QUALITY_MAX_ASYMMETRY = 0.9     # Lệch trái-phải / tương phản (mặt nghiêng, che 1 nửa)
+    QUALITY_ENROLL_FACTOR = 1.5     # Đăng ký: ngưỡng nét / cỡ mặt / tương phản chặt hơn 1.5 lần
+    QUALITY_ENROLL_MAX_ASYMMETRY = 0.7
+
+    # --- ĐA TIẾN TRÌNH (TUỲ CHỌN) ---
+    AI_PROCESS_WORKERS = 0      # 0 = AI chạy trong 1 luồng như cũ; N > 0 = N tiến trình worker (vượt GIL, dùng nhiều core)
+    AI_RING_SLOTS = 0           # Số slot frame trong shared memory (0 = số worker + 2)
+    AI_TASK_TIMEOUT = 5.0       # Frame chờ worker quá N giây thì bỏ phần kết quả còn thiếu
+    AI_THREADS = 0              # Số luồng AI dùng chung cho mọi camera (0 = min(số core, số camera)); chỉ chạy xen kẽ,
+                                # dlib giữ GIL nên không tăng tốc nhận diện theo số core (cần AI_PROCESS_WORKERS)
+
     # --- ACTIVE LIVENESS (HÀNH ĐỘNG) ---
+    SHARED_LANDMARKS = True     # Liveness: 1 lần landmark 68 điểm dùng chung cho encode + EAR/yaw
+    LANDMARK_SCALE = 1.0        # Độ phân giải tính landmarks (dùng chung cho encode và liveness)
     EYE_AR_THRESH = 0.21        # Ngưỡng nhắm mắt
     EYE_AR_CONSEC_FRAMES = 2    # Số frame nhắm liên tiếp
     YAW_THRESH = 18.0           # Góc quay đầu (độ)
+    POSE_MAX_REPROJ = 0.25      # Warm-start solvePnP: sai số chiếu lại RMS / khoảng cách 2 khóe mắt quá ngưỡng -> giải lại từ đầu
+    POSE_MAX_JUMP_DEG = 45.0    # Warm-start: tư thế lệch quá N độ so với lần trước (track_id dùng lại, nghiệm gương) -> giải lại
+
+    # --- ĐO HIỆU NĂNG (TUỲ CHỌN) ---
+    METRICS_ENABLED = False     # Đo thời gian từng bước (camera, detect, encode, liveness, SQLite, Tk); tắt = gần như 0 chi phí
+    METRICS_OVERLAY = False     # Hiện bảng p50/p95/p99 trên màn hình điểm danh
+    METRICS_WINDOW = 512        # Số mẫu gần nhất giữ cho mỗi histogram
+    METRICS_REPORT_EVERY = 30.0 # Giây giữa 2 lần ghi tóm tắt vào log + file metrics
+    METRICS_PROM_PATH = os.path.join(BASE_DIR, "logs", "metrics.prom")  # Định dạng Prometheus; None = không ghi
+
+    # --- PROFILER LUỒNG AI (TUỲ CHỌN, BẬT TẠI MÁY KIOSK) ---
+    # Bật bằng biến môi trường không cần sửa code: ATTENDANCE_PROFILE=1 [ATTENDANCE_PROFILE_DELAY=60 ATTENDANCE_PROFILE_SECONDS=120]
+    AI_PROFILE = os.environ.get("ATTENDANCE_PROFILE", "0") not in ("", "0")
+    AI_PROFILE_DELAY = float(os.environ.get("ATTENDANCE_PROFILE_DELAY", 0))      # Bắt đầu đo sau N giây của phiên
+    AI_PROFILE_SECONDS = float(os.environ.get("ATTENDANCE_PROFILE_SECONDS", 0))  # Đo trong N giây (0 = tới hết phiên)
+    AI_PROFILE_INTERVAL = 0.005   # Chu kỳ lấy mẫu stack (giây)
+    AI_PROFILE_CPROFILE = True    # Ghi thêm file cProfile .prof (chi phí cao hơn lấy mẫu)
+    PROFILE_DIR = os.path.dirname(LOG_PATH)
 
     # Tự động tạo thư mục nếu chưa có
-    for d in [DATA_DIR, os.path.dirname(DB_PATH), os.path.dirname(ENCODINGS_PATH), EXPORT_DIR, MODELS_DIR, os.path.dirname(LOG_PATH)]:
+    for d in [DATA_DIR, os.path.dirname(DB_PATH), os.path.dirname(ENCODINGS_PATH), GALLERY_DIR, EXPORT_DIR, MODELS_DIR, os.path.dirname(LOG_PATH)]:
         os.makedirs(d, exist_ok=True)
\ No newline at end of file
@@ -4,17 +4,15 @@ import cv2
 import threading
 import queue
 import time
+import math
 from datetime import datetime, timedelta
 from app.config import Config
 from database.db_manager import DatabaseManager
-from core.face_detector import FaceDetector
-from core.face_encoder import FaceEncoder
-from core.face_matcher import FaceMatcher
-from core.liveness_detector import ActionLivenessDetector
-from utils.video_stream import VideoStream
-from utils.image_utils import cv2_to_pil
+from database.attendance_writer import AttendanceWriter
+from core.attendance_engine import AttendanceEngine
+from utils.image_utils import TkFrameRenderer
+from utils.metrics import metrics
 import logging
-import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +21,7 @@ class AttendanceConfigDialog(tk.Toplevel):
     def __init__(self, parent):
         super().__init__(parent)
         self.title("Cấu hình")
-        self.geometry("400x250")
+        self.geometry("400x420")
         self.result = None
         self.transient(parent)
         self.grab_set()
@@ -33,6 +31,18 @@ class AttendanceConfigDialog(tk.Toplevel):
         f = tk.Frame(self); f.pack(pady=5)
         tk.Label(f, text="Thời gian (phút):").pack(side=tk.LEFT)
         self.e_min = tk.Entry(f, width=10); self.e_min.insert(0, "45"); self.e_min.pack(side=tk.LEFT, padx=5)
+
+        # Roster (tuỳ chọn): chỉ so khớp trong lớp/danh sách SV này trước
+        tk.Label(self, text="Lớp (cách nhau dấu phẩy, bỏ trống = tất cả):").pack(pady=(10, 0))
+        self.e_classes = tk.Entry(self, width=40); self.e_classes.pack(pady=2)
+        tk.Label(self, text="Hoặc danh sách MSSV (cách nhau dấu phẩy):").pack(pady=(5, 0))
+        self.e_students = tk.Entry(self, width=40); self.e_students.pack(pady=2)
+
+        # Nhiều camera cho 1 phiên (vd 2 cửa giảng đường): chỉ số webcam hoặc URL
+        tk.Label(self, text="Camera (cách nhau dấu phẩy):").pack(pady=(5, 0))
+        self.e_sources = tk.Entry(self, width=40); self.e_sources.pack(pady=2)
+        default_sources = Config.CAMERA_SOURCES or [Config.CAMERA_INDEX]
+        self.e_sources.insert(0, ", ".join(str(x) for x in default_sources))
         
         self.live_var = tk.BooleanVar(value=True)
         tk.Checkbutton(self, text="Yêu cầu Liveness (Chống giả mạo)", 
@@ -43,9 +53,13 @@ class AttendanceConfigDialog(tk.Toplevel):
 
     def submit(self):
         try:
-            self.result = {"duration": int(self.e_min.get()), "liveness": self.live_var.get()}
+            split = lambda e: [x.strip() for x in e.get().split(",") if x.strip()]
+            self.result = {"duration": int(self.e_min.get()), "liveness": self.live_var.get(),
+                           "classes": split(self.e_classes), "students": split(self.e_students),
+                           "sources": [int(x) if x.isdigit() else x for x in split(self.e_sources)]}
+            if not self.result["sources"]: raise ValueError
             self.destroy()
-        except: messagebox.showerror("Lỗi", "Số phút sai")
+        except: self.result = None; messagebox.showerror("Lỗi", "Số phút / camera sai")
     def on_cancel(self): self.destroy()
 
 # --- MÀN HÌNH CHÍNH ---
@@ -59,19 +73,19 @@ class AttendanceWindow(tk.Toplevel):
         self.is_running = False
         self.session_id = None
         
-        # Frame buffers
-        self.display_frame = None
-        self.process_frame = None
+        # Frame do VideoStream của từng nguồn giữ (slot mới nhất + seq), UI và AI chỉ mượn, không copy
+        self.engine = None
+        self._shown_seq = {}
         
         # Data
-        self.checked_in_session = set()
-        self.trackers = {}
+        self.roster_ids = set()
         self.result_queue = queue.Queue(maxsize=10)
-        self.detected_objects = []
+        self.detected_objects = {}  # source_id -> danh sách box
         self.current_count = 0
         self._count_lock = threading.Lock()
         
         self.db = DatabaseManager()
+        self.writer = None  # Ghi điểm danh nền (luồng AI không chờ SQLite)
         self.create_ui()
         
         self.after(200, self.start_sequence)
@@ -81,8 +95,15 @@ class AttendanceWindow(tk.Toplevel):
         main = tk.Frame(self, bg="black"); main.pack(fill=tk.BOTH, expand=True)
         self.cam_label = tk.Label(main, bg="black", text="Đang tải...", fg="white")
         self.cam_label.pack(fill=tk.BOTH, expand=True)
+        # 1 PhotoImage 1280x720 cập nhật tại chỗ (gắn vào label khi có frame đầu tiên)
+        self.renderer = TkFrameRenderer(1280, 720, Config.DISPLAY_FPS)
         self.info_panel = tk.Label(main, text="", bg="black", fg="#0F0", font=("Consolas", 14))
         self.info_panel.place(x=20, y=20)
+        # Bảng đo hiệu năng (METRICS_OVERLAY): p50/p95/p99 từng bước + bộ đếm
+        self.metrics_panel = tk.Label(main, text="", bg="black", fg="#FF0", font=("Consolas", 10), justify=tk.LEFT)
+        if Config.METRICS_ENABLED and Config.METRICS_OVERLAY:
+            self.metrics_panel.place(x=20, y=55)
+        self._overlay_at = 0.0
         self.status_bar = tk.Label(main, text="Chờ cấu hình...", bg="#333", fg="white", anchor="w")
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
@@ -97,108 +118,53 @@ class AttendanceWindow(tk.Toplevel):
         self.title(f"Điểm Danh - {mode}")
         
         self.session_id = self.db.create_session(f"Auto - {mode}")
+        self.writer = AttendanceWriter(self.db).start()  # Phát lại journal của lần chạy trước (nếu có)
+
+        # Roster của phiên = SV thuộc các lớp đã chọn + MSSV nhập tay (rỗng = toàn bộ)
+        self.roster_ids = set(self.db.get_student_ids_by_classes(dlg.result['classes'])) | set(dlg.result['students'])
+        if self.roster_ids:
+            logger.info(f"Roster phiên #{self.session_id}: {len(self.roster_ids)} SV")
         
         try:
-            self.video = VideoStream(Config.CAMERA_INDEX).start()
+            # 1 engine cho mọi camera: mỗi camera 1 luồng capture + pipeline, pool AI dùng chung
+            self.engine = AttendanceEngine(dlg.result['sources'], self.use_liveness, self._do_checkin,
+                                           roster_ids=self.roster_ids, on_result=self._on_result,
+                                           session_id=self.session_id)
+            self.engine.start()
             time.sleep(1.0) # Đợi cam ấm máy
             self.is_running = True
             
-            # Start AI Thread
-            threading.Thread(target=self.ai_worker, daemon=True, name="AI-Worker").start()
             # Start UI Loop
             self.update_display_loop()
         except Exception as e:
             messagebox.showerror("Lỗi", str(e)); self.on_close()
 
-    def ai_worker(self):
-        try:
-            det = FaceDetector(); enc = FaceEncoder()
-            mat = FaceMatcher(enc); live = ActionLivenessDetector()
-        except: return
+    def _on_result(self, source_id, draw):
+        # Gọi từ luồng AI: gửi kết quả mới nhất của nguồn cho UI (Drop old if full)
+        try: self.result_queue.put_nowait(("DRAW", (source_id, draw)))
+        except queue.Full: metrics.inc("queue_full")
 
-        scale = Config.RESIZE_SCALE
-        last_proc = time.time()
-        
-        while self.is_running:
-            # Throttle: Max 10 FPS cho AI để tiết kiệm CPU
-            if time.time() - last_proc < 0.1: 
-                time.sleep(0.01); continue
-            last_proc = time.time()
-            
-            frame_orig = self.process_frame
-            if frame_orig is None: continue
-            
-            # Resize
-            try:
-                h, w = frame_orig.shape[:2]
-                frame_small = cv2.resize(frame_orig, (int(w*scale), int(h*scale)))
-                # FIX MAC OS:
-                frame_small = np.ascontiguousarray(frame_small)
-            except: continue
-            
-            draw = []
-            locs = det.detect(frame_small)
-            curr_ids = set()
-            
-            if locs:
-                vecs = enc.encode(frame_small, locs)
-                for (ts, rs, bs, ls), vec in zip(locs, vecs):
-                    t,r,b,l = int(ts/scale), int(rs/scale), int(bs/scale), int(ls/scale)
-                    rect = (t,r,b,l)
-                    uid, _ = mat.find_match(vec)
-                    
-                    color = (0, 255, 255) # Vàng
-                    
-                    if uid:
-                        curr_ids.add(uid)
-                        if uid in self.checked_in_session:
-                            color = (0, 255, 0)
-                        else:
-                            if not self.use_liveness:
-                                self._do_checkin(uid); color = (0, 255, 0)
-                            else:
-                                if uid not in self.trackers: 
-                                    self.trackers[uid] = {'c':0, 'blink':False, 'turn':False}
-                                tr = self.trackers[uid]
-                                
-                                act = live.analyze_action(frame_orig, rect) # Check ảnh gốc
-                                if act['valid']:
-                                    if act['ear'] < Config.EYE_AR_THRESH: tr['c'] += 1
-                                    else:
-                                        if tr['c'] >= Config.EYE_AR_CONSEC_FRAMES: tr['blink'] = True
-                                        tr['c'] = 0
-                                    
-                                    if abs(act['yaw']) > Config.YAW_THRESH: tr['turn'] = True
-                                    
-                                    if tr['blink'] or tr['turn']:
-                                        self._do_checkin(uid); color = (0, 255, 0)
-                                        del self.trackers[uid]
-                    else: color = (0, 0, 255)
-                    draw.append({"rect": rect, "color": color})
-            
-            # Clean trackers
-            for k in list(self.trackers): 
-                if k not in curr_ids: del self.trackers[k]
-                
-            # Send to UI (Drop old if full)
-            try: self.result_queue.put_nowait(("DRAW", draw))
-            except queue.Full: pass
-
-    def _do_checkin(self, uid):
-        if self.db.mark_attendance(self.session_id, uid, "AI"):
-            self.checked_in_session.add(uid)
-            with self._count_lock: self.current_count = len(self.checked_in_session)
-            try: self.result_queue.put_nowait(("COUNT", self.current_count))
-            except: pass
+    def _do_checkin(self, uid, source_id):
+        # Engine đã gộp check-in của mọi camera; writer chỉ ghi journal + xếp hàng, commit SQLite ở luồng riêng
+        with metrics.span("checkin_submit_ms"):
+            ok = self.writer.submit(self.session_id, uid, "AI")
+        if not ok: return False
+        with self._count_lock:
+            self.current_count += 1
+            count = self.current_count
+        try: self.result_queue.put_nowait(("COUNT", count))
+        except queue.Full: metrics.inc("queue_full")
+        return True
 
     def update_display_loop(self):
         if not self.is_running: return
+        t_loop = time.perf_counter()
         
         # 1. Process Queue
         try:
             while True:
                 t, d = self.result_queue.get_nowait()
-                if t == "DRAW": self.detected_objects = d
+                if t == "DRAW": self.detected_objects[d[0]] = d[1]
                 elif t == "COUNT": 
                     with self._count_lock: self.current_count = d
         except queue.Empty: pass
@@ -209,23 +175,53 @@ class AttendanceWindow(tk.Toplevel):
         m, s = divmod(int(rem.total_seconds()), 60)
         self.info_panel.config(text=f"Sĩ số: {self.current_count} | Time: {m:02d}:{s:02d}")
         
-        # 3. Read & Show Frame
-        frame = self.video.read()
-        if frame is not None:
-            self.process_frame = frame.copy() # Cho AI
-            disp = frame.copy()
-            
-            for o in self.detected_objects:
-                t,r,b,l = o["rect"]
-                cv2.rectangle(disp, (l,t), (r,b), o["color"], 3)
-            
-            self.cam_label.config(image=cv2_to_pil(disp, width=1280, height=720))
+        # 3. Read & Show Frame: mượn frame mới nhất từng camera (không copy), chỉ vẽ lại khi có frame mới
+        #    và đã tới lượt theo DISPLAY_FPS (camera nhanh hơn cũng không làm Tk vẽ nhiều hơn)
+        if self.renderer.due():
+            with metrics.span("ui_render_ms"):
+                changed = self._render_tiles()
+            if changed:
+                with metrics.span("ui_photo_ms"):
+                    self.renderer.show()
+                if self.renderer.frames == 1: self.cam_label.config(image=self.renderer.photo)
+
+        if metrics.enabled:
+            metrics.observe("ui_loop_ms", (time.perf_counter() - t_loop) * 1000.0)
+            if Config.METRICS_OVERLAY and time.time() - self._overlay_at >= 1.0:
+                self._overlay_at = time.time()
+                self.metrics_panel.config(text="\n".join([f"{'ms':<16} {'p50':>7} {'p95':>7} {'p99':>7}"]
+                                                         + metrics.summary_lines()))
             
-        self.after(20, self.update_display_loop)
+        self.after(max(self.renderer.delay_ms(), 10), self.update_display_loop)
+
+    def _render_tiles(self):
+        """Resize frame mới của từng camera thẳng vào ô của nó trên canvas 1280x720. True nếu có ô được vẽ lại"""
+        sources = self.engine.sources
+        cols = math.ceil(math.sqrt(len(sources)))
+        rows = math.ceil(len(sources) / cols)
+        changed = False
+        for i, src in enumerate(sources):
+            lease = src.stream.latest()
+            if lease is None: continue
+            with lease:
+                if lease.seq == self._shown_seq.get(i): continue
+                self._shown_seq[i] = lease.seq
+                changed = True
+                h, w = lease.frame.shape[:2]
+                # Resize thẳng vào ô trên canvas rồi vẽ box lên đó (buffer camera giữ nguyên cho AI)
+                tile = self.renderer.resize_into(lease.frame, self.renderer.tile(i, cols, rows))
+                th, tw = tile.shape[:2]
+                sx, sy = float(tw) / w, float(th) / h
+                for o in self.detected_objects.get(i, ()):
+                    t,r,b,l = o["rect"]
+                    cv2.rectangle(tile, (int(l*sx), int(t*sy)), (int(r*sx), int(b*sy)), o["color"], 3)
+        return changed
 
     def on_close(self):
         self.is_running = False
+        # Dừng AI trước, rồi commit nốt các lượt đang chờ, sau cùng mới đóng phiên
+        if self.engine: self.engine.stop(); self.engine = None
+        if self.writer: self.writer.stop(); self.writer = None
         if self.session_id: self.db.close_session(self.session_id)
-        if hasattr(self, 'video') and self.video: self.video.stop()
         self.destroy()
         self.on_close_callback()
\ No newline at end of file
@@ -6,7 +6,7 @@ from app.config import Config
 from database.db_manager import DatabaseManager
 from core.face_encoder import FaceEncoder
 from utils.video_stream import VideoStream
-from utils.image_utils import cv2_to_pil
+from utils.image_utils import TkFrameRenderer
 
 class RegisterWindow(tk.Toplevel):
     def __init__(self, parent, on_close):
@@ -18,10 +18,10 @@ class RegisterWindow(tk.Toplevel):
         
         self.db = DatabaseManager()
         self.encoder = FaceEncoder()
-        self.video = VideoStream(Config.CAMERA_INDEX).start()
+        self.video = VideoStream(Config.CAMERA_INDEX, buffers=Config.STREAM_BUFFERS).start()
         
         self.is_running = True
-        self.current_frame = None
+        self._shown_seq = 0
         
         self.create_ui()
         self.update_camera()
@@ -43,7 +43,8 @@ class RegisterWindow(tk.Toplevel):
         
         right = tk.Frame(self, bg="black")
         right.pack(side=tk.RIGHT, expand=True, fill=tk.BOTH)
-        self.cam_lbl = tk.Label(right, bg="black")
+        self.renderer = TkFrameRenderer(600, 450, Config.DISPLAY_FPS)
+        self.cam_lbl = tk.Label(right, bg="black", image=self.renderer.photo)
         self.cam_lbl.pack(expand=True, fill=tk.BOTH)
 
     def mk_entry(self, p, txt):
@@ -53,16 +54,17 @@ class RegisterWindow(tk.Toplevel):
 
     def update_camera(self):
         if not self.is_running: return
-        frame = self.video.read()
-        if frame is not None:
-            self.current_frame = frame.copy()
-            # Vẽ khung xanh hướng dẫn
-            disp = frame.copy()
-            h, w, _ = disp.shape
-            cv2.rectangle(disp, (w//4, h//6), (3*w//4, 5*h//6), (0,255,0), 2)
-            self.photo = cv2_to_pil(disp, width=600, height=450)
-            self.cam_lbl.config(image=self.photo)
-        self.after(20, self.update_camera)
+        lease = self.video.latest() if self.renderer.due() else None
+        if lease is not None:
+            with lease:
+                if lease.seq != self._shown_seq:
+                    self._shown_seq = lease.seq
+                    # Resize thẳng vào canvas hiển thị rồi vẽ khung xanh hướng dẫn (không copy frame gốc)
+                    disp = self.renderer.resize_into(lease.frame)
+                    h, w, _ = disp.shape
+                    cv2.rectangle(disp, (w//4, h//6), (3*w//4, 5*h//6), (0,255,0), 2)
+                    self.renderer.show()
+        self.after(max(self.renderer.delay_ms(), 10), self.update_camera)
 
     def do_capture(self):
         sid = self.e_id.get().strip()
@@ -70,11 +72,13 @@ class RegisterWindow(tk.Toplevel):
         cls = self.e_class.get().strip()
         if not sid or not name: return messagebox.showwarning("Thiếu tin", "Nhập đủ MSSV và Tên")
         
+        # Chụp đúng frame lúc bấm nút (bản copy riêng, camera vẫn chạy tiếp)
+        frame = self.video.read()
+        if frame is None: return messagebox.showwarning("Camera", "Chưa có hình từ camera")
         self.btn.config(state="disabled", text="Đang xử lý...")
-        threading.Thread(target=self.save, args=(sid, name, cls)).start()
+        threading.Thread(target=self.save, args=(sid, name, cls, frame)).start()
 
-    def save(self, sid, name, cls):
-        if self.current_frame is None: return
+    def save(self, sid, name, cls, frame):
         
         # 1. Lưu DB
         if not self.db.add_student(sid, name, cls):
@@ -82,7 +86,7 @@ class RegisterWindow(tk.Toplevel):
             return
             
         # 2. Lưu Vector AI
-        ok, msg = self.encoder.add_face(self.current_frame, sid)
+        ok, msg = self.encoder.add_face(frame, sid)
         if ok: self.done(True, f"Đã lưu sinh viên: {sid}")
         else:
             self.db.delete_student(sid) # Rollback
@@ -1,8 +1,59 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
+from datetime import datetime
 from database.db_manager import DatabaseManager
+from database.exporter import AttendanceExporter, FORMATS
 from core.face_encoder import FaceEncoder
 
+# --- POPUP BỘ LỌC XUẤT DỮ LIỆU ---
+class ExportDialog(tk.Toplevel):
+    def __init__(self, parent, db):
+        super().__init__(parent)
+        self.title("Xuất dữ liệu điểm danh")
+        self.geometry("420x460")
+        self.result = None
+        self.transient(parent)
+        self.grab_set()
+
+        tk.Label(self, text="BỘ LỌC XUẤT", font=("Arial", 14, "bold"), fg="#27ae60").pack(pady=15)
+
+        self.fmt_var = tk.StringVar(value="xlsx")
+        f = tk.Frame(self); f.pack(pady=5)
+        for fmt in FORMATS:
+            tk.Radiobutton(f, text=fmt.upper(), variable=self.fmt_var, value=fmt).pack(side=tk.LEFT, padx=5)
+
+        # Bỏ trống = không lọc
+        classes = db.get_class_names()
+        hint = ", ".join(classes[:4]) + (", ..." if len(classes) > 4 else "")
+        self.e_classes = self._field(f"Lớp, cách nhau dấu phẩy (có: {hint or 'chưa có'}):")
+        self.e_subject = self._field("Môn học (chứa chuỗi):")
+        recent = ", ".join(f"{s['session_id']}" for s in db.get_sessions(5))
+        self.e_sessions = self._field(f"Mã phiên (gần nhất: {recent or 'chưa có'}):")
+        # Ngày theo giờ máy (exporter tự đổi sang UTC như checkin_time trong DB)
+        self.e_from = self._field("Từ ngày (YYYY-MM-DD, giờ địa phương):")
+        self.e_to = self._field("Đến ngày (YYYY-MM-DD, giờ địa phương):")
+
+        tk.Button(self, text="XUẤT", command=self.submit, bg="green", fg="white", width=15).pack(pady=15)
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+
+    def _field(self, label, value=""):
+        tk.Label(self, text=label).pack(pady=(5, 0))
+        e = tk.Entry(self, width=40); e.insert(0, value); e.pack(pady=2)
+        return e
+
+    def submit(self):
+        try:
+            split = lambda e: [x.strip() for x in e.get().split(",") if x.strip()]
+            for e in (self.e_from, self.e_to):
+                if e.get().strip(): datetime.strptime(e.get().strip(), "%Y-%m-%d")
+            self.result = {"fmt": self.fmt_var.get(), "classes": split(self.e_classes),
+                           "subject": self.e_subject.get().strip() or None,
+                           "session_ids": [int(x) for x in split(self.e_sessions)],
+                           "date_from": self.e_from.get().strip() or None, "date_to": self.e_to.get().strip() or None}
+            self.destroy()
+        except ValueError:
+            self.result = None; messagebox.showerror("Lỗi", "Mã phiên / ngày sai định dạng", parent=self)
+
 class UserManagementWindow(tk.Toplevel):
     def __init__(self, parent, on_close):
         super().__init__(parent)
@@ -13,6 +64,7 @@ class UserManagementWindow(tk.Toplevel):
         
         self.db = DatabaseManager()
         self.encoder = FaceEncoder() # Cần để xóa vector khuôn mặt
+        self.exporter = None  # Xuất dữ liệu đang chạy nền
         
         self.create_ui()
         self.load_data()
@@ -31,7 +83,11 @@ class UserManagementWindow(tk.Toplevel):
         tk.Button(toolbar, text="✏️ Sửa thông tin", command=self.edit_student, bg="#f39c12", fg="white").pack(**btn_config)
         tk.Button(toolbar, text="🗑️ Xóa Sinh viên", command=self.delete_student, bg="#e74c3c", fg="white").pack(**btn_config)
         
-        tk.Button(toolbar, text="📊 Xuất Excel", command=self.export_data, bg="#27ae60", fg="white").pack(side=tk.RIGHT, padx=10, pady=5)
+        self.btn_export = tk.Button(toolbar, text="📊 Xuất dữ liệu", command=self.export_data, bg="#27ae60", fg="white")
+        self.btn_export.pack(side=tk.RIGHT, padx=10, pady=5)
+        # Tiến độ xuất (chỉ hiện khi đang xuất)
+        self.export_label = tk.Label(toolbar, text="", bg="#ecf0f1")
+        self.export_bar = ttk.Progressbar(toolbar, length=160, mode="determinate")
 
         # 2. Table (Bảng dữ liệu)
         # Cấu hình các cột cho Sinh viên
@@ -127,13 +183,35 @@ class UserManagementWindow(tk.Toplevel):
                 messagebox.showerror("Lỗi", "Cập nhật thất bại.")
 
     def export_data(self):
-        """Xuất file Excel điểm danh"""
-        success, path = self.db.export_excel()
-        if success:
-            messagebox.showinfo("Xuất Excel", f"File đã được lưu thành công tại:\n{path}")
+        """Xuất điểm danh theo bộ lọc trên luồng nền (giao diện không bị đơ khi dữ liệu lớn)"""
+        dlg = ExportDialog(self, self.db); self.wait_window(dlg)
+        if not dlg.result: return
+        filters = dict(dlg.result); fmt = filters.pop("fmt")
+        self.exporter = AttendanceExporter(self.db, fmt, **filters).start()
+        self.btn_export.config(state=tk.DISABLED)
+        self.export_bar.pack(side=tk.RIGHT, pady=5)
+        self.export_label.pack(side=tk.RIGHT, padx=5)
+        self._poll_export()
+
+    def _poll_export(self):
+        exp = self.exporter
+        if exp is None: return
+        done, total = exp.progress
+        if total:
+            self.export_bar["value"] = 100.0 * done / total
+        self.export_label.config(text=f"Đang xuất {done}/{total if total is not None else '?'}")
+        if not exp.done.is_set():
+            self.after(100, self._poll_export); return
+
+        self.exporter = None
+        self.export_bar.pack_forget(); self.export_label.pack_forget()
+        self.btn_export.config(state=tk.NORMAL)
+        if exp.error:
+            messagebox.showerror("Lỗi Xuất File", f"Chi tiết lỗi:\n{exp.error}")
         else:
-            messagebox.showerror("Lỗi Xuất File", f"Chi tiết lỗi:\n{path}")
+            messagebox.showinfo("Xuất dữ liệu", f"Đã xuất {done} dòng, file lưu tại:\n{exp.path}")
 
     def on_window_close(self):
+        if self.exporter: self.exporter.cancel()  # Luồng xuất tự dọn file .part
         self.destroy()
         self.on_close_callback()
\ No newline at end of file
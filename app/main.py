@@ -1,3 +1,6 @@
+import time
+_T_START = time.perf_counter()  # Mốc đo thời gian tới lúc menu hiện ra
+
 import tkinter as tk
 from tkinter import messagebox
 import sys
@@ -9,10 +12,9 @@ import platform # Để check hệ điều hành
 from utils.logger import setup_all_loggers
 setup_all_loggers()
 
-# Import các màn hình con
-from app.gui.register_window import RegisterWindow
-from app.gui.attendance_window import AttendanceWindow
-from app.gui.user_management_window import UserManagementWindow
+# Các màn hình con (kéo theo cv2, dlib, face_recognition...) chỉ import khi mở -> menu hiện ngay chỉ với Tk.
+# Trong lúc menu chờ, ModelWarmup nạp nền các model nặng.
+from core.warmup import ModelWarmup
 
 # --- CẤU HÌNH GIAO DIỆN ĐA NỀN TẢNG ---
 # Kiểm tra xem có phải macOS không
@@ -52,6 +54,9 @@ class MainApp(tk.Tk):
         self.create_ui()
         logger.info("✅ Main window initialized")
 
+        # Menu đã vẽ xong -> ghi thời gian khởi động rồi mới bắt đầu nạp model nền
+        self.after_idle(self._on_menu_ready)
+
     def center_window(self, w, h):
         """Hàm căn giữa cửa sổ ứng dụng"""
         ws = self.winfo_screenwidth()
@@ -114,6 +119,10 @@ class MainApp(tk.Tk):
         create_btn("📷 BẮT ĐẦU ĐIỂM DANH", self.open_attendance, "#27ae60").pack(pady=10)
         create_btn("❌ THOÁT", self.quit_app, "#c0392b").pack(pady=10)
         
+        # Tiến độ nạp model nền
+        self.warmup_label = tk.Label(self, text="", bg="#2c3e50", fg="#f1c40f", font=("Segoe UI", 10))
+        self.warmup_label.pack(side=tk.BOTTOM)
+
         # Footer
         tk.Label(
             self, 
@@ -123,6 +132,21 @@ class MainApp(tk.Tk):
             font=("Segoe UI", 10)
         ).pack(side=tk.BOTTOM, pady=20)
 
+    def _on_menu_ready(self):
+        logger.info(f"⏱️ Menu sẵn sàng sau {(time.perf_counter() - _T_START) * 1000:.0f} ms")
+        self.warmup = ModelWarmup.instance().start()
+        self._poll_warmup()
+
+    def _poll_warmup(self):
+        done, total, step = self.warmup.progress
+        if self.warmup.ready:
+            msg = f"✅ Mô hình sẵn sàng ({self.warmup.total_ms / 1000:.1f}s)"
+            if self.warmup.errors: msg = f"⚠️ Nạp mô hình lỗi: {', '.join(self.warmup.errors)} (xem log)"
+            self.warmup_label.config(text=msg)
+            return
+        self.warmup_label.config(text=f"⏳ Đang nạp mô hình ({done + 1}/{total}): {step}...")
+        self.after(200, self._poll_warmup)
+
     def force_quit(self, event=None):
         logger.warning("⚠️ FORCE QUIT by user (Ctrl+Q)")
         self.destroy()
@@ -140,6 +164,7 @@ class MainApp(tk.Tk):
         logger.info("📝 Opening Register Window")
         self.withdraw()
         try:
+            from app.gui.register_window import RegisterWindow
             RegisterWindow(self, on_close=self.show_menu)
         except Exception as e:
             logger.error(f"❌ Error opening Register: {e}", exc_info=True)
@@ -149,6 +174,7 @@ class MainApp(tk.Tk):
         logger.info("📋 Opening User Management Window")
         self.withdraw()
         try:
+            from app.gui.user_management_window import UserManagementWindow
             UserManagementWindow(self, on_close=self.show_menu)
         except Exception as e:
             logger.error(f"❌ Error opening Management: {e}", exc_info=True)
@@ -158,6 +184,7 @@ class MainApp(tk.Tk):
         logger.info("📷 Opening Attendance Window")
         self.withdraw()
         try:
+            from app.gui.attendance_window import AttendanceWindow
             AttendanceWindow(self, on_close=self.show_menu)
         except Exception as e:
             logger.error(f"❌ Error opening Attendance: {e}", exc_info=True)
@@ -0,0 +1,114 @@
+"""
+Đo số lượt ghi điểm danh / giây vào SQLite:
+
+- legacy: như DatabaseManager cũ: mỗi lần gọi mở kết nối mới, INSERT, commit, đóng
+          (journal mặc định DELETE, synchronous=FULL)
+- pooled: DatabaseManager hiện tại (kết nối giữ lâu dài mỗi luồng, WAL + synchronous=NORMAL,
+          câu lệnh được cache)
+- writer: AttendanceWriter.submit như luồng AI gọi (journal + hàng đợi, commit theo lô ở luồng nền);
+          số đo gồm cả stop() chờ commit hết -> là thông lượng ghi bền, không chỉ tốc độ submit
+Mỗi chế độ chạy 1 luồng và --threads luồng ghi song song (như nhiều camera cùng điểm danh).
+
+Chạy:  python -m benchmarks.db_checkin
+       python -m benchmarks.db_checkin --rows 5000 --threads 4 --out bench/db.json
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from app.config import Config
+
+INSERT = "INSERT INTO attendance_logs (session_id, student_id, verification_method) VALUES (?, ?, ?)"
+
+def _student_id(i):
+    return f"SV{i:06d}"
+
+def _fresh_db(workdir, name, rows):
+    from database.db_manager import DatabaseManager
+    Config.DB_PATH = os.path.join(workdir, f"{name}.db")
+    db = DatabaseManager()
+    with db.transaction() as conn:  # Khóa ngoại attendance_logs -> students
+        conn.executemany("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, 'BENCH')",
+                         [(_student_id(i), _student_id(i)) for i in range(rows)])
+    return db, db.create_session("Benchmark")
+
+def _legacy_insert(db_path, session_id, sid):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(INSERT, (session_id, sid, "AI"))
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+
+def _run(insert, rows, threads):
+    """Chia rows MSSV cho các luồng, trả về số lượt ghi / giây"""
+    chunks = [[_student_id(i) for i in range(k, rows, threads)] for k in range(threads)]
+    start = threading.Barrier(threads + 1)
+
+    def worker(ids):
+        start.wait()
+        for sid in ids: insert(sid)
+
+    pool = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    for t in pool: t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in pool: t.join()
+    return rows / (time.perf_counter() - t0)
+
+def _run_writer(writer, submit, rows, threads):
+    t0 = time.perf_counter()
+    ops = _run(submit, rows, threads)
+    writer.stop()
+    print(f"  submit writer[{threads} luồng]: {ops:.0f} lượt/s")
+    return rows / (time.perf_counter() - t0)
+
+def run(rows=2000, threads=4):
+    logging.disable(logging.INFO)  # mark_attendance log mỗi lượt -> làm nhiễu số đo
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    results = {}
+    for n in (1, threads):
+        db, session_id = _fresh_db(workdir, f"legacy_{n}", rows)
+        db.pool.close_all()
+        # File mới về journal DELETE như trước khi có WAL
+        conn = sqlite3.connect(db.db_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        results[f"legacy[{n} luồng]"] = _run(lambda sid: _legacy_insert(db.db_path, session_id, sid), rows, n)
+
+        db, session_id = _fresh_db(workdir, f"pooled_{n}", rows)
+        results[f"pooled[{n} luồng]"] = _run(lambda sid: db.mark_attendance(session_id, sid, "AI"), rows, n)
+        db.pool.close_all()
+
+        from database.attendance_writer import AttendanceWriter
+        db, session_id = _fresh_db(workdir, f"writer_{n}", rows)
+        writer = AttendanceWriter(db, journal_path=os.path.join(workdir, f"writer_{n}.journal")).start()
+        results[f"writer[{n} luồng]"] = _run_writer(writer, lambda sid: writer.submit(session_id, sid, "AI"), rows, n)
+        db.pool.close_all()
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=2000, help="Số lượt điểm danh mỗi lần đo")
+    ap.add_argument("--threads", type=int, default=4, help="Số luồng ghi song song")
+    ap.add_argument("--out", help="Ghi kết quả ra file JSON")
+    args = ap.parse_args()
+
+    results = run(args.rows, args.threads)
+    for key, ops in results.items():
+        print(f"{key:>20} {ops:>12.1f} lượt/s")
+    for n in (1, args.threads):
+        print(f"Tăng tốc {n} luồng: x{results[f'pooled[{n} luồng]'] / results[f'legacy[{n} luồng]']:.1f}")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(results, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
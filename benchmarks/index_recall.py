@@ -0,0 +1,65 @@
+"""
+Báo cáo Recall / Độ trễ của IVF index so với brute-force (chính xác).
+
+Chạy:  python -m benchmarks.index_recall --sizes 10000 50000 100000 --nprobe 1 4 8 16
+"""
+import argparse
+import time
+import numpy as np
+from core.face_gallery import FaceGallery
+from core.face_index import BruteForceIndex, IVFIndex
+from benchmarks.synthetic import make_gallery, make_queries
+
+def _timed_search(index, queries, k, batch):
+    """Trả về (rows, ms_mỗi_truy_vấn). Truy vấn theo lô `batch` mặt (giống 1 frame lớp học)"""
+    rows = []
+    t0 = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        r, _ = index.search(queries[i:i + batch], k)
+        rows.append(r)
+    elapsed = time.perf_counter() - t0
+    return np.vstack(rows), elapsed * 1000.0 / len(queries)
+
+def run(sizes, nprobes, nlist, k, n_queries, batch):
+    results = []
+    for n in sizes:
+        gallery = FaceGallery(capacity=n)
+        gallery.load(make_gallery(n), [f"SV{i:06d}" for i in range(n)])
+        queries, _ = make_queries(gallery.matrix, n_queries)
+
+        exact = BruteForceIndex(gallery)
+        exact_rows, exact_ms = _timed_search(exact, queries, k, batch)
+        results.append({"n": n, "backend": "brute", "nprobe": None, "recall@1": 1.0,
+                        f"recall@{k}": 1.0, "ms_per_query": exact_ms, "build_s": 0.0})
+
+        ivf = IVFIndex(gallery, nlist=nlist)
+        t0 = time.perf_counter()
+        ivf.build()
+        build_s = time.perf_counter() - t0
+        for nprobe in nprobes:
+            ivf.nprobe = nprobe
+            rows, ms = _timed_search(ivf, queries, k, batch)
+            r1 = float(np.mean(rows[:, 0] == exact_rows[:, 0]))
+            rk = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(rows, exact_rows)]))
+            results.append({"n": n, "backend": "ivf", "nprobe": nprobe, "recall@1": r1,
+                            f"recall@{k}": rk, "ms_per_query": ms, "build_s": build_s})
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ap.add_argument("--nlist", type=int, default=0, help="0 = tự chọn ~4*sqrt(N)")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--batch", type=int, default=30, help="Số mặt mỗi lần search (1 frame)")
+    args = ap.parse_args()
+
+    results = run(args.sizes, args.nprobe, args.nlist, args.k, args.queries, args.batch)
+    print(f"{'N':>8} {'backend':>8} {'nprobe':>7} {'recall@1':>9} {f'recall@{args.k}':>9} {'ms/query':>9} {'build(s)':>9}")
+    for r in results:
+        print(f"{r['n']:>8} {r['backend']:>8} {str(r['nprobe'] or '-'):>7} {r['recall@1']:>9.3f} "
+              f"{r[f'recall@{args.k}']:>9.3f} {r['ms_per_query']:>9.3f} {r['build_s']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+So sánh chi phí encode + liveness mỗi mặt: landmark 2 lần (cách cũ) vs landmark dùng chung (SHARED_LANDMARKS).
+
+- duplicated: face_encodings trên ảnh RESIZE_SCALE (landmark nội bộ của face_recognition)
+              + shape predictor 68 điểm trên ảnh gốc cho EAR/yaw
+- shared:     shape predictor 68 điểm 1 lần ở LANDMARK_SCALE -> compute_face_descriptor + EAR/yaw
+
+Cần ảnh thật có mặt người và file models/shape_predictor_68_face_landmarks.dat.
+Chạy:  python -m benchmarks.landmark_sharing --image data/sample.jpg --repeat 50
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from app.config import Config
+from core.face_detector import FaceDetector
+from core.face_encoder import encode_faces, encode_from_landmarks
+from core.frame_context import FrameContext
+from core.liveness_detector import ActionLivenessDetector
+
+def _duplicated(frame, rects, live):
+    ctx = FrameContext(frame)
+    s = Config.RESIZE_SCALE
+    vecs = encode_faces(ctx, [tuple(int(v * s) for v in r) for r in rects], s)
+    acts = live.analyze_batch(ctx, rects)
+    return vecs, acts
+
+def _shared(frame, rects, live):
+    ctx = FrameContext(frame)
+    s = Config.LANDMARK_SCALE
+    shapes, pts, valid = live.landmarks(ctx, rects, scale=s)
+    vecs = encode_from_landmarks(ctx, shapes, scale=s)
+    h, w = frame.shape[:2]
+    acts = live.analyze_landmarks(pts, valid, (int(w * s), int(h * s)))
+    return vecs, acts
+
+def run(frame, repeat):
+    live = ActionLivenessDetector()
+    if live.predictor is None:
+        raise SystemExit(f"Thiếu {Config.SHAPE_PREDICTOR_PATH}")
+    rects = FaceDetector().detect(frame, scale=1.0, det_scale=1.0, upsample=1)
+    if not rects:
+        raise SystemExit("Không tìm thấy khuôn mặt trong ảnh")
+
+    results = {}
+    for name, fn in (("duplicated", _duplicated), ("shared", _shared)):
+        fn(frame, rects, live)  # Làm nóng (nạp model, cache)
+        t0 = time.perf_counter()
+        for _ in range(repeat): vecs, _ = fn(frame, rects, live)
+        ms = (time.perf_counter() - t0) * 1000.0 / repeat
+        results[name] = {"ms_per_frame": ms, "ms_per_face": ms / len(rects), "vecs": vecs}
+
+    # 2 cách căn mặt khác nhau (5 điểm vs 68 điểm) -> embedding lệch nhẹ, phải nhỏ hơn nhiều so với MATCH_TOLERANCE
+    drift = [float(np.linalg.norm(np.asarray(a) - np.asarray(b)))
+             for a, b in zip(results["duplicated"]["vecs"], results["shared"]["vecs"]) if b is not None]
+    return len(rects), results, drift
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--image", required=True, help="Ảnh có 1 hoặc nhiều khuôn mặt")
+    ap.add_argument("--repeat", type=int, default=30)
+    args = ap.parse_args()
+
+    frame = cv2.imread(args.image)
+    if frame is None: raise SystemExit(f"Không đọc được ảnh {args.image}")
+    faces, results, drift = run(frame, args.repeat)
+
+    print(f"{faces} khuôn mặt, {args.repeat} lần lặp")
+    print(f"{'path':>12} {'ms/frame':>10} {'ms/face':>9}")
+    for name, r in results.items():
+        print(f"{name:>12} {r['ms_per_frame']:>10.2f} {r['ms_per_face']:>9.2f}")
+    speedup = results["duplicated"]["ms_per_frame"] / max(results["shared"]["ms_per_frame"], 1e-9)
+    print(f"Tăng tốc: x{speedup:.2f}")
+    if drift:
+        print(f"Lệch embedding 2 cách: max {max(drift):.3f} (MATCH_TOLERANCE = {Config.MATCH_TOLERANCE})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Bộ microbenchmark cho core/ ở kích thước gallery / frame thực tế.
+
+Các case (dữ liệu tổng hợp, hoặc ảnh mẫu qua --image):
+- matcher.find_match[N]        gallery N = 1k / 10k / 100k embedding
+- encoder.is_face_registered[N]
+- detector.detect[WxH@scale]   nhiều độ phân giải x RESIZE_SCALE
+- liveness.analyze_action      1 mặt (cần shape predictor 68 điểm)
+- ui.cv2_to_pil[WxH]           kích thước hiển thị (cần màn hình cho Tk)
+- ui.tk_renderer[WxH]          đường vẽ mới: resize vào buffer có sẵn + paste vào PhotoImage dùng lại
+- db.mark_attendance           ghi điểm danh vào SQLite tạm
+
+Kết quả ghi ra JSON; --compare so với baseline đã lưu và báo case chậm đi quá --threshold
+(mã thoát 1 nếu có, dùng được trên CI).
+
+Chạy:  python -m benchmarks.micro --out bench/baseline.json
+       python -m benchmarks.micro --out bench/new.json --compare bench/baseline.json --threshold 0.15
+       python -m benchmarks.micro --only matcher detector
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+from app.config import Config
+from benchmarks.synthetic import make_gallery, make_queries
+
+GALLERY_SIZES = (1000, 10000, 100000)
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080))
+DETECT_SCALES = (0.25, 0.5, 0.75, 1.0)
+DISPLAY_SIZES = ((1280, 720), (1920, 1080))
+
+def measure(fn, min_time=0.5, min_repeat=5, max_repeat=10000, ops=1):
+    """Gọi fn lặp lại tới khi đủ min_time giây. ops = số thao tác mỗi lần gọi (để tính ops/s)"""
+    fn()  # Làm nóng (cache, cấp phát lần đầu)
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeat and (len(times) < min_repeat or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    a = np.asarray(times)
+    return {"n": len(a), "mean_ms": float(a.mean()), "p50_ms": float(np.percentile(a, 50)),
+            "p90_ms": float(np.percentile(a, 90)), "min_ms": float(a.min()),
+            "ops_per_s": ops * 1000.0 / max(float(np.percentile(a, 50)), 1e-9)}
+
+def _install_gallery(n, workdir):
+    """GalleryService N embedding tổng hợp, nạp thẳng vào RAM (không ghi store) và đặt làm instance dùng chung"""
+    from core.gallery_service import GalleryService
+    from database.encoding_store import EncodingStore
+    svc = GalleryService(store=EncodingStore(root=os.path.join(workdir, f"gallery_{n}")))
+    vectors = make_gallery(n)
+    svc.gallery.load(vectors, [f"SV{i:06d}" for i in range(n)])
+    svc.index.build()
+    GalleryService._instance = svc
+    return vectors
+
+# --- CÁC CASE ---
+def bench_matcher(ctx):
+    from core.face_encoder import FaceEncoder
+    from core.face_matcher import FaceMatcher
+    for n in ctx["sizes"]:
+        vectors = _install_gallery(n, ctx["workdir"])
+        queries, _ = make_queries(vectors, 64)
+        enc = FaceEncoder()
+        mat = FaceMatcher(enc)
+        it = iter(range(10 ** 9))
+        pick = lambda: queries[next(it) % len(queries)]
+        yield f"matcher.find_match[{n}]", measure(lambda: mat.find_match(pick()), ctx["min_time"])
+        yield f"encoder.is_face_registered[{n}]", measure(lambda: enc.is_face_registered(pick()), ctx["min_time"])
+        mat.close()
+
+def bench_detector(ctx):
+    from core.face_detector import FaceDetector
+    det = FaceDetector()
+    for w, h in ctx["resolutions"]:
+        frame = cv2.resize(ctx["image"], (w, h))
+        for s in ctx["scales"]:
+            yield (f"detector.detect[{w}x{h}@{s}]",
+                   measure(lambda: det.detect(frame, scale=1.0, det_scale=s, upsample=1), ctx["min_time"]))
+
+def bench_liveness(ctx):
+    from core.liveness_detector import ActionLivenessDetector
+    live = ActionLivenessDetector()
+    if live.predictor is None:
+        print(f"⚠️ Bỏ qua liveness: thiếu {Config.SHAPE_PREDICTOR_PATH}"); return
+    frame = cv2.resize(ctx["image"], (640, 480))
+    rect = ctx["face"] or (140, 400, 340, 240)  # (top, right, bottom, left) giữa khung
+    yield "liveness.analyze_action", measure(lambda: live.analyze_action(frame, rect, key=1), ctx["min_time"])
+
+def bench_display(ctx):
+    import tkinter as tk
+    from utils.image_utils import cv2_to_pil, TkFrameRenderer
+    try:
+        root = tk.Tk(); root.withdraw()
+    except tk.TclError:
+        print("⚠️ Bỏ qua case ui: không có màn hình cho Tk"); return
+    try:
+        for w, h in DISPLAY_SIZES:
+            frame = cv2.resize(ctx["image"], (w, h))
+            yield f"ui.cv2_to_pil[{w}x{h}]", measure(lambda: cv2_to_pil(frame), ctx["min_time"])
+            # Frame camera 640x480 phóng lên kích thước hiển thị (như cửa sổ điểm danh)
+            cam = cv2.resize(ctx["image"], (640, 480))
+            renderer = TkFrameRenderer(w, h)
+            def render():
+                renderer.resize_into(cam)
+                renderer.show()
+            yield f"ui.tk_renderer[{w}x{h}]", measure(render, ctx["min_time"])
+    finally:
+        root.destroy()
+
+def bench_db(ctx):
+    from database.db_manager import DatabaseManager
+    Config.DB_PATH = os.path.join(ctx["workdir"], "bench.db")
+    db = DatabaseManager()
+    batch = 100
+    ids = [f"SV{i:06d}" for i in range(batch)]
+    for sid in ids: db.add_student(sid, sid, "BENCH")
+
+    def one_session():
+        session_id = db.create_session("Benchmark")
+        for sid in ids: db.mark_attendance(session_id, sid, "AI")
+    yield "db.mark_attendance", measure(one_session, ctx["min_time"], min_repeat=3, ops=batch)
+
+CASES = {"matcher": bench_matcher, "detector": bench_detector, "liveness": bench_liveness,
+         "ui": bench_display, "db": bench_db}
+
+def run(only=None, sizes=GALLERY_SIZES, image=None, face=None, min_time=0.5):
+    import logging
+    logging.disable(logging.INFO)  # DB / gallery log mỗi thao tác -> làm nhiễu số đo
+    workdir = tempfile.mkdtemp(prefix="bench_micro_")
+    Config.INDEX_PATH = os.path.join(workdir, "face_index.npz")
+    if image is None:
+        # Ảnh tổng hợp: chi phí HOG phụ thuộc chủ yếu vào kích thước, không vào nội dung
+        image = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    ctx = {"workdir": workdir, "sizes": sizes, "resolutions": RESOLUTIONS, "scales": DETECT_SCALES,
+           "image": image, "face": face, "min_time": min_time}
+
+    results = {}
+    for name, case in CASES.items():
+        if only and name not in only: continue
+        for key, r in case(ctx):
+            results[key] = r
+            print(f"{key:>40} {r['p50_ms']:>10.3f} ms  {r['ops_per_s']:>12.1f} ops/s  (n={r['n']})")
+    return {"meta": _meta(), "results": results}
+
+def _meta():
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "numpy": np.__version__,
+            "opencv": cv2.__version__, "index_backend": Config.INDEX_BACKEND}
+
+def compare(current, baseline, threshold):
+    """So p50 với baseline. Trả về list (case, base_ms, new_ms, ratio) chậm đi quá threshold"""
+    regressions = []
+    print(f"\n{'case':>40} {'base':>10} {'new':>10} {'change':>8}")
+    for key, r in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key:>40} {'-':>10} {r['p50_ms']:>10.3f}      mới"); continue
+        ratio = r["p50_ms"] / max(base["p50_ms"], 1e-9) - 1.0
+        flag = ""
+        if ratio > threshold:
+            regressions.append((key, base["p50_ms"], r["p50_ms"], ratio)); flag = "  ❌ CHẬM HƠN"
+        elif ratio < -threshold:
+            flag = "  ✅ nhanh hơn"
+        print(f"{key:>40} {base['p50_ms']:>10.3f} {r['p50_ms']:>10.3f} {ratio:>+7.1%}{flag}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", nargs="+", choices=sorted(CASES), help="Chỉ chạy các nhóm case này")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(GALLERY_SIZES), help="Kích thước gallery")
+    ap.add_argument("--image", help="Ảnh mẫu thay cho ảnh tổng hợp (nên có 1 khuôn mặt)")
+    ap.add_argument("--min-time", type=float, default=0.5, help="Số giây tối thiểu đo mỗi case")
+    ap.add_argument("--out", help="Ghi kết quả ra file JSON")
+    ap.add_argument("--compare", help="File JSON baseline để so sánh")
+    ap.add_argument("--threshold", type=float, default=0.15, help="Chậm hơn quá tỉ lệ này = regression")
+    args = ap.parse_args()
+
+    image, face = None, None
+    if args.image:
+        image = cv2.imread(args.image)
+        if image is None: raise SystemExit(f"Không đọc được ảnh {args.image}")
+        # Rect mặt cho liveness lấy từ detect trên ảnh mẫu (theo kích thước 640x480 dùng khi đo)
+        from core.face_detector import FaceDetector
+        rects = FaceDetector().detect(cv2.resize(image, (640, 480)), scale=1.0, det_scale=1.0, upsample=1)
+        face = rects[0] if rects else None
+
+    current = run(args.only, args.sizes, image, face, args.min_time)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, ensure_ascii=False)
+        print(f"Đã ghi {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} case chậm hơn baseline quá {args.threshold:.0%}")
+            sys.exit(1)
+        print("\n✅ Không có regression")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark đầu-cuối của pipeline điểm danh trên clip quay sẵn (không cần camera, không cần GUI).
+
+Phát lại file video / thư mục ảnh qua VideoStream, chạy detect -> encode -> match -> liveness -> check-in
+với gallery mẫu, rồi báo cáo:
+- độ trễ từng bước (p50 / p90 / p99, ms), FPS, số mặt / giây
+- thời điểm điểm danh đầu tiên của từng người (giây trong clip và giây thực)
+
+Gallery mẫu: thư mục chứa <MSSV>.jpg hoặc <MSSV>/*.jpg (mỗi ảnh 1 khuôn mặt rõ).
+Gallery / DB được tạo trong thư mục tạm -> không đụng dữ liệu thật.
+
+Chạy:  python -m benchmarks.pipeline_e2e --source data/clip.mp4 --gallery data/fixtures --liveness
+       python -m benchmarks.pipeline_e2e --source data/frames/ --pacing realtime
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import defaultdict
+import numpy as np
+import face_recognition
+from app.config import Config
+from utils.video_stream import VideoStream, IMAGE_EXTS
+
+def _fixture_images(directory):
+    """(MSSV, đường dẫn ảnh) từ <MSSV>.jpg hoặc <MSSV>/*.jpg"""
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            for f in sorted(os.listdir(path)):
+                if f.lower().endswith(IMAGE_EXTS): yield name, os.path.join(path, f)
+        elif name.lower().endswith(IMAGE_EXTS):
+            yield os.path.splitext(name)[0], path
+
+def _isolate(workdir):
+    # Gallery, index, DB của benchmark nằm trong thư mục tạm
+    Config.GALLERY_DIR = os.path.join(workdir, "gallery")
+    Config.INDEX_PATH = os.path.join(workdir, "face_index.npz")
+    Config.ENCODINGS_PATH = os.path.join(workdir, "face_encodings.pkl")
+    Config.DB_PATH = os.path.join(workdir, "attendance.db")
+    Config.EXPORT_DIR = os.path.join(workdir, "exports")
+
+def load_gallery(directory):
+    """Encode ảnh mẫu (mặt lớn nhất mỗi ảnh) và nạp vào GalleryService. Trả về danh sách MSSV"""
+    from core.gallery_service import GalleryService
+    svc = GalleryService.instance()
+    ids = set()
+    for uid, path in _fixture_images(directory):
+        rgb = face_recognition.load_image_file(path)
+        locs = face_recognition.face_locations(rgb)
+        if not locs:
+            print(f"⚠️ Bỏ qua {path}: không thấy khuôn mặt"); continue
+        largest = max(locs, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))
+        svc.enroll(uid, np.asarray(face_recognition.face_encodings(rgb, [largest])[0], dtype=np.float32))
+        ids.add(uid)
+    return sorted(ids)
+
+class StageTimer:
+    """Đo thời gian các bước bằng cách bọc method của engine (không sửa pipeline)"""
+    def __init__(self):
+        self.ms = defaultdict(list)
+
+    def wrap(self, obj, attr, stage):
+        fn = getattr(obj, attr)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: self.ms[stage].append((time.perf_counter() - t0) * 1000.0)
+        setattr(obj, attr, timed)
+
+    def record(self, stage, ms):
+        self.ms[stage].append(ms)
+
+    def summary(self):
+        out = {}
+        for stage, values in self.ms.items():
+            a = np.asarray(values)
+            out[stage] = {"n": len(a), "mean": float(a.mean()), "p50": float(np.percentile(a, 50)),
+                          "p90": float(np.percentile(a, 90)), "p99": float(np.percentile(a, 99))}
+        return out
+
+def _instrument(pipeline, timer):
+    import core.attendance_pipeline as ap
+    timer.wrap(pipeline.det, "detect", "detect")
+    timer.wrap(pipeline.enc, "encode", "encode")
+    timer.wrap(pipeline.mat, "match_all", "match")
+    timer.wrap(pipeline.tracker, "predict", "track")
+    if pipeline.live is not None:
+        timer.wrap(pipeline.live, "landmarks", "landmarks")
+        timer.wrap(pipeline.live, "analyze_landmarks", "liveness")
+    # Encode từ landmarks dùng chung là hàm module -> bọc ở mức module (chỉ trong tiến trình benchmark)
+    timer.wrap(ap, "encode_from_landmarks", "encode")
+
+def run(source, gallery_dir, use_liveness=False, pacing="fast", max_frames=0):
+    from core.attendance_pipeline import AttendancePipeline
+    from database.db_manager import DatabaseManager
+
+    _isolate(tempfile.mkdtemp(prefix="bench_e2e_"))
+    ids = load_gallery(gallery_dir)
+    if not ids: raise SystemExit(f"Gallery mẫu {gallery_dir} không có khuôn mặt nào")
+
+    db = DatabaseManager()
+    for uid in ids: db.add_student(uid, uid, "BENCH")  # Khóa ngoại attendance_logs -> students
+    session_id = db.create_session("Benchmark")
+    checked_in = set()
+    first = {}
+    timer = StageTimer()
+    state = {"seq": 0, "t0": 0.0}
+
+    def on_checkin(uid):
+        t0 = time.perf_counter()
+        if db.mark_attendance(session_id, uid, "AI"):
+            checked_in.add(uid)
+            first[uid] = ((state["seq"] - 1) / stream.fps, time.perf_counter() - state["t0"])
+        timer.record("checkin", (time.perf_counter() - t0) * 1000.0)
+
+    pipeline = AttendancePipeline(use_liveness, checked_in, on_checkin)
+    _instrument(pipeline, timer)
+    stream = VideoStream(source, pacing=pacing).start()
+
+    frames = faces = 0
+    last_seq = 0
+    state["t0"] = time.perf_counter()
+    try:
+        while not max_frames or frames < max_frames:
+            lease = stream.wait_for(last_seq, timeout=1.0)
+            if lease is None:
+                if stream.stopped: break
+                continue
+            with lease:
+                last_seq = state["seq"] = lease.seq
+                t0 = time.perf_counter()
+                draw = pipeline.process(lease.frame)
+                timer.record("tick", (time.perf_counter() - t0) * 1000.0)
+            frames += 1
+            faces += len(draw)
+    finally:
+        elapsed = time.perf_counter() - state["t0"]
+        stream.stop()
+        pipeline.close()
+
+    return {"source": source, "pacing": pacing, "liveness": use_liveness, "frames": frames,
+            "source_frames": last_seq, "elapsed_s": elapsed, "fps": frames / max(elapsed, 1e-9),
+            "faces_per_s": faces / max(elapsed, 1e-9), "stages": timer.summary(),
+            "first_checkin": {uid: first.get(uid) for uid in ids}}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--source", required=True, help="File video hoặc thư mục ảnh")
+    ap.add_argument("--gallery", required=True, help="Thư mục ảnh mẫu <MSSV>.jpg hoặc <MSSV>/*.jpg")
+    ap.add_argument("--pacing", choices=["fast", "realtime"], default="fast",
+                    help="fast: mọi frame, nhanh nhất có thể (lặp lại được); realtime: theo FPS của file")
+    ap.add_argument("--liveness", action="store_true", help="Bật liveness (cần shape predictor 68 điểm)")
+    ap.add_argument("--max-frames", type=int, default=0)
+    args = ap.parse_args()
+
+    r = run(args.source, args.gallery, args.liveness, args.pacing, args.max_frames)
+    print(f"{r['frames']} frame xử lý / {r['source_frames']} frame nguồn trong {r['elapsed_s']:.2f}s "
+          f"-> {r['fps']:.1f} FPS, {r['faces_per_s']:.1f} mặt/s")
+    print(f"{'stage':>10} {'n':>6} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8}  (ms)")
+    for stage, s in r["stages"].items():
+        print(f"{stage:>10} {s['n']:>6} {s['mean']:>8.2f} {s['p50']:>8.2f} {s['p90']:>8.2f} {s['p99']:>8.2f}")
+    print("Điểm danh lần đầu (giây trong clip / giây thực):")
+    for uid, t in r["first_checkin"].items():
+        print(f"  {uid:>12}: " + (f"{t[0]:.2f}s / {t[1]:.2f}s" if t else "chưa điểm danh"))
+
+if __name__ == "__main__":
+    main()
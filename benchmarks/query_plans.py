@@ -0,0 +1,45 @@
+"""
+Kiểm tra query plan của các đường xuất / báo cáo trên DB đã migrate (EXPLAIN QUERY PLAN):
+mỗi truy vấn phải đi đúng index mong đợi, không quét toàn bảng và không sắp xếp tạm
+(USE TEMP B-TREE). Danh sách truy vấn nằm ở database/query_plans.py (dùng chung với tests).
+DB tạm được tạo qua DatabaseManager (chạy toàn bộ migrations) rồi nạp dữ liệu tổng hợp cỡ 1 học kỳ; có thể chỉ --db vào bản sao DB thật (chỉ đọc).
+
+Mã thoát 1 nếu có truy vấn sai plan (dùng được trên CI).
+
+Chạy:  python -m benchmarks.query_plans
+       python -m benchmarks.query_plans --db data/database/attendance.db --verbose
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+from app.config import Config
+
+from database.query_plans import check, fill_sample_data
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", help="Kiểm tra trên DB có sẵn (mở chỉ đọc) thay vì DB tổng hợp")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    if args.db:
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        print(f"DB: {args.db} (schema v{conn.execute('PRAGMA user_version').fetchone()[0]})")
+    else:
+        from database.db_manager import DatabaseManager
+        logging.disable(logging.INFO)
+        Config.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_plans_"), "attendance.db")
+        db = DatabaseManager()
+        fill_sample_data(db)
+        conn = db.get_conn()
+    failures = check(conn, args.verbose)
+    if failures:
+        print(f"\n❌ {len(failures)} truy vấn sai query plan")
+        sys.exit(1)
+    print("\n✅ Mọi truy vấn đi đúng index")
+
+if __name__ == "__main__":
+    main()
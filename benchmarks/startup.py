@@ -0,0 +1,139 @@
+"""
+Đo thời gian khởi động (mỗi phép đo chạy trong 1 tiến trình Python mới, cache module lạnh):
+
+- menu:  import app.main (mọi thứ chạy trước khi menu hiện) + các module nặng đã lỡ bị nạp
+- warmup: thời gian từng bước của ModelWarmup
+- first: thời gian từ lúc mở điểm danh tới lần nhận diện đầu tiên trên clip --source,
+         "cold" = không warm-up (như bản cũ), "warm" = warm-up đã chạy xong trong lúc ở menu
+
+Chạy:  python -m benchmarks.startup
+       python -m benchmarks.startup --source data/clip.mp4 --gallery data/fixtures --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ("cv2", "numpy", "dlib", "face_recognition", "pandas", "scipy", "PIL")
+
+# --- PHẦN CHẠY TRONG TIẾN TRÌNH CON ---
+def _child_menu():
+    t0 = time.perf_counter()
+    import app.main
+    return {"import_ms": (time.perf_counter() - t0) * 1000.0,
+            "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules]}
+
+def _child_warmup():
+    from core.warmup import ModelWarmup
+    w = ModelWarmup.instance()
+    w.run()
+    return {"total_ms": w.total_ms, "steps": w.timings, "errors": w.errors}
+
+def _isolate(workdir):
+    # Giống pipeline_e2e._isolate nhưng không import module đó (nó kéo numpy / face_recognition -> hết "lạnh")
+    from app.config import Config
+    Config.GALLERY_DIR = os.path.join(workdir, "gallery")
+    Config.INDEX_PATH = os.path.join(workdir, "face_index.npz")
+    Config.ENCODINGS_PATH = os.path.join(workdir, "face_encodings.pkl")
+    Config.DB_PATH = os.path.join(workdir, "attendance.db")
+
+def _child_first(workdir, source, warm):
+    _isolate(workdir)
+    out = {}
+    if warm:
+        from core.warmup import ModelWarmup
+        w = ModelWarmup.instance()
+        w.run()
+        out["warmup_ms"] = w.total_ms
+
+    # Mốc "mở cửa sổ điểm danh": tạo pipeline + camera (ở đây là clip) rồi chờ nhận ra người đầu tiên
+    t_open = time.perf_counter()
+    from core.attendance_pipeline import AttendancePipeline
+    from utils.video_stream import VideoStream
+    pipeline = AttendancePipeline(False, set(), lambda uid: None)
+    stream = VideoStream(source, pacing="realtime").start()
+    last_seq, first = 0, None
+    try:
+        while first is None:
+            lease = stream.wait_for(last_seq, timeout=1.0)
+            if lease is None:
+                if stream.stopped: break
+                continue
+            with lease:
+                last_seq = lease.seq
+                pipeline.process(lease.frame)
+            if any(tr.uid for tr in pipeline.tracker.tracks):
+                first = (time.perf_counter() - t_open) * 1000.0
+    finally:
+        stream.stop()
+        pipeline.close()
+    out["first_recognition_ms"] = first
+    out["frames"] = last_seq
+    return out
+
+def _child_prepare(workdir, gallery):
+    from benchmarks.pipeline_e2e import load_gallery
+    _isolate(workdir)
+    return {"ids": load_gallery(gallery)}
+
+# --- PHẦN ĐIỀU PHỐI ---
+def _spawn(*args):
+    """Chạy 1 phép đo trong tiến trình mới, kết quả JSON ở dòng cuối stdout"""
+    cmd = [sys.executable, "-m", "benchmarks.startup", "--child", *args]
+    res = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    if res.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} lỗi:\n{res.stderr[-2000:]}")
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+def run(repeat=3, source=None, gallery=None):
+    report = {"menu": [_spawn("menu") for _ in range(repeat)],
+              "warmup": [_spawn("warmup") for _ in range(repeat)]}
+    if source and gallery:
+        workdir = tempfile.mkdtemp(prefix="bench_startup_")
+        _spawn("prepare", workdir, gallery)
+        for mode in ("cold", "warm"):
+            report[f"first_{mode}"] = [_spawn("first", workdir, source, mode) for _ in range(repeat)]
+    return report
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        kind, args = sys.argv[2], sys.argv[3:]
+        if kind == "menu": out = _child_menu()
+        elif kind == "warmup": out = _child_warmup()
+        elif kind == "prepare": out = _child_prepare(*args)
+        else: out = _child_first(args[0], args[1], args[2] == "warm")
+        print(json.dumps(out))
+        return
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--source", help="Clip / thư mục ảnh để đo thời gian tới lần nhận diện đầu tiên")
+    ap.add_argument("--gallery", help="Thư mục ảnh mẫu <MSSV>.jpg hoặc <MSSV>/*.jpg")
+    ap.add_argument("--out", help="Ghi kết quả ra file JSON")
+    args = ap.parse_args()
+
+    r = run(args.repeat, args.source, args.gallery)
+    print(f"Time-to-menu (import app.main): {_median([m['import_ms'] for m in r['menu']]):.0f} ms")
+    heavy = sorted({m for x in r["menu"] for m in x["heavy_loaded"]})
+    print(f"  Module nặng nạp trước menu: {', '.join(heavy) if heavy else 'không có'}")
+    print(f"Warm-up nền: {_median([w['total_ms'] for w in r['warmup']]):.0f} ms")
+    for step in r["warmup"][0]["steps"]:
+        print(f"  {step:<28} {_median([w['steps'][step] for w in r['warmup']]):>8.0f} ms")
+    for mode in ("cold", "warm"):
+        runs = r.get(f"first_{mode}")
+        if runs:
+            ms = _median([x["first_recognition_ms"] for x in runs])
+            print(f"Time-to-first-recognition ({mode}): " + (f"{ms:.0f} ms" if ms is not None else "không nhận ra ai"))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(r, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import numpy as np
+
+def make_gallery(n, dim=128, seed=0):
+    """
+    Sinh N vector giả lập embedding khuôn mặt (mỗi vector 1 sinh viên).
+    Embedding thật của dlib có các thành phần ~N(0, 0.1), khoảng cách giữa 2 người khác nhau ~0.8-1.0
+    """
+    rng = np.random.default_rng(seed)
+    return (rng.normal(0.0, 0.09, size=(n, dim))).astype(np.float32)
+
+def make_queries(gallery, m, noise=0.02, seed=1):
+    """
+    Lấy ngẫu nhiên M sinh viên trong gallery và thêm nhiễu (cùng người, khác ảnh).
+    Trả về (queries, true_rows)
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(gallery.shape[0], m, replace=gallery.shape[0] < m)
+    queries = gallery[rows] + rng.normal(0.0, noise, size=(m, gallery.shape[1])).astype(np.float32)
+    return queries.astype(np.float32), rows
@@ -0,0 +1,216 @@
+import os
+import time
+import threading
+import logging
+from app.config import Config
+from core.attendance_pipeline import AttendancePipeline
+from utils.video_stream import VideoStream
+from utils.metrics import metrics
+from utils.profiler import AIProfiler
+
+logger = logging.getLogger(__name__)
+
+class Source:
+    """1 nguồn hình (camera / file video): luồng capture + slot frame riêng + pipeline (tracker, motion) riêng"""
+    def __init__(self, source_id, src, stream, pipeline):
+        self.source_id = source_id
+        self.src = src
+        self.stream = stream
+        self.pipeline = pipeline
+        self.last_seq = 0
+        self.last_proc = 0.0
+        self.next_due = 0.0   # Thời điểm sớm nhất được xử lý lại (deadline cho bộ lập lịch)
+        self.busy = False
+        self.frames = 0
+
+    @property
+    def has_new_frame(self):
+        return self.stream.seq > self.last_seq
+
+
+class AttendanceEngine:
+    """
+    Điểm danh 1 phiên từ nhiều nguồn hình (vd giảng đường 2 cửa):
+    - Mỗi nguồn có luồng capture + slot frame mới nhất + pipeline riêng (track / motion theo từng camera)
+    - 1 pool nhận diện dùng chung: các luồng AI (hoặc pool tiến trình khi AI_PROCESS_WORKERS > 0)
+      lấy nguồn theo lịch deadline sớm nhất, hoà thì xoay vòng -> không nguồn nào bị bỏ đói
+    - Luồng AI chỉ cho chạy xen kẽ (concurrency): detect / encode / landmarks của dlib giữ GIL nên
+      nhiều luồng KHÔNG dùng thêm core cho phần nhận diện; muốn nhiều core thì dùng pool tiến trình
+    - Check-in từ mọi nguồn được gộp (1 SV chỉ ghi 1 lần / phiên dù 2 camera cùng thấy)
+    """
+    def __init__(self, sources, use_liveness, on_checkin, roster_ids=None, on_result=None, session_id=None):
+        self.checked_in = set()
+        self._inflight = set()
+        self._checkin_lock = threading.Lock()
+        self.on_checkin = on_checkin  # callback(uid, source_id) -> True nếu ghi nhận thành công
+        self.on_result = on_result    # callback(source_id, draw)
+
+        self.pool = None
+        if Config.AI_PROCESS_WORKERS > 0:
+            from core.process_pipeline import AIWorkerPool
+            self.pool = AIWorkerPool()
+
+        # Trạng thái mà stop() cần phải có trước khi mở nguồn (mở lỗi -> stop() dọn các nguồn đã mở)
+        self._lock = threading.Lock()
+        self._rr = 0
+        self._threads = []
+        self.running = False
+        self.profiler = AIProfiler(session_id) if Config.AI_PROFILE else None
+
+        self.sources = []
+        try:
+            for i, src in enumerate(sources):
+                stream = VideoStream(src, Config.FRAME_WIDTH, Config.FRAME_HEIGHT, buffers=Config.STREAM_BUFFERS)
+                checkin = lambda uid, i=i: self._checkin(uid, i)
+                try:
+                    pipeline = self._make_pipeline(use_liveness, checkin, roster_ids)
+                except Exception:
+                    stream.stop()
+                    raise
+                self.sources.append(Source(i, src, stream, pipeline))
+        except Exception:
+            self.stop()
+            raise
+
+    def _make_pipeline(self, use_liveness, checkin, roster_ids):
+        if self.pool is not None:
+            from core.process_pipeline import ProcessAttendancePipeline
+            return ProcessAttendancePipeline(use_liveness, self.checked_in, checkin,
+                                             roster_ids=roster_ids, pool=self.pool)
+        return AttendancePipeline(use_liveness, self.checked_in, checkin, roster_ids=roster_ids)
+
+    # --- VÒNG ĐỜI ---
+    def start(self):
+        for s in self.sources: s.stream.start()
+        self.running = True
+        if self.pool is not None:
+            # Tính toán nằm ở pool tiến trình; 1 luồng điều phối (submit/poll không chặn) là đủ
+            n = 1
+        else:
+            # Nhiều luồng chỉ để các nguồn không phải chờ nhau (phần OpenCV / chờ frame nhả GIL);
+            # phần dlib vẫn tuần tự trên 1 core
+            n = Config.AI_THREADS or min(os.cpu_count() or 1, len(self.sources))
+            if len(self.sources) > 1:
+                logger.info("ℹ️ Nhận diện dlib giữ GIL: các luồng AI dùng chung ~1 core. "
+                            "Đặt AI_PROCESS_WORKERS > 0 để chia nhiều camera cho nhiều core")
+        if self.profiler: self.profiler.start()
+        for i in range(n):
+            t = threading.Thread(target=self._worker_loop, daemon=True, name=f"AI-Worker-{i}")
+            t.start()
+            self._threads.append(t)
+        logger.info(f"🎥 Điểm danh {len(self.sources)} nguồn, {n} luồng AI"
+                    + (f", {self.pool.workers} tiến trình" if self.pool else ""))
+        return self
+
+    def stop(self):
+        self.running = False
+        for t in self._threads:
+            if t is not threading.current_thread(): t.join(timeout=2.0)
+        self._threads = []
+        if self.profiler:
+            self.profiler.stop()
+            self.profiler = None
+        for s in self.sources:
+            try: s.pipeline.close()
+            except Exception as e: logger.error(f"Đóng pipeline nguồn {s.source_id} lỗi: {e}")
+            s.stream.stop()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    # --- CHECK-IN (GỘP MỌI NGUỒN) ---
+    def _checkin(self, uid, source_id):
+        with self._checkin_lock:
+            if uid in self.checked_in or uid in self._inflight: return
+            self._inflight.add(uid)
+        ok = False
+        try:
+            ok = self.on_checkin(uid, source_id)
+        finally:
+            with self._checkin_lock:
+                self._inflight.discard(uid)
+                if ok: self.checked_in.add(uid)
+
+    # --- LẬP LỊCH ---
+    def _acquire(self):
+        """Nguồn rảnh, có frame mới, đến hạn sớm nhất (EDF); hoà thì ưu tiên theo vòng. None nếu chưa có"""
+        now = time.time()
+        with self._lock:
+            n = len(self.sources)
+            best = None
+            for k in range(n):
+                s = self.sources[(self._rr + k) % n]
+                if s.busy or not s.has_new_frame or s.next_due > now: continue
+                if best is None or s.next_due < best.next_due: best = s
+            if best is not None:
+                best.busy = True
+                self._rr = (best.source_id + 1) % n
+            return best
+
+    def _release(self, s):
+        with self._lock: s.busy = False
+
+    def _worker_loop(self):
+        profiler = self.profiler
+        try:
+            while self.running:
+                if profiler: profiler.tick()
+                self._report()
+                s = self._acquire()
+                if s is None:
+                    if self.pool is not None: self._collect_all()
+                    time.sleep(0.005); continue
+                try:
+                    self._tick(s)
+                except Exception as e:
+                    logger.error(f"AI tick lỗi (nguồn {s.source_id}): {e}")
+                finally:
+                    self._release(s)
+                if self.pool is not None: self._collect_all()
+        finally:
+            if profiler: profiler.thread_exit()
+
+    def _tick(self, s):
+        """1 lượt cho 1 nguồn: giống vòng ai_worker cũ (throttle, chế độ nghỉ + motion check)"""
+        p = s.pipeline
+        now = time.time()
+        interval = p.ai_interval()
+        lease = s.stream.latest()
+        if lease is None: return
+        with lease:
+            if metrics.enabled:
+                # Tuổi frame lúc AI nhận (độ trễ camera -> AI) + số frame AI không kịp xem
+                metrics.observe("frame_age_ms", (now - lease.timestamp) * 1000.0)
+                if lease.seq - s.last_seq > 1: metrics.inc("frames_skipped", lease.seq - s.last_seq - 1)
+            s.last_seq = lease.seq
+            ctx = None
+            if now - s.last_proc < interval:
+                # Đang nghỉ: chỉ kiểm tra chuyển động (rất rẻ), có chuyển động thì xử lý ngay
+                with metrics.span("motion_ms"):
+                    ctx = p.check_motion(lease.frame)
+                if ctx is None:
+                    s.next_due = now + Config.IDLE_POLL_INTERVAL
+                    metrics.inc("idle_polls")
+                    return
+            s.last_proc = now
+            s.next_due = now + Config.AI_INTERVAL
+            if p.submit(lease.frame, ctx) is None: metrics.inc("ring_full")
+            s.frames += 1
+        if self.pool is None:
+            self._emit(s, p.poll())
+
+    def _collect_all(self):
+        # Chế độ tiến trình: chỉ 1 luồng điều phối -> poll mọi pipeline ở đây
+        for s in self.sources:
+            try: self._emit(s, s.pipeline.poll())
+            except RuntimeError as e:
+                logger.error(f"AI pipeline dừng: {e}"); self.running = False; return
+
+    def _report(self):
+        if not metrics.enabled: return
+        metrics.gauge("camera_dropped", sum(s.stream.dropped for s in self.sources))
+        metrics.maybe_report()
+
+    def _emit(self, s, done):
+        if done and self.on_result:
+            self.on_result(s.source_id, done[-1][1])
@@ -0,0 +1,308 @@
+import time
+import logging
+import numpy as np
+from app.config import Config
+from core.face_detector import FaceDetector, expand_roi
+from core.face_encoder import FaceEncoder, encode_faces, encode_from_landmarks
+from core.face_quality import FaceQualityGate
+from core.face_matcher import FaceMatcher
+from core.face_tracker import FaceTracker
+from core.frame_context import FrameContext
+from core.motion_gate import MotionGate
+from core.resolution_controller import ResolutionController
+from core.liveness_detector import ActionLivenessDetector
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Màu box (BGR)
+COLOR_CHECKED = (0, 255, 0)   # Xanh: đã điểm danh
+COLOR_PENDING = (0, 255, 255) # Vàng: đã nhận ra, chờ liveness
+COLOR_UNKNOWN = (0, 0, 255)   # Đỏ: người lạ
+
+def encode_with_quality(ctx, face_locations, scale, gate=None, encode=None):
+    """
+    Chấm chất lượng rồi chỉ encode những mặt đạt (mặt mờ / nhỏ / nghiêng được hoãn tới lần detect sau).
+    encode(chỉ số các mặt đạt) -> vecs; mặc định encode_faces trên ảnh RGB ở `scale`.
+    Trả về (vecs, scores) cùng thứ tự face_locations; vecs[i] = None nếu mặt bị hoãn
+    """
+    if encode is None:
+        encode = lambda keep: encode_faces(ctx, [face_locations[i] for i in keep], scale)
+    scores = gate.assess(ctx, face_locations, scale) if gate else [None] * len(face_locations)
+    keep = [i for i, q in enumerate(scores) if q is None or q.ok]
+    vecs = [None] * len(face_locations)
+    if keep:
+        for i, v in zip(keep, encode(keep)):
+            vecs[i] = v
+    return vecs, scores
+
+def encode_with_landmarks(ctx, live, rects):
+    """Encode bằng landmarks 68 điểm ở LANDMARK_SCALE (rects theo tọa độ ảnh gốc)"""
+    s = Config.LANDMARK_SCALE
+    shapes, _, _ = live.landmarks(ctx, rects, scale=s)
+    return encode_from_landmarks(ctx, shapes, scale=s)
+
+
+class AttendancePipeline:
+    """
+    Pipeline nhận diện của 1 nguồn camera theo kiểu detect-then-track:
+    - Detect HOG đầy đủ mỗi DETECT_EVERY_N tick (hoặc khi chưa có track / mất dấu)
+    - Độ phân giải detect do ResolutionController chọn; giữa các lần quét toàn khung chỉ detect ROI quanh track
+    - Track giữ danh tính + trạng thái liveness -> không encode lại mặt đã nhận ra
+    - Chỉ encode track mới / người lạ / track đến hạn xác minh lại, và chỉ khi mặt đạt chất lượng
+    - Chế độ liveness: landmarks 68 điểm tính 1 lần/track/tick, dùng chung cho encode và EAR/yaw
+    - Motion gate: cảnh không đổi kể từ lần detect trước thì bỏ qua detect
+    - Idle: yên tĩnh quá IDLE_AFTER_SEC hoặc cả roster đã điểm danh -> giảm nhịp AI
+      (không nghỉ khi còn mặt đang chờ liveness: SV ngồi yên chờ chớp mắt gần như không tạo chuyển động)
+    Không phụ thuộc Tkinter: cửa sổ điểm danh chỉ cần gọi process(frame) trên luồng AI.
+    """
+    def __init__(self, use_liveness, checked_in, on_checkin, roster_ids=None):
+        self._create_engines()
+        self.mat.set_roster(roster_ids)
+        self.roster_ids = set(roster_ids or ())
+        self.tracker = FaceTracker()
+        self.motion = MotionGate()
+        self.resolution = ResolutionController()
+        self.quality = FaceQualityGate() if Config.QUALITY_GATE else None
+
+        self.use_liveness = use_liveness
+        self.checked_in = checked_in      # set MSSV đã điểm danh trong phiên (chỉ đọc)
+        self.on_checkin = on_checkin      # callback(uid) khi SV vượt qua nhận diện (+ liveness)
+        self.scale = Config.RESIZE_SCALE
+        self._ticks_since_detect = None
+        self._force_detect = True
+        self._last_detect_time = 0.0
+        self._checked_ctx = None
+        self._was_idle = False
+        self._detect_stats = None
+        self._lm = {}  # track_id -> (shape, pts, valid) của tick hiện tại
+        self._seq = 0
+        self._outbox = []
+        self.last_allocations = 0  # Số ảnh dẫn xuất đã cấp phát ở tick gần nhất
+
+    def _create_engines(self):
+        self.det = FaceDetector(); self.enc = FaceEncoder()
+        self.mat = FaceMatcher(self.enc); self.live = ActionLivenessDetector()
+
+    def close(self):
+        self.mat.close()  # Hủy đăng ký nhận thay đổi gallery
+
+    # --- IDLE / MOTION ---
+    @property
+    def roster_done(self):
+        return bool(self.roster_ids) and self.roster_ids <= self.checked_in
+
+    @property
+    def liveness_pending(self):
+        """Có mặt đang hiện trong khung chờ kiểm tra liveness"""
+        return any(self._needs_liveness(tr) for tr in self.tracker.visible())
+
+    @property
+    def idle(self):
+        # Nghỉ thì EYE_AR_CONSEC_FRAMES frame nhắm mắt liên tiếp gần như không bao giờ bắt được
+        if self.liveness_pending: return False
+        return self.roster_done or self.motion.quiet_for() >= Config.IDLE_AFTER_SEC
+
+    def ai_interval(self):
+        """Chu kỳ AI hiện tại (giây): chậm lại khi nghỉ"""
+        idle = self.idle
+        if idle != self._was_idle:
+            logger.info("💤 AI chuyển sang chế độ nghỉ" if idle else "⚡ AI thức dậy")
+            self._was_idle = idle
+        return Config.IDLE_AI_INTERVAL if idle else Config.AI_INTERVAL
+
+    def check_motion(self, frame):
+        """
+        Kiểm tra chuyển động rẻ (chỉ ảnh xám ~80x60) khi đang nghỉ.
+        Trả về FrameContext nếu có chuyển động (truyền lại cho process để không tính lại), ngược lại None
+        """
+        ctx = FrameContext(frame)
+        # Chuyển động chỉ đánh thức cho 1 lần xử lý; chỉ kéo dài thời gian thức khi còn mặt chờ liveness
+        moved = self.motion.update(ctx, touch=self.liveness_pending)
+        self._checked_ctx = ctx
+        return ctx if moved else None
+
+    def _should_detect(self):
+        if self._force_detect or self._ticks_since_detect is None: return True
+        self._ticks_since_detect += 1
+        # Mặt chờ liveness không có tracker OpenCV giữ box -> detect (thường chỉ ROI) mỗi tick, không thì EAR/yaw
+        # chỉ đo được 1/DETECT_EVERY_N tick và không bắt kịp 1 lần chớp mắt
+        if any(tr.cv_tracker is None and self._needs_liveness(tr) for tr in self.tracker.visible()): return True
+        if self.tracker.tracks and self._ticks_since_detect < Config.DETECT_EVERY_N: return False
+        # Đến hạn detect nhưng cảnh không đổi từ lần detect trước -> bỏ qua (vẫn làm mới định kỳ)
+        if not self.motion.changed_since_reference():
+            return time.time() - self._last_detect_time >= Config.MOTION_REFRESH_SEC
+        return True
+
+    # --- API submit / poll (chung với ProcessAttendancePipeline) ---
+    def submit(self, frame, ctx=None):
+        """Chế độ luồng: xử lý ngay trên luồng gọi, kết quả lấy qua poll(). Trả về seq của frame"""
+        seq = self._seq
+        self._seq += 1
+        self._outbox.append((seq, self.process(frame, ctx)))
+        return seq
+
+    def poll(self, timeout=0.0):
+        """List (seq, draw) đã xử lý xong, theo thứ tự"""
+        out, self._outbox = self._outbox, []
+        return out
+
+    def process(self, frame_orig, ctx=None):
+        """Xử lý 1 frame gốc, trả về list {"rect", "color", "track_id"} để vẽ"""
+        t_start = time.perf_counter()
+        # 1 FrameContext/tick: resize, RGB, Gray... chỉ tính 1 lần, dùng chung cho mọi bước
+        ctx = ctx or FrameContext(frame_orig)
+        if ctx is not self._checked_ctx:
+            self.motion.update(ctx)
+        self._lm = {}
+
+        if self._should_detect():
+            self._detect_and_identify(ctx)
+        else:
+            with metrics.span("track_ms"):
+                self._force_detect = self.tracker.predict(ctx.bgr(self.scale), self.scale)
+
+        # Liveness theo lô cho mọi track cần kiểm tra (landmarks dùng lại từ bước encode nếu có, warm-start theo track_id)
+        targets = self._liveness_targets()
+        acts = {}
+        if targets:
+            with metrics.span("liveness_ms"):
+                lms = self._landmarks(ctx, targets)
+                h, w = ctx.shape[:2]
+                s = Config.LANDMARK_SCALE
+                results = self.live.analyze_landmarks(np.array([lm[1] for lm in lms]), np.array([lm[2] for lm in lms]),
+                                                      (int(w * s), int(h * s)), keys=[tr.track_id for tr in targets])
+            acts = {tr.track_id: act for tr, act in zip(targets, results)}
+        draw = self._draw(lambda tr: acts.get(tr.track_id))
+        self.last_allocations = ctx.allocations
+        tick_ms = (time.perf_counter() - t_start) * 1000.0
+        metrics.observe("ai_tick_ms", tick_ms)
+        self._observe(tick_ms)
+        return draw
+
+    def _draw(self, measure):
+        """measure(track) -> kết quả analyze_action (hoặc None nếu chưa có)"""
+        # Vẽ cả track vừa lỡ 1-2 lần detect (giữ box ổn định, không nhấp nháy)
+        draw = []
+        for tr in self.tracker.tracks:
+            color = self._update_track(tr, measure) if tr.misses == 0 else self._color_of(tr)
+            draw.append({"rect": tr.rect, "color": color, "track_id": tr.track_id})
+        metrics.observe("faces_per_tick", len(draw))
+        return draw
+
+    def _observe(self, tick_ms):
+        if self._detect_stats is not None:
+            # Phản hồi cho bộ chọn độ phân giải: chi phí detect + thời gian còn lại của tick
+            detect_ms, pixels, heights = self._detect_stats
+            self.resolution.observe(detect_ms, pixels, tick_ms, heights)
+            self._detect_stats = None
+
+    def _color_of(self, tr):
+        if not tr.uid: return COLOR_UNKNOWN
+        return COLOR_CHECKED if tr.uid in self.checked_in else COLOR_PENDING
+
+    # --- CÁC BƯỚC DETECT / NHẬN DIỆN (dùng chung cho chế độ luồng và đa tiến trình) ---
+    def _plan_detection(self, shape):
+        """Trả về (det_scale, upsample, rois) cho lần detect tới"""
+        full = self.resolution.is_full_scan(bool(self.tracker.tracks))
+        det_scale, upsample = self.resolution.choose(shape, full)
+        rois = None
+        if not full:
+            # ROI quanh các track (kể cả track vừa lỡ), đủ lớn để cửa sổ HOG còn vừa ở độ phân giải detect
+            min_size = 1.5 * Config.HOG_MIN_FACE / (det_scale * 2 ** upsample)
+            rois = [expand_roi(tr.rect, shape, Config.ROI_MARGIN, min_size) for tr in self.tracker.tracks]
+        return det_scale, upsample, rois
+
+    def _apply_detections(self, rects, detect_ms, pixels):
+        """Ghép box mới (tọa độ ảnh gốc) vào tracker. Trả về (track theo từng box, chỉ số box cần encode)"""
+        self._detect_stats = (detect_ms, pixels, [b - t for (t, r, b, l) in rects])
+        assigned = self.tracker.update(rects)
+        self._ticks_since_detect = 0
+        self._force_detect = False
+        self._last_detect_time = time.time()
+        self.motion.set_reference()
+        # Chỉ encode những track chưa biết danh tính / đến hạn xác minh lại
+        return assigned, [i for i, tr in enumerate(assigned) if tr.needs_encoding]
+
+    def _apply_identities(self, tracks, vecs, scores=None):
+        if scores:
+            for tr, q in zip(tracks, scores): tr.quality = q
+        # Mặt bị hoãn (vec None) giữ nguyên trạng thái -> encode lại ở lần detect sau
+        pairs = [(tr, v) for tr, v in zip(tracks, vecs) if v is not None]
+        if not pairs: return
+        # So khớp cả frame trong 1 phép nhân ma trận (thay vì gọi find_match từng mặt)
+        with metrics.span("match_ms"):
+            matches = self.mat.match_all([v for _, v in pairs])
+        for (tr, _), (uid, conf) in zip(pairs, matches):
+            tr.set_identity(uid, conf if uid else 0.0)
+
+    def _to_small(self, rect):
+        s = self.scale
+        return tuple(int(v * s) for v in rect)
+
+    def _detect_and_identify(self, ctx):
+        det_scale, upsample, rois = self._plan_detection(ctx.shape)
+        t0 = time.perf_counter()
+        rects = self.det.detect(ctx, scale=1.0, det_scale=det_scale, upsample=upsample, rois=rois)
+        detect_ms = (time.perf_counter() - t0) * 1000.0
+        metrics.observe("detect_ms", detect_ms)
+        assigned, need = self._apply_detections(rects, detect_ms, self.det.last_pixels)
+        if need:
+            tracks = [assigned[i] for i in need]
+            locs = [self._to_small(rects[i]) for i in need]
+            if self._shared_landmarks():
+                # Landmarks 68 điểm của track được cache -> liveness cùng tick không chạy landmark lần 2
+                encode = lambda keep: encode_from_landmarks(
+                    ctx, [lm[0] for lm in self._landmarks(ctx, [tracks[i] for i in keep])], scale=Config.LANDMARK_SCALE)
+            else:
+                encode = lambda keep: self.enc.encode(ctx, [locs[i] for i in keep], scale=self.scale)
+            with metrics.span("encode_ms"):
+                vecs, scores = encode_with_quality(ctx, locs, self.scale, self.quality, encode=encode)
+            self._apply_identities(tracks, vecs, scores)
+        self.tracker.init_visual(ctx.bgr(self.scale), self.scale)
+
+    def _shared_landmarks(self):
+        # Chỉ có lợi khi liveness bật (shape predictor 68 điểm đã nạp, dù sao cũng phải chạy cho EAR/yaw)
+        return (Config.SHARED_LANDMARKS and self.use_liveness
+                and self.live is not None and self.live.predictor is not None)
+
+    def _landmarks(self, ctx, tracks):
+        """Landmarks 68 điểm ở LANDMARK_SCALE, tính tối đa 1 lần cho mỗi track trong tick"""
+        missing = [tr for tr in tracks if tr.track_id not in self._lm]
+        if missing:
+            shapes, pts, valid = self.live.landmarks(ctx, [tr.rect for tr in missing], scale=Config.LANDMARK_SCALE)
+            for i, tr in enumerate(missing):
+                self._lm[tr.track_id] = (shapes[i], pts[i], valid[i])
+        return [self._lm[tr.track_id] for tr in tracks]
+
+    def _needs_liveness(self, tr):
+        return self.use_liveness and tr.uid is not None and tr.uid not in self.checked_in
+
+    def _liveness_targets(self):
+        # Chỉ đo trên box mới của tick này: box cũ lệch khi đầu di chuyển -> landmarks sai, chớp mắt / quay đầu giả
+        return [tr for tr in self.tracker.visible() if tr.fresh and self._needs_liveness(tr)]
+
+    def _update_track(self, tr, measure):
+        """Cập nhật trạng thái điểm danh của 1 track, trả về màu box"""
+        uid = tr.uid
+        if not uid: return COLOR_UNKNOWN
+        if uid in self.checked_in: return COLOR_CHECKED
+
+        if not self.use_liveness:
+            self.on_checkin(uid)
+            return COLOR_CHECKED
+
+        st = tr.liveness
+        act = measure(tr)
+        if act and act['valid']:
+            if act['ear'] < Config.EYE_AR_THRESH: st['c'] += 1
+            else:
+                if st['c'] >= Config.EYE_AR_CONSEC_FRAMES: st['blink'] = True
+                st['c'] = 0
+
+            if abs(act['yaw']) > Config.YAW_THRESH: st['turn'] = True
+
+            if st['blink'] or st['turn']:
+                self.on_checkin(uid)
+                return COLOR_CHECKED
+        return COLOR_PENDING
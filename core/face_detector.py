@@ -1,35 +1,86 @@
-import cv2
 import face_recognition
+import numpy as np
 from app.config import Config
+from core.frame_context import as_context
+
+def merge_rois(rois):
+    """Gộp các ROI (top, right, bottom, left) chồng lấn nhau -> không detect trùng 1 vùng 2 lần"""
+    rois = [list(r) for r in rois]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[3] < b[1] and b[3] < a[1]:
+                    rois[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                    del rois[j]
+                    merged = True
+                    break
+            if merged: break
+    return [tuple(r) for r in rois]
+
+def expand_roi(rect, shape, margin, min_size=0):
+    """Nới box (tọa độ ảnh gốc) thêm margin * kích thước mỗi phía, tối thiểu min_size, cắt theo khung hình"""
+    t, r, b, l = rect
+    h, w = shape[:2]
+    cy, cx = (t + b) / 2.0, (l + r) / 2.0
+    half_h = max((b - t) * (0.5 + margin), min_size / 2.0)
+    half_w = max((r - l) * (0.5 + margin), min_size / 2.0)
+    return (max(0, int(cy - half_h)), min(w, int(cx + half_w)),
+            min(h, int(cy + half_h)), max(0, int(cx - half_w)))
+
 
 class FaceDetector:
     def __init__(self):
         self.model = Config.DETECTION_MODEL  # 'hog'
         self.scale = Config.RESIZE_SCALE
+        self.last_pixels = 0  # Số pixel đã quét ở lần detect gần nhất (để ước lượng chi phí)
 
-    def detect(self, frame):
+    def detect(self, frame, scale=1.0, det_scale=None, upsample=None, rois=None):
         """
-        Input: Frame ảnh gốc (kích thước lớn)
-        Output: List các tọa độ khuôn mặt [(top, right, bottom, left), ...] đã scale về kích thước gốc
+        Input: Frame ảnh gốc (ndarray) hoặc FrameContext dùng chung của tick AI
+        scale: hệ tọa độ đầu ra so với frame gốc (1.0 = tọa độ ảnh gốc)
+        det_scale: độ phân giải chạy HOG so với frame gốc (mặc định scale * RESIZE_SCALE như cũ)
+        upsample: số lần upsample của HOG (mặc định 1 như face_recognition)
+        rois: list vùng (top, right, bottom, left) theo tọa độ ảnh gốc; None = quét toàn khung
+        Output: List các tọa độ khuôn mặt [(top, right, bottom, left), ...] theo hệ tọa độ `scale`
         """
-        # 1. Resize ảnh nhỏ lại để CPU xử lý nhanh hơn
-        small_frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
-        
-        # 2. Chuyển hệ màu BGR (OpenCV) -> RGB (dlib/face_recognition)
-        rgb_small_frame = small_frame[:, :, ::-1] # Hoặc cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        ctx = as_context(frame)
+        if det_scale is None: det_scale = scale * self.scale
+        if upsample is None: upsample = 1
+
+        # 1 + 2. Ảnh nhỏ hệ RGB (dlib/face_recognition) - lấy từ FrameContext, không resize/đổi màu lại
+        rgb_small_frame = ctx.rgb(det_scale)
+        h, w = rgb_small_frame.shape[:2]
+
+        if rois is None:
+            regions = [(0, w, h, 0)]
+        else:
+            regions = [(int(t * det_scale), min(w, int(r * det_scale)), min(h, int(b * det_scale)), int(l * det_scale))
+                       for (t, r, b, l) in merge_rois(rois)]
 
         # 3. Chạy thuật toán HOG để tìm vị trí khuôn mặt
         # HOG hoạt động dựa trên việc phân tích các cạnh và hướng của điểm ảnh
-        face_locations_small = face_recognition.face_locations(rgb_small_frame, model=self.model)
+        face_locations_small = []
+        self.last_pixels = 0
+        for (t, r, b, l) in regions:
+            if b - t < 8 or r - l < 8: continue
+            # Cắt theo cột không còn liên tục -> copy vùng nhỏ (dlib cần mảng C-contiguous)
+            crop = rgb_small_frame if rois is None else np.ascontiguousarray(rgb_small_frame[t:b, l:r])
+            self.last_pixels += crop.shape[0] * crop.shape[1] * (4 ** upsample)
+            for (top, right, bottom, left) in face_recognition.face_locations(
+                    crop, number_of_times_to_upsample=upsample, model=self.model):
+                face_locations_small.append((top + t, right + l, bottom + t, left + l))
 
-        # 4. Tính lại tọa độ cho ảnh gốc (vì nãy đã resize nhỏ đi)
+        # 4. Tính lại tọa độ theo hệ `scale` (vì nãy đã resize nhỏ đi)
         face_locations = []
-        inv_scale = 1 / self.scale
+        ratio = scale / det_scale
         for (top, right, bottom, left) in face_locations_small:
-            top = int(top * inv_scale)
-            right = int(right * inv_scale)
-            bottom = int(bottom * inv_scale)
-            left = int(left * inv_scale)
+            top = int(top * ratio)
+            right = int(right * ratio)
+            bottom = int(bottom * ratio)
+            left = int(left * ratio)
             face_locations.append((top, right, bottom, left))
 
-        return face_locations
\ No newline at end of file
+        return face_locations
@@ -1,83 +1,88 @@
 import face_recognition
-import pickle
-import os
 import cv2
 import numpy as np
 from app.config import Config
+from core.gallery_service import GalleryService
+from core.frame_context import as_context
+from core.face_quality import FaceQualityGate
+
+def encode_faces(frame, face_locations, scale=1.0):
+    """Encode các mặt (tọa độ theo hệ `scale`) trên ảnh RGB của FrameContext - không cần gallery"""
+    if frame is None: return []
+    try:
+        rgb_frame = as_context(frame).rgb(scale)
+    except Exception as e:
+        print(f"[PREPARE ERROR] {e}")
+        return []
+    try:
+        return face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=1)
+    except: return []
+
+def encode_from_landmarks(frame, shapes, scale=1.0, num_jitters=1):
+    """
+    Encode dùng landmarks 68 điểm đã tính sẵn (dlib full_object_detection theo hệ tọa độ `scale`):
+    bỏ qua bước landmark nội bộ của face_recognition -> 1 lần landmark dùng chung cho encode và liveness.
+    shapes[i] = None -> kết quả thứ i = None
+    """
+    if frame is None: return [None] * len(shapes)
+    rgb_frame = as_context(frame).rgb(scale)
+    model = face_recognition.api.face_encoder  # dlib.face_recognition_model_v1 đã nạp sẵn trong face_recognition
+    out = []
+    for shape in shapes:
+        if shape is None:
+            out.append(None); continue
+        try: out.append(np.array(model.compute_face_descriptor(rgb_frame, shape, num_jitters)))
+        except Exception: out.append(None)
+    return out
+
 
 class FaceEncoder:
     def __init__(self):
-        self.known_encodings = []
-        self.known_ids = []
-        self.load_database()
+        # Gallery dùng chung toàn tiến trình: nạp 1 lần, mọi cửa sổ thấy thay đổi của nhau
+        self.service = GalleryService.instance()
+        self.enroll_gate = FaceQualityGate(strict=True)
+
+    @property
+    def gallery(self):
+        return self.service.gallery
+
+    @property
+    def index(self):
+        return self.service.index
+
+    @property
+    def known_encodings(self):
+        return self.gallery.matrix
+
+    @property
+    def known_ids(self):
+        return self.gallery.ids
 
     def load_database(self):
-        if os.path.exists(Config.ENCODINGS_PATH):
-            try:
-                with open(Config.ENCODINGS_PATH, "rb") as f:
-                    data = pickle.load(f)
-                    self.known_encodings = data.get("encodings", [])
-                    self.known_ids = data.get("ids", [])
-                print(f"[INFO] Đã load {len(self.known_encodings)} khuôn mặt.")
-            except Exception as e:
-                print(f"[ERROR] Lỗi đọc DB: {e}")
-                self.known_encodings = []
-                self.known_ids = []
-        else:
-            os.makedirs(os.path.dirname(Config.ENCODINGS_PATH), exist_ok=True)
-
-    def save_database(self):
-        data = {"encodings": self.known_encodings, "ids": self.known_ids}
-        try:
-            with open(Config.ENCODINGS_PATH, "wb") as f:
-                pickle.dump(data, f)
-            print("[INFO] Saved DB.")
-        except Exception as e:
-            print(f"[ERROR] Save failed: {e}")
+        """Nạp lại gallery từ đĩa (thường không cần: service đã nạp sẵn khi khởi tạo)"""
+        self.service.load()
 
-    def _prepare_image_robust(self, frame):
+    def _prepare_image_robust(self, frame, scale=1.0):
         """
-        Chuẩn hóa ảnh thành 2 phiên bản:
+        Chuẩn hóa ảnh thành 2 phiên bản (lấy từ FrameContext, mỗi view chỉ tính 1 lần/frame):
         1. Gray (2D): Để detect mặt (Tránh lỗi stride trên Mac)
         2. RGB (3D): Để encode đặc điểm
+        cvtColor luôn tạo buffer mới nên đã tách khỏi buffer của camera, không cần copy thêm.
         """
         if frame is None: return None, None
         
-        # 1. Ép kiểu dữ liệu an toàn tuyệt đối
         try:
-            # Copy dữ liệu ra vùng nhớ mới để ngắt kết nối với buffer của camera
-            img = np.array(frame, copy=True)
-            
-            # Xử lý kênh Alpha (nếu có)
-            if img.shape[-1] == 4:
-                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-                
-            # Ép về uint8
-            if img.dtype != 'uint8':
-                img = img.astype('uint8')
-
-            # 2. Tạo ảnh Xám (Gray) - 2D Array
-            # Dlib detect trên ảnh này cực nhanh và không lỗi format
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            gray = np.ascontiguousarray(gray)
-
-            # 3. Tạo ảnh Màu (RGB) - 3D Array
-            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            rgb = np.ascontiguousarray(rgb)
-            
-            return rgb, gray
-            
+            ctx = as_context(frame)
+            return ctx.rgb(scale), ctx.gray(scale)
         except Exception as e:
             print(f"[PREPARE ERROR] {e}")
             return None, None
 
     def is_face_registered(self, encoding):
-        if not self.known_encodings: return False, None
         try:
-            distances = face_recognition.face_distance(self.known_encodings, encoding)
-            min_dist = np.min(distances)
-            if min_dist < Config.MATCH_TOLERANCE:
-                return True, self.known_ids[np.argmin(distances)]
+            cands = self.service.search([encoding], k=1)[0]
+            if cands and cands[0][1] < Config.MATCH_TOLERANCE:
+                return True, cands[0][0]
         except: pass
         return False, None
 
@@ -98,6 +103,12 @@ class FaceEncoder:
             if len(boxes) > 1:
                 return False, "Phát hiện nhiều người. Vui lòng đứng 1 mình!"
 
+            # Bước 2b: Chấm chất lượng -> từ chối ngay ảnh xấu thay vì lưu 1 mẫu kém vĩnh viễn
+            if Config.QUALITY_GATE:
+                q = self.enroll_gate.assess(gray_frame, boxes)[0]
+                if not q.ok:
+                    return False, f"Ảnh chưa đạt: {q.reason}"
+
             # Bước 3: ENCODE TRÊN ẢNH MÀU
             # Lúc này đã có tọa độ (boxes) từ ảnh xám, ta áp nó vào ảnh màu để lấy đặc điểm
             encodings = face_recognition.face_encodings(rgb_frame, boxes, num_jitters=1)
@@ -107,21 +118,8 @@ class FaceEncoder:
             
             new_encoding = encodings[0]
             
-            # Bước 4: Check trùng & Lưu
-            is_dup, dup_id = self.is_face_registered(new_encoding)
-            if is_dup:
-                if dup_id == user_id: 
-                    # Update lại
-                    idx = self.known_ids.index(user_id)
-                    self.known_encodings[idx] = new_encoding
-                    self.save_database()
-                    return True, "Cập nhật dữ liệu thành công"
-                return False, f"Khuôn mặt này đã thuộc về: {dup_id}"
-
-            self.known_encodings.append(new_encoding)
-            self.known_ids.append(user_id)
-            self.save_database()
-            return True, "Đăng ký thành công!"
+            # Bước 4: Check trùng & Lưu (trong cùng 1 khóa ghi của gallery dùng chung)
+            return self._enroll(user_id, new_encoding)
 
         except RuntimeError as re:
             # Nếu vẫn lỗi, ta thử fallback cuối cùng: Encode trên ảnh xám (ít chính xác hơn nhưng không lỗi)
@@ -133,11 +131,8 @@ class FaceEncoder:
                 fake_rgb = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2RGB)
                 encodings = face_recognition.face_encodings(fake_rgb, boxes)
                 if encodings:
-                    new_encoding = encodings[0]
-                    self.known_encodings.append(new_encoding)
-                    self.known_ids.append(user_id)
-                    self.save_database()
-                    return True, "Đăng ký thành công (Chế độ Grayscale)"
+                    # Vẫn qua enroll: kiểm tra trùng như nhánh chính (không đăng ký 1 người dưới 2 MSSV)
+                    return self._enroll(user_id, encodings[0], " (Chế độ Grayscale)")
             except Exception as e2:
                 return False, f"Lỗi hệ thống nghiêm trọng: {e2}"
                 
@@ -147,19 +142,17 @@ class FaceEncoder:
             print(f"[ERROR] Add Face General: {e}")
             return False, f"Lỗi: {str(e)}"
 
-    def encode(self, frame, face_locations):
-        # Dùng cho luồng điểm danh
-        rgb_frame, _ = self._prepare_image_robust(frame)
-        if rgb_frame is None: return []
-        try:
-            return face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=1)
-        except: return []
+    def _enroll(self, user_id, encoding, note=""):
+        status, owner = self.service.enroll(user_id, encoding)
+        if status == "duplicate":
+            return False, f"Khuôn mặt này đã thuộc về: {owner}"
+        if status == "updated":
+            return True, f"Cập nhật dữ liệu thành công{note}"
+        return True, f"Đăng ký thành công!{note}"
+
+    def encode(self, frame, face_locations, scale=1.0):
+        # Dùng cho luồng điểm danh: frame là FrameContext dùng chung, face_locations theo hệ tọa độ `scale`
+        return encode_faces(frame, face_locations, scale)
 
     def remove_encoding(self, user_id):
-        to_keep = [i for i, uid in enumerate(self.known_ids) if uid != user_id]
-        if len(to_keep) == len(self.known_ids): return False
-        
-        self.known_encodings = [self.known_encodings[i] for i in to_keep]
-        self.known_ids = [self.known_ids[i] for i in to_keep]
-        self.save_database()
-        return True
\ No newline at end of file
+        return self.service.remove(user_id)
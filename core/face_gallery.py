@@ -0,0 +1,141 @@
+import numpy as np
+
+class FaceGallery:
+    """
+    Kho vector khuôn mặt dạng ma trận liên tục (float32) giữ trong RAM.
+    - Cấp phát trước theo capacity, tự nhân đôi khi đầy (tránh np.vstack mỗi lần thêm)
+    - Tính sẵn bình phương chuẩn ||g||^2 của từng dòng để so khớp bằng 1 phép nhân ma trận
+    """
+    DIM = 128
+
+    def __init__(self, capacity=1024):
+        self._matrix = np.zeros((max(1, capacity), self.DIM), dtype=np.float32)
+        self._sq_norms = np.zeros(max(1, capacity), dtype=np.float32)
+        self._count = 0
+        self.ids = []
+        self.version = 0  # Tăng mỗi lần dữ liệu thay đổi (dùng để vô hiệu cache)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def matrix(self):
+        """View (không copy) các dòng đang dùng: shape (N, 128)"""
+        return self._matrix[:self._count]
+
+    @property
+    def sq_norms(self):
+        return self._sq_norms[:self._count]
+
+    def _ensure_capacity(self, n):
+        cap = self._matrix.shape[0]
+        if n <= cap: return
+        while cap < n: cap *= 2
+        matrix = np.zeros((cap, self.DIM), dtype=np.float32)
+        matrix[:self._count] = self._matrix[:self._count]
+        sq_norms = np.zeros(cap, dtype=np.float32)
+        sq_norms[:self._count] = self._sq_norms[:self._count]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    def load(self, encodings, ids):
+        """Nạp lại toàn bộ gallery từ list/ma trận vector"""
+        n = len(ids)
+        self._count = 0
+        self.ids = []
+        self._ensure_capacity(n)
+        if n:
+            self._matrix[:n] = np.asarray(encodings, dtype=np.float32).reshape(n, self.DIM)
+            self._sq_norms[:n] = np.einsum("ij,ij->i", self._matrix[:n], self._matrix[:n])
+        self._count = n
+        self.ids = list(ids)
+        self.version += 1
+
+    def index_of(self, user_id):
+        try:
+            return self.ids.index(user_id)
+        except ValueError:
+            return None
+
+    def add(self, user_id, encoding):
+        """Thêm 1 vector vào cuối, trả về chỉ số dòng"""
+        self._ensure_capacity(self._count + 1)
+        row = self._count
+        self._set_row(row, encoding)
+        self.ids.append(user_id)
+        self._count += 1
+        self.version += 1
+        return row
+
+    def replace(self, row, encoding):
+        self._set_row(row, encoding)
+        self.version += 1
+
+    def _set_row(self, row, encoding):
+        vec = np.asarray(encoding, dtype=np.float32).reshape(self.DIM)
+        self._matrix[row] = vec
+        self._sq_norms[row] = np.dot(vec, vec)
+
+    def remove(self, user_id):
+        """
+        Xóa mọi vector của user_id. Dòng cuối được chuyển vào chỗ trống (swap-remove)
+        để giữ ma trận liên tục mà không phải dịch toàn bộ.
+        Trả về list (row_bị_xóa, row_cũ_được_chuyển_vào | None) theo đúng thứ tự thực hiện,
+        để index phía trên cập nhật theo.
+        """
+        changes = []
+        row = self.index_of(user_id)
+        while row is not None:
+            last = self._count - 1
+            moved_from = None
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self.ids[row] = self.ids[last]
+                moved_from = last
+            self.ids.pop()
+            self._count -= 1
+            changes.append((row, moved_from))
+            row = self.index_of(user_id)
+        if changes: self.version += 1
+        return changes
+
+    def distances(self, queries, rows=None):
+        """
+        Khoảng cách Euclidean giữa M vector truy vấn và N vector gallery (hoặc chỉ các dòng `rows`).
+        ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g  -> 1 phép nhân ma trận (M, N)
+        """
+        q = np.ascontiguousarray(np.asarray(queries, dtype=np.float32).reshape(-1, self.DIM))
+        if rows is None:
+            g, g_sq = self.matrix, self.sq_norms
+        else:
+            g, g_sq = self._matrix[rows], self._sq_norms[rows]
+        q_sq = np.einsum("ij,ij->i", q, q)
+        d2 = q_sq[:, None] + g_sq[None, :] - 2.0 * (q @ g.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    def top_k(self, queries, k=1, rows=None):
+        """
+        Trả về (rows, dists) shape (M, k') với k' = min(k, N), đã sắp xếp tăng dần theo khoảng cách.
+        Nếu truyền `rows`, chỉ xét các dòng đó nhưng vẫn trả về chỉ số dòng gốc trong gallery.
+        """
+        d = self.distances(queries, rows)
+        part, part_d = smallest_k(d, k)
+        if rows is not None:
+            part = np.asarray(rows)[part]
+        return part, part_d
+
+
+def smallest_k(d, k):
+    """Chọn k cột nhỏ nhất trên từng dòng của ma trận khoảng cách (argpartition + sort k phần tử)"""
+    n = d.shape[1]
+    k = min(k, n)
+    if k == 0:
+        return np.empty((d.shape[0], 0), dtype=np.int64), np.empty((d.shape[0], 0), dtype=np.float32)
+    if k < n:
+        part = np.argpartition(d, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(n), d.shape).copy()
+    part_d = np.take_along_axis(d, part, axis=1)
+    order = np.argsort(part_d, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_d, order, axis=1)
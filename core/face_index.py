@@ -0,0 +1,255 @@
+import os
+import time
+import logging
+import numpy as np
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class BruteForceIndex:
+    """
+    Backend chính xác: quét toàn bộ gallery bằng 1 phép nhân ma trận.
+    Không có trạng thái riêng nên add/remove/save/load đều là no-op.
+    """
+    name = "brute"
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def build(self): pass
+    def add(self, row): pass
+    def update(self, row): pass
+    def remove(self, row, moved_from): pass
+    def save(self, path): pass
+    def load(self, path): return True
+
+    def search(self, queries, k=1):
+        """Trả về (rows, dists) shape (M, k') giống FaceGallery.top_k"""
+        return self.gallery.top_k(queries, k)
+
+
+class IVFIndex:
+    """
+    Backend xấp xỉ kiểu IVF (Inverted File), chỉ dùng NumPy:
+    - Chia gallery thành `nlist` ô bằng k-means, mỗi vector thuộc ô có tâm gần nhất
+    - Khi tìm kiếm: chỉ quét `nprobe` ô gần truy vấn nhất -> chi phí ~ N * nprobe / nlist
+    - Thêm/xóa từng vector không cần train lại; tự train lại khi gallery tăng gấp đôi
+    Gallery nhỏ hơn IVF_MIN_TRAIN thì tìm kiếm chính xác (brute-force) vì đã đủ nhanh.
+    """
+    name = "ivf"
+
+    def __init__(self, gallery, nlist=None, nprobe=None):
+        self.gallery = gallery
+        self.nlist_cfg = Config.IVF_NLIST if nlist is None else nlist
+        self.nprobe = Config.IVF_NPROBE if nprobe is None else nprobe
+        self.centroids = None
+        self._centroid_sq = None
+        self._assign = np.zeros(0, dtype=np.int32)  # row -> ô
+        self._pos = np.zeros(0, dtype=np.int64)     # row -> vị trí trong list của ô
+        self._lists = []
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self._trained_size = 0
+        self.dirty = False  # Có thay đổi cần lưu (sau khi build)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _auto_nlist(self, n):
+        if self.nlist_cfg: return int(self.nlist_cfg)
+        return max(1, int(4 * np.sqrt(n)))
+
+    # --- TRAIN / BUILD ---
+    def build(self):
+        n = len(self.gallery)
+        self.dirty = True
+        if n < max(Config.IVF_MIN_TRAIN, 1):
+            self.centroids = None
+            self._lists = []
+            self._trained_size = 0
+            return
+        t0 = time.time()
+        nlist = min(self._auto_nlist(n), n)
+        self.centroids = self._kmeans(self.gallery.matrix, nlist)
+        self._centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._assign_all()
+        self._trained_size = n
+        logger.info(f"IVF index: train {n} vector / {nlist} ô trong {time.time() - t0:.2f}s")
+
+    def _kmeans(self, data, nlist, iters=8, sample=32, seed=0):
+        """k-means (Lloyd) trên tập mẫu con (~sample điểm/ô), khởi tạo ngẫu nhiên từ dữ liệu"""
+        rng = np.random.default_rng(seed)
+        n = data.shape[0]
+        if n > nlist * sample:
+            data = data[rng.choice(n, nlist * sample, replace=False)]
+        centroids = data[rng.choice(data.shape[0], nlist, replace=False)].copy()
+        for _ in range(iters):
+            c_sq = np.einsum("ij,ij->i", centroids, centroids)
+            labels = np.argmin(c_sq[None, :] - 2.0 * (data @ centroids.T), axis=1)
+            # Cộng dồn theo ô: bincount từng chiều (nhanh hơn np.add.at / reduceat nhiều lần)
+            counts = np.bincount(labels, minlength=nlist)
+            sums = np.stack([np.bincount(labels, weights=data[:, j], minlength=nlist)
+                             for j in range(data.shape[1])], axis=1)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Ô rỗng: lấy các điểm xa tâm nhất làm tâm mới
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                diff = data - centroids[labels]
+                far = np.argsort(np.einsum("ij,ij->i", diff, diff))[::-1]
+                centroids[empty] = data[far[:len(empty)]]
+        return np.ascontiguousarray(centroids, dtype=np.float32)
+
+    def _nearest_cells(self, vecs, nprobe):
+        vecs = np.asarray(vecs, dtype=np.float32).reshape(-1, self.gallery.DIM)
+        d = self._centroid_sq[None, :] - 2.0 * (vecs @ self.centroids.T)
+        nprobe = min(nprobe, d.shape[1])
+        if nprobe == 1:
+            return np.argmin(d, axis=1)[:, None]
+        return np.argpartition(d, nprobe - 1, axis=1)[:, :nprobe]
+
+    def _assign_all(self):
+        n = len(self.gallery)
+        nlist = self.centroids.shape[0]
+        self._assign = np.zeros(max(n, 1), dtype=np.int32)
+        self._pos = np.zeros(max(n, 1), dtype=np.int64)
+        if n:
+            self._assign[:n] = self._nearest_cells(self.gallery.matrix, 1)[:, 0]
+        self._rebuild_lists(n, nlist)
+
+    def _rebuild_lists(self, n, nlist):
+        # Mỗi ô là 1 mảng int64 có capacity riêng + kích thước thực (_sizes) -> ghép ứng viên bằng slice
+        counts = np.bincount(self._assign[:n], minlength=nlist)
+        order = np.argsort(self._assign[:n], kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        self._lists = []
+        for cell in range(nlist):
+            members = order[starts[cell]:starts[cell] + counts[cell]]
+            arr = np.empty(max(8, 2 * len(members)), dtype=np.int64)
+            arr[:len(members)] = members
+            self._lists.append(arr)
+            self._pos[members] = np.arange(len(members))
+        self._sizes = counts.astype(np.int64)
+
+    def _grow(self, n):
+        if n <= self._assign.shape[0]: return
+        cap = max(n, 2 * self._assign.shape[0])
+        assign = np.zeros(cap, dtype=np.int32); assign[:self._assign.shape[0]] = self._assign
+        pos = np.zeros(cap, dtype=np.int64); pos[:self._pos.shape[0]] = self._pos
+        self._assign, self._pos = assign, pos
+
+    # --- CẬP NHẬT TĂNG DẦN ---
+    def add(self, row):
+        """Gọi SAU khi gallery đã thêm dòng mới `row`"""
+        n = len(self.gallery)
+        if not self.is_trained or n >= 2 * self._trained_size:
+            # Chưa train, hoặc gallery đã tăng gấp đôi (phân bố đổi nhiều) -> train lại
+            if n >= Config.IVF_MIN_TRAIN: self.build()
+            return
+        self._grow(n)
+        self._link(row)
+
+    def update(self, row):
+        """Gọi SAU khi gallery ghi đè vector ở dòng `row` (cập nhật khuôn mặt)"""
+        if not self.is_trained: return
+        self._unlink(row)
+        self._link(row)
+
+    def _link(self, row):
+        cell = int(self._nearest_cells(self.gallery.matrix[row], 1)[0, 0])
+        size = int(self._sizes[cell])
+        if size == len(self._lists[cell]):
+            arr = np.empty(2 * size, dtype=np.int64); arr[:size] = self._lists[cell]
+            self._lists[cell] = arr
+        self._lists[cell][size] = row
+        self._sizes[cell] = size + 1
+        self._assign[row] = cell
+        self._pos[row] = size
+
+    def _unlink(self, row):
+        """Gỡ `row` khỏi ô của nó (swap-remove trong mảng của ô)"""
+        cell = int(self._assign[row])
+        lst = self._lists[cell]
+        p = int(self._pos[row])
+        last_p = int(self._sizes[cell]) - 1
+        last = int(lst[last_p])
+        if last != row:
+            lst[p] = last
+            self._pos[last] = p
+        self._sizes[cell] = last_p
+
+    def remove(self, row, moved_from):
+        """Đồng bộ với FaceGallery.remove: xóa `row`, rồi dòng `moved_from` đổi tên thành `row`"""
+        if not self.is_trained: return
+        self._unlink(row)
+        if moved_from is not None:
+            cell = int(self._assign[moved_from])
+            p = int(self._pos[moved_from])
+            self._lists[cell][p] = row
+            self._assign[row] = cell
+            self._pos[row] = p
+
+    # --- TÌM KIẾM ---
+    def search(self, queries, k=1):
+        if not self.is_trained:
+            return self.gallery.top_k(queries, k)
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.gallery.DIM)
+        cells = self._nearest_cells(q, self.nprobe)
+        out_rows = np.full((q.shape[0], k), -1, dtype=np.int64)
+        out_dist = np.full((q.shape[0], k), np.inf, dtype=np.float32)
+        for i in range(q.shape[0]):
+            cand = np.concatenate([self._lists[c][:self._sizes[c]] for c in cells[i]])
+            if not len(cand): continue
+            rows, dists = self.gallery.top_k(q[i], k, rows=cand)
+            m = rows.shape[1]
+            out_rows[i, :m] = rows[0]
+            out_dist[i, :m] = dists[0]
+        # Cắt bớt cột nếu tổng số ứng viên < k (giữ shape giống brute-force)
+        width = min(k, len(self.gallery))
+        return out_rows[:, :width], out_dist[:, :width]
+
+    # --- LƯU / NẠP ---
+    def save(self, path):
+        """
+        Chỉ lưu phần đã train (tâm các ô) - thay đổi hiếm, chỉ sau mỗi lần build.
+        Việc gán vector vào ô được tính lại khi load (thứ tự dòng gallery có thể khác giữa các lần nạp).
+        """
+        if not self.dirty: return
+        if not self.is_trained:
+            if os.path.exists(path): os.remove(path)
+        else:
+            tmp = path + ".tmp.npz"
+            np.savez(tmp, centroids=self.centroids, trained_size=np.int64(self._trained_size))
+            os.replace(tmp, path)
+        self.dirty = False
+
+    def load(self, path):
+        """Nạp tâm các ô đã train rồi gán lại toàn bộ gallery. Trả về False nếu cần build lại"""
+        if not os.path.exists(path): return False
+        try:
+            with np.load(path) as data:
+                if data["centroids"].shape[1] != self.gallery.DIM:
+                    return False
+                self.centroids = np.ascontiguousarray(data["centroids"], dtype=np.float32)
+                self._trained_size = int(data["trained_size"])
+            self._centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+            self._assign_all()
+            self.dirty = False
+            return True
+        except Exception as e:
+            logger.warning(f"Không đọc được index {path}: {e}")
+            self.centroids = None
+            return False
+
+
+INDEX_BACKENDS = {
+    BruteForceIndex.name: BruteForceIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+def create_index(gallery, backend=None):
+    """Tạo index theo Config.INDEX_BACKEND ('brute' | 'ivf')"""
+    backend = backend or Config.INDEX_BACKEND
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"INDEX_BACKEND không hợp lệ: {backend}")
+    return INDEX_BACKENDS[backend](gallery)
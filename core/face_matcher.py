@@ -1,33 +1,118 @@
-import face_recognition
 import numpy as np
+from collections import deque
 from app.config import Config
+from core.face_gallery import FaceGallery
 
 class FaceMatcher:
     def __init__(self, encoder):
-        # Matcher cần dữ liệu vector từ Encoder đang giữ trong RAM
+        # Matcher dùng gallery dùng chung (GalleryService) mà Encoder đang trỏ tới
         self.encoder = encoder
+        self.service = encoder.service
+        # Roster của phiên (lớp/danh sách SV): tìm trong sub-gallery nhỏ trước
+        self.roster = None
+        self._sub_gallery = None
+        self._sub_version = None
+        # Delta từ service (thêm/xóa SV giữa phiên) - áp dụng trên luồng gọi find_matches.
+        # Chỉ đăng ký nhận khi có roster: không roster thì không ai lấy sự kiện ra khỏi hàng đợi
+        self._pending = deque()
+        self._unsubscribe = None
 
-    def find_match(self, unknown_encoding):
+    def close(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        self._pending.clear()
+
+    def set_roster(self, student_ids):
+        """Giới hạn ưu tiên tìm kiếm trong danh sách SV của phiên. None/rỗng = toàn bộ gallery"""
+        self.roster = frozenset(str(s) for s in student_ids) if student_ids else None
+        self._sub_gallery = None
+        self._sub_version = None
+        if self.roster is None:
+            self.close()
+        elif self._unsubscribe is None:
+            self._unsubscribe = self.service.subscribe(self._pending.append)
+
+    def _roster_gallery(self):
+        """Sub-gallery (ma trận liên tục riêng) của roster: build 1 lần, sau đó chỉ áp delta"""
+        events = []
+        while self._pending: events.append(self._pending.popleft())
+        # Sự kiện được phát ngoài khóa ghi -> nhiều luồng ghi có thể giao lệch thứ tự: sắp lại theo version
+        for event in sorted(events, key=lambda e: e.version):
+            # Bỏ qua sự kiện đã nằm trong snapshot (xếp hàng trước khi snapshot được chụp)
+            if self._sub_gallery is None or event.version <= self._sub_version: continue
+            if event.version != self._sub_version + 1:
+                # Hở version (sự kiện trước chưa tới / service nạp lại) -> bỏ delta, build lại từ snapshot bên dưới;
+                # sự kiện tới muộn sau đó có version <= snapshot nên bị bỏ qua
+                self._sub_gallery = None
+                break
+            if event.user_id in self.roster:
+                if event.kind == "remove" or event.kind == "update":
+                    self._sub_gallery.remove(event.user_id)
+                if event.kind != "remove":
+                    self._sub_gallery.add(event.user_id, event.encoding)
+            self._sub_version = event.version
+
+        if self._sub_gallery is None or self._sub_version != self.service.version:
+            # Lần đầu, hở version, hoặc sự kiện chưa tới -> build lại từ snapshot
+            ids, matrix, version = self.service.snapshot(self.roster)
+            sub = FaceGallery(capacity=len(ids))
+            sub.load(matrix, ids)
+            self._sub_gallery, self._sub_version = sub, version
+        return self._sub_gallery
+
+    def _search_global(self, encodings, top_k):
+        # Index quyết định quét toàn bộ (brute) hay chỉ vài ô gần nhất (ivf)
+        return self.service.search(encodings, k=top_k)
+
+    def find_matches(self, encodings, top_k=1):
         """
-        So sánh vector lạ với toàn bộ vector trong DB.
-        Sử dụng toán học để tính khoảng cách.
+        So sánh TẤT CẢ khuôn mặt trong 1 frame với gallery bằng 1 phép nhân ma trận.
+        Có roster: tìm trong sub-gallery của roster trước, chỉ những mặt không đạt
+        MATCH_TOLERANCE mới tìm lại trên toàn bộ gallery.
+        Input: list/ma trận M vector 128-d
+        Output: list M phần tử, mỗi phần tử là list top-k (user_id, distance) tăng dần theo khoảng cách
         """
-        # Nếu DB rỗng
-        if not self.encoder.known_encodings:
-            return None, 1.0
+        if len(encodings) == 0:
+            return []
+        if not len(self.service):
+            return [[] for _ in range(len(encodings))]
+        if self.roster is None:
+            return self._search_global(encodings, top_k)
 
-        # Tính khoảng cách Euclidean giữa vector lạ và TẤT CẢ vector đã biết
-        # Hàm này trả về một mảng khoảng cách: [0.4, 0.8, 0.2, ...]
-        distances = face_recognition.face_distance(self.encoder.known_encodings, unknown_encoding)
-        
-        # Tìm khoảng cách nhỏ nhất (người giống nhất)
-        best_match_index = np.argmin(distances)
-        best_distance = distances[best_match_index]
+        sub = self._roster_gallery()
+        if len(sub):
+            rows, dists = sub.top_k(encodings, k=top_k)
+            results = [[(sub.ids[r], float(d)) for r, d in zip(row_idx, row_dist)]
+                       for row_idx, row_dist in zip(rows, dists)]
+        else:
+            results = [[] for _ in range(len(encodings))]
 
-        # Kiểm tra ngưỡng chấp nhận
+        # Fallback: mặt không khớp ai trong roster -> tìm toàn bộ gallery
+        misses = [i for i, c in enumerate(results) if not c or c[0][1] >= Config.MATCH_TOLERANCE]
+        if misses:
+            queries = np.asarray(encodings, dtype=np.float32)[misses]
+            for i, cands in zip(misses, self._search_global(queries, top_k)):
+                results[i] = cands
+        return results
+
+    @staticmethod
+    def _accept(candidates):
+        """Áp ngưỡng MATCH_TOLERANCE lên ứng viên tốt nhất (giữ nguyên kiểu trả về của find_match)"""
+        if not candidates:
+            return None, 1.0
+        user_id, best_distance = candidates[0]
         if best_distance < Config.MATCH_TOLERANCE:
-            user_id = self.encoder.known_ids[best_match_index]
-            confidence = 1.0 - best_distance # Độ tin cậy (tham khảo)
-            return user_id, confidence
-        
-        return None, best_distance
\ No newline at end of file
+            return user_id, 1.0 - best_distance # Độ tin cậy (tham khảo)
+        return None, best_distance
+
+    def match_all(self, encodings):
+        """Nhận diện cả frame: trả về list (user_id, confidence) hoặc (None, best_distance) cho từng mặt"""
+        return [self._accept(c) for c in self.find_matches(encodings, top_k=1)]
+
+    def find_match(self, unknown_encoding):
+        """
+        So sánh vector lạ với toàn bộ vector trong DB.
+        Sử dụng toán học để tính khoảng cách.
+        """
+        return self.match_all(np.asarray(unknown_encoding)[None, :])[0]
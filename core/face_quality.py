@@ -0,0 +1,65 @@
+from collections import namedtuple
+import cv2
+import numpy as np
+from app.config import Config
+from core.frame_context import as_context
+
+# size: chiều cao mặt (pixel ảnh gốc); asymmetry: lệch trái-phải (ước lượng thô góc quay / che khuất)
+QualityScore = namedtuple("QualityScore", ["sharpness", "size", "brightness", "contrast", "asymmetry", "ok", "reason"])
+
+class FaceQualityGate:
+    """
+    Chấm điểm chất lượng khuôn mặt TRƯỚC khi encode 128-d (bước đắt nhất):
+    - Độ nét: phương sai Laplacian
+    - Kích thước mặt
+    - Độ sáng / tương phản: trung bình / độ lệch chuẩn mức xám
+    - Góc quay thô: lệch giữa nửa trái và nửa phải (mặt nghiêng hoặc bị che 1 nửa -> lệch lớn)
+    Mọi crop được chuẩn hóa về QUALITY_CROP x QUALITY_CROP rồi tính vector hóa cho cả lô bằng NumPy.
+    strict=True (đăng ký): ngưỡng chặt hơn vì mẫu được lưu lâu dài.
+    """
+    def __init__(self, strict=False):
+        self.strict = strict
+
+    def _limits(self):
+        f = Config.QUALITY_ENROLL_FACTOR if self.strict else 1.0
+        max_asym = Config.QUALITY_ENROLL_MAX_ASYMMETRY if self.strict else Config.QUALITY_MAX_ASYMMETRY
+        return (Config.QUALITY_MIN_SHARPNESS * f, Config.QUALITY_MIN_FACE_PX * f,
+                Config.QUALITY_MIN_CONTRAST * f, max_asym)
+
+    def assess(self, frame, face_locations, scale=1.0):
+        """face_locations theo hệ tọa độ `scale` (như encode). Trả về list QualityScore cùng thứ tự"""
+        if not face_locations: return []
+        gray = as_context(frame).gray(scale)
+        h, w = gray.shape[:2]
+        n = Config.QUALITY_CROP
+        crops = np.empty((len(face_locations), n, n), dtype=np.float32)
+        sizes = np.empty(len(face_locations), dtype=np.float32)
+        for i, (t, r, b, l) in enumerate(face_locations):
+            t, b = max(0, t), min(h, b)
+            l, r = max(0, l), min(w, r)
+            sizes[i] = (b - t) / scale
+            if b - t < 2 or r - l < 2:
+                crops[i] = 0; continue
+            crops[i] = cv2.resize(gray[t:b, l:r], (n, n), interpolation=cv2.INTER_AREA)
+
+        # Laplacian 4 lân cận trên cả lô (N, n-2, n-2)
+        lap = (crops[:, :-2, 1:-1] + crops[:, 2:, 1:-1] + crops[:, 1:-1, :-2] + crops[:, 1:-1, 2:]
+               - 4.0 * crops[:, 1:-1, 1:-1])
+        sharpness = lap.var(axis=(1, 2))
+        brightness = crops.mean(axis=(1, 2))
+        contrast = crops.std(axis=(1, 2))
+        asymmetry = np.abs(crops - crops[:, :, ::-1]).mean(axis=(1, 2)) / (contrast + 1e-6)
+
+        min_sharp, min_size, min_contrast, max_asym = self._limits()
+        scores = []
+        for i in range(len(face_locations)):
+            if sizes[i] < min_size: reason = "Mặt quá nhỏ (đứng gần camera hơn)"
+            elif sharpness[i] < min_sharp: reason = "Ảnh mờ (giữ yên đầu)"
+            elif brightness[i] < Config.QUALITY_MIN_BRIGHTNESS: reason = "Quá tối"
+            elif brightness[i] > Config.QUALITY_MAX_BRIGHTNESS: reason = "Quá sáng / ngược sáng"
+            elif contrast[i] < min_contrast: reason = "Thiếu tương phản"
+            elif asymmetry[i] > max_asym: reason = "Mặt nghiêng hoặc bị che (nhìn thẳng camera)"
+            else: reason = None
+            scores.append(QualityScore(float(sharpness[i]), float(sizes[i]), float(brightness[i]),
+                                       float(contrast[i]), float(asymmetry[i]), reason is None, reason))
+        return scores
@@ -0,0 +1,166 @@
+import itertools
+import logging
+import cv2
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+def iou(a, b):
+    """IoU của 2 box (top, right, bottom, left)"""
+    t, r = max(a[0], b[0]), min(a[1], b[1])
+    btm, l = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, r - l) * max(0, btm - t)
+    if inter == 0: return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+def create_cv_tracker(kind):
+    """
+    Tạo tracker OpenCV theo tên (KCF/CSRT/MIL/MOSSE). Trả về None nếu bản OpenCV không có.
+    Một số tracker nằm trong cv2.legacy (opencv-contrib).
+    """
+    if not kind: return None
+    name = f"Tracker{kind.upper()}_create"
+    for mod in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(mod, name, None) if mod is not None else None
+        if factory is not None:
+            return factory()
+    return None
+
+def _centroid_close(a, b, factor):
+    """Tâm 2 box cách nhau < factor * chiều rộng box (dự phòng khi mặt di chuyển nhanh, IoU = 0)"""
+    ca = ((a[1] + a[3]) / 2.0, (a[0] + a[2]) / 2.0)
+    cb = ((b[1] + b[3]) / 2.0, (b[0] + b[2]) / 2.0)
+    width = max(a[1] - a[3], b[1] - b[3], 1)
+    return (ca[0] - cb[0]) ** 2 + (ca[1] - cb[1]) ** 2 < (factor * width) ** 2
+
+
+class Track:
+    """1 khuôn mặt được theo dõi qua nhiều frame: giữ danh tính + trạng thái liveness"""
+    _ids = itertools.count(1)
+
+    def __init__(self, rect):
+        self.track_id = next(Track._ids)
+        self.rect = rect
+        self.misses = 0            # Số lần detect liên tiếp không thấy
+        self.uid = None            # Danh tính đã nhận diện (None = chưa biết / người lạ)
+        self.confidence = 0.0
+        self.identified = False    # Đã từng encode + match chưa
+        self.since_encode = 0      # Số lần detect kể từ lần encode gần nhất
+        self.cv_tracker = None     # Tracker OpenCV (tuỳ chọn) cập nhật box giữa 2 lần detect
+        self.lost = False
+        self.fresh = True          # Box vừa được cập nhật ở tick này (detect / tracker OpenCV), không phải box cũ
+        self.quality = None        # QualityScore của lần chấm gần nhất (để tinh chỉnh ngưỡng)
+        self.liveness = {'c': 0, 'blink': False, 'turn': False}
+
+    def set_identity(self, uid, confidence):
+        if uid != self.uid:
+            # Đổi người (ID switch) -> bắt đầu lại kiểm tra liveness
+            self.liveness = {'c': 0, 'blink': False, 'turn': False}
+        self.uid = uid
+        self.confidence = confidence
+        self.identified = True
+        self.since_encode = 0
+
+    @property
+    def needs_encoding(self):
+        """Track mới / người lạ: encode ở mỗi lần detect. Đã biết danh tính: xác minh lại định kỳ"""
+        if not self.identified or self.uid is None: return True
+        return self.since_encode >= Config.TRACK_REVERIFY_EVERY
+
+
+class FaceTracker:
+    """
+    Tracker IoU/centroid nhẹ: gán ID ổn định cho khuôn mặt giữa các lần detect.
+    Không cần encode lại những mặt đã nhận diện -> tiết kiệm CPU khi lớp đã ngồi ổn định.
+    """
+    def __init__(self):
+        self.tracks = []
+        self.visual_unsupported = False  # Bản OpenCV không có TRACKER_TYPE -> không thử tạo lại mỗi lần detect
+
+    def update(self, rects):
+        """
+        Ghép các box mới detect với track hiện có (tham lam theo IoU giảm dần).
+        Trả về list track tương ứng từng box (cùng thứ tự với rects).
+        """
+        pairs = []
+        for ti, tr in enumerate(self.tracks):
+            for di, rect in enumerate(rects):
+                score = iou(tr.rect, rect)
+                if score >= Config.TRACK_IOU_THRESH:
+                    pairs.append((score, ti, di))
+                elif _centroid_close(tr.rect, rect, Config.TRACK_CENTROID_FACTOR):
+                    pairs.append((0.0, ti, di))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(rects)
+        used = set()
+        for _, ti, di in pairs:
+            if ti in used or assigned[di] is not None: continue
+            tr = self.tracks[ti]
+            tr.rect = rects[di]
+            tr.fresh = True
+            tr.misses = 0
+            tr.since_encode += 1
+            assigned[di] = tr
+            used.add(ti)
+
+        # Track không được ghép: tăng misses, quá ngưỡng thì bỏ
+        kept = []
+        for ti, tr in enumerate(self.tracks):
+            if ti not in used:
+                tr.fresh = False
+                tr.misses += 1
+                if tr.misses > Config.TRACK_MAX_MISSES: continue
+            kept.append(tr)
+
+        for di, rect in enumerate(rects):
+            if assigned[di] is None:
+                tr = Track(rect)
+                assigned[di] = tr
+                kept.append(tr)
+
+        self.tracks = kept
+        return assigned
+
+    # --- TRACKER OPENCV (TUỲ CHỌN) GIỮA 2 LẦN DETECT ---
+    def init_visual(self, frame, scale):
+        """Khởi tạo tracker OpenCV cho các track đang thấy (frame = ảnh đã resize theo scale)"""
+        if not Config.TRACKER_TYPE or self.visual_unsupported: return
+        for tr in self.visible():
+            tr.cv_tracker = create_cv_tracker(Config.TRACKER_TYPE)
+            if tr.cv_tracker is None:
+                logger.warning(f"OpenCV không hỗ trợ tracker {Config.TRACKER_TYPE} -> giữ nguyên box giữa các lần detect")
+                self.visual_unsupported = True
+                return
+            t, r, b, l = (int(v * scale) for v in tr.rect)
+            tr.cv_tracker.init(frame, (l, t, r - l, b - t))
+            tr.lost = False
+
+    def predict(self, frame, scale):
+        """
+        Cập nhật box bằng tracker OpenCV (frame giữa 2 lần detect).
+        Track không có tracker OpenCV giữ box cũ (fresh = False).
+        Trả về True nếu có track bị mất dấu -> nên detect lại ngay.
+        """
+        lost = False
+        for tr in self.visible():
+            tr.fresh = False
+            if tr.cv_tracker is None: continue
+            ok, (x, y, w, h) = tr.cv_tracker.update(frame)
+            if not ok:
+                tr.lost = lost = True
+                tr.cv_tracker = None
+                continue
+            inv = 1.0 / scale
+            tr.rect = (int(y * inv), int((x + w) * inv), int((y + h) * inv), int(x * inv))
+            tr.fresh = True
+        return lost
+
+    def visible(self):
+        """Track đang thấy ở lần detect gần nhất"""
+        return [tr for tr in self.tracks if tr.misses == 0]
+
+    def clear(self):
+        self.tracks = []
@@ -0,0 +1,94 @@
+import threading
+import cv2
+import numpy as np
+
+class FrameContext:
+    """
+    Ngữ cảnh xử lý của 1 frame: mỗi ảnh dẫn xuất (resize / RGB / Gray) chỉ tính 1 lần
+    rồi dùng chung cho detector, encoder và liveness trong cùng 1 tick AI.
+    Mọi view đều là mảng liên tục (C-contiguous) -> an toàn cho dlib (fix stride trên macOS).
+
+    Bộ đếm cấp phát (allocations / bytes) cho từng frame và cộng dồn toàn cục
+    để đo được số lần copy ảnh mỗi tick.
+    """
+    _totals_lock = threading.Lock()
+    _totals = {"frames": 0, "allocations": 0, "bytes": 0}
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._cache = {}
+        self.allocations = 0
+        self.bytes_allocated = 0
+        with FrameContext._totals_lock:
+            FrameContext._totals["frames"] += 1
+
+    # --- BỘ ĐẾM ---
+    def _count(self, arr):
+        self.allocations += 1
+        self.bytes_allocated += arr.nbytes
+        with FrameContext._totals_lock:
+            FrameContext._totals["allocations"] += 1
+            FrameContext._totals["bytes"] += arr.nbytes
+        return arr
+
+    @classmethod
+    def totals(cls, reset=False):
+        """Thống kê cộng dồn {"frames", "allocations", "bytes"} (tuỳ chọn reset về 0)"""
+        with cls._totals_lock:
+            snap = dict(cls._totals)
+            if reset:
+                for k in cls._totals: cls._totals[k] = 0
+        return snap
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    # --- CÁC VIEW (LAZY) ---
+    def _get(self, key, make):
+        arr = self._cache.get(key)
+        if arr is None:
+            arr = make()
+            self._cache[key] = arr
+        return arr
+
+    def _base(self):
+        """Frame gốc chuẩn hóa về BGR uint8 liên tục (không copy nếu đã đúng định dạng)"""
+        def make():
+            img = self.frame
+            if img.ndim == 3 and img.shape[-1] == 4:
+                img = self._count(cv2.cvtColor(img, cv2.COLOR_BGRA2BGR))
+            if img.dtype != np.uint8:
+                img = self._count(img.astype(np.uint8))
+            if not img.flags["C_CONTIGUOUS"]:
+                img = self._count(np.ascontiguousarray(img))
+            return img
+        return self._get("base", make)
+
+    def bgr(self, scale=1.0):
+        if scale == 1.0: return self._base()
+        def make():
+            base = self._base()
+            h, w = base.shape[:2]
+            return self._count(cv2.resize(base, (int(w*scale), int(h*scale))))
+        return self._get(("bgr", scale), make)
+
+    def rgb(self, scale=1.0):
+        def make():
+            img = self.bgr(scale)
+            if img.ndim == 2:
+                return self._count(cv2.cvtColor(img, cv2.COLOR_GRAY2RGB))
+            return self._count(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        return self._get(("rgb", scale), make)
+
+    def gray(self, scale=1.0):
+        def make():
+            img = self.bgr(scale)
+            if img.ndim == 2: return img
+            return self._count(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        return self._get(("gray", scale), make)
+
+
+def as_context(frame):
+    """Chấp nhận cả ndarray lẫn FrameContext (giữ tương thích các lời gọi cũ)"""
+    return frame if isinstance(frame, FrameContext) else FrameContext(frame)
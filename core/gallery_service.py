@@ -0,0 +1,163 @@
+import threading
+import logging
+from collections import namedtuple
+import numpy as np
+from app.config import Config
+from core.face_gallery import FaceGallery
+from core.face_index import create_index
+from database.encoding_store import EncodingStore
+from utils.rwlock import RWLock
+
+logger = logging.getLogger(__name__)
+
+# kind: "add" | "update" | "remove"; encoding = None với "remove"
+GalleryEvent = namedtuple("GalleryEvent", ["kind", "user_id", "encoding", "version"])
+
+class GalleryService:
+    """
+    Gallery dùng chung cho toàn tiến trình (Đăng ký / Quản lý / Điểm danh).
+    - Nạp 1 lần, lười (lần đầu gọi instance())
+    - Khóa đọc-ghi: nhiều luồng search song song, thêm/xóa độc quyền
+    - version tăng sau mỗi thay đổi; subscriber nhận GalleryEvent để cập nhật delta thay vì nạp lại
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    service = cls()
+                    service.load()
+                    cls._instance = service
+        return cls._instance
+
+    def __init__(self, store=None):
+        self.gallery = FaceGallery()
+        # Index tìm kiếm đặt trên gallery (brute-force chính xác hoặc IVF xấp xỉ)
+        self.index = create_index(self.gallery)
+        self.store = store or EncodingStore()
+        self.lock = RWLock()
+        self._subscribers = []
+        self._sub_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.gallery.version
+
+    def __len__(self):
+        return len(self.gallery)
+
+    # --- NẠP / LƯU ---
+    def load(self):
+        with self.lock.write():
+            try:
+                # Kho nhị phân append-only (tự migrate từ face_encodings.pkl ở lần chạy đầu)
+                self.store.open(legacy_pickle=Config.ENCODINGS_PATH)
+                ids, vectors = self.store.load()
+                self.gallery.load(vectors, ids)
+                logger.info(f"Đã load {len(self.gallery)} khuôn mặt.")
+            except Exception as e:
+                logger.error(f"Lỗi đọc gallery: {e}")
+                self.gallery.load([], [])
+
+            # Index đã lưu không khớp gallery (hoặc chưa có) -> build lại
+            if not self.index.load(Config.INDEX_PATH):
+                self.index.build()
+            self._save_index()
+
+    def _save_index(self):
+        # Vector đã được commit từng thao tác vào store; ở đây chỉ lưu index khi vừa train lại
+        try:
+            self.index.save(Config.INDEX_PATH)
+        except Exception as e:
+            logger.error(f"Lưu index thất bại: {e}")
+
+    # --- ĐỌC ---
+    def search(self, queries, k=1):
+        """Trả về list (mỗi truy vấn) các cặp (user_id, distance) tăng dần - ids được map trong khóa đọc"""
+        with self.lock.read():
+            if not len(self.gallery):
+                return [[] for _ in range(len(queries))]
+            rows, dists = self.index.search(queries, k)
+            ids = self.gallery.ids
+            return [
+                [(ids[r], float(d)) for r, d in zip(row_idx, row_dist) if r >= 0]
+                for row_idx, row_dist in zip(rows, dists)
+            ]
+
+    def snapshot(self, user_ids=None):
+        """Copy (ids, ma trận) của toàn bộ hoặc 1 tập user_id, kèm version tại thời điểm copy"""
+        with self.lock.read():
+            g = self.gallery
+            if user_ids is None:
+                rows = list(range(len(g)))
+            else:
+                rows = [i for i, uid in enumerate(g.ids) if uid in user_ids]
+            return [g.ids[r] for r in rows], g.matrix[rows].copy(), g.version
+
+    # --- GHI ---
+    def enroll(self, user_id, encoding):
+        """
+        Kiểm tra trùng + thêm/cập nhật trong CÙNG 1 khóa ghi (2 cửa sổ không thể đăng ký trùng nhau).
+        Trả về (status, owner_id) với status: "added" | "updated" | "duplicate"
+        """
+        with self.lock.write():
+            match = self._nearest(encoding)
+            if match is not None and match[1] < Config.MATCH_TOLERANCE:
+                dup_id = match[0]
+                if dup_id != user_id:
+                    return "duplicate", dup_id
+                # Commit xuống đĩa trước, thành công mới cập nhật RAM
+                self.store.replace(user_id, encoding)
+                row = self.gallery.index_of(user_id)
+                self.gallery.replace(row, encoding)
+                self.index.update(row)
+                event = GalleryEvent("update", user_id, np.array(encoding, dtype=np.float32), self.gallery.version)
+            else:
+                self.store.append(user_id, encoding)
+                self.index.add(self.gallery.add(user_id, encoding))
+                event = GalleryEvent("add", user_id, np.array(encoding, dtype=np.float32), self.gallery.version)
+            self._save_index()
+        self._publish(event)
+        return ("updated" if event.kind == "update" else "added"), user_id
+
+    def remove(self, user_id):
+        with self.lock.write():
+            self.store.delete(user_id)  # Chỉ ghi tombstone, compaction chạy nền khi cần
+            changes = self.gallery.remove(user_id)
+            if not changes: return False
+            for row, moved_from in changes:
+                self.index.remove(row, moved_from)
+            event = GalleryEvent("remove", user_id, None, self.gallery.version)
+        self._publish(event)
+        return True
+
+    def _nearest(self, encoding):
+        if not len(self.gallery): return None
+        rows, dists = self.index.search([encoding], 1)
+        if rows.shape[1] == 0 or rows[0, 0] < 0: return None
+        return self.gallery.ids[rows[0, 0]], float(dists[0, 0])
+
+    # --- THÔNG BÁO THAY ĐỔI ---
+    def subscribe(self, callback):
+        """
+        callback(GalleryEvent) được gọi trên luồng ghi, SAU khi nhả khóa ghi (callback gọi lại search / snapshot
+        không bị deadlock, callback chậm không chặn luồng đọc). event.version chụp trong khóa; nhiều luồng ghi
+        cùng lúc có thể giao v+2 trước v+1 -> subscriber tự sắp / phát hiện hở version (xem FaceMatcher).
+        Trả về hàm hủy đăng ký
+        """
+        with self._sub_lock:
+            self._subscribers.append(callback)
+        def unsubscribe():
+            with self._sub_lock:
+                if callback in self._subscribers: self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _publish(self, event):
+        with self._sub_lock:
+            subscribers = list(self._subscribers)
+        for cb in subscribers:
+            try: cb(event)
+            except Exception as e: logger.error(f"Gallery subscriber lỗi: {e}")
@@ -1,21 +1,57 @@
 import cv2
 import numpy as np
 import dlib
-from scipy.spatial import distance as dist
 import os
+import threading
+from collections import OrderedDict
 from app.config import Config
+from core.frame_context import as_context
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Chỉ số landmark 68 điểm
+RIGHT_EYE = slice(36, 42)
+LEFT_EYE = slice(42, 48)
+POSE_POINTS = [30, 8, 36, 45, 48, 54]  # Mũi, cằm, khóe mắt trái/phải, khóe miệng trái/phải
+
+def eye_aspect_ratios(pts):
+    """
+    EAR vector hóa cho cả lô: pts (N, 68, 2) -> (N,) trung bình 2 mắt
+    EAR = (|p1-p5| + |p2-p4|) / (2 |p0-p3|)
+    """
+    eyes = np.stack([pts[:, LEFT_EYE], pts[:, RIGHT_EYE]], axis=1).astype(np.float64)  # (N, 2, 6, 2)
+    a = np.linalg.norm(eyes[:, :, 1] - eyes[:, :, 5], axis=-1)
+    b = np.linalg.norm(eyes[:, :, 2] - eyes[:, :, 4], axis=-1)
+    c = np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=-1)
+    return ((a + b) / (2.0 * np.maximum(c, 1e-6))).mean(axis=1)
+
+_predictor = None
+_predictor_lock = threading.Lock()
+
+def load_shape_predictor():
+    """Shape predictor 68 điểm (~100MB) nạp 1 lần cho cả tiến trình, dùng chung mọi detector / camera"""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                if not os.path.exists(Config.SHAPE_PREDICTOR_PATH):
+                    logger.error(f"❌ Không tìm thấy file {Config.SHAPE_PREDICTOR_PATH}")
+                    return None
+                _predictor = dlib.shape_predictor(Config.SHAPE_PREDICTOR_PATH)
+    return _predictor
+
+def shape_to_array(shape):
+    """dlib full_object_detection -> ndarray (68, 2) (dlib không cho truy cập điểm dạng buffer nên vẫn phải duyệt parts())"""
+    return np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float64)
+
+
 class ActionLivenessDetector:
+    MAX_POSE_CACHE = 128  # Số mặt (track) giữ tư thế trước đó để warm-start solvePnP
+
     def __init__(self):
-        if not os.path.exists(Config.SHAPE_PREDICTOR_PATH):
-            logger.error(f"❌ Không tìm thấy file {Config.SHAPE_PREDICTOR_PATH}")
-            self.predictor = None
-        else:
-            self.predictor = dlib.shape_predictor(Config.SHAPE_PREDICTOR_PATH)
-            
+        self.predictor = load_shape_predictor()
+
         # Mô hình 3D chuẩn (Generic Face Model)
         self.model_points = np.array([
             (0.0, 0.0, 0.0),             # Nose tip
@@ -27,93 +63,130 @@ class ActionLivenessDetector:
         ], dtype=np.float64)
         
         self._camera_matrix_cache = {}
+        self._dist_coeffs = np.zeros((4, 1))
+        self._poses = OrderedDict()  # key (track_id) -> (rvec, tvec) của lần giải trước
 
-    def _safe_gray(self, frame):
+    def _camera_matrix(self, w, h):
+        m = self._camera_matrix_cache.get((w, h))
+        if m is None:
+            focal_length = w
+            m = np.array([
+                [focal_length, 0, w / 2],
+                [0, focal_length, h / 2],
+                [0, 0, 1]], dtype=np.float64)
+            self._camera_matrix_cache[(w, h)] = m
+        return m
+
+    def landmarks(self, frame, face_rects, scale=1.0):
         """
-        Chuyển ảnh xám an toàn cho Dlib (Fix lỗi macOS Memory Stride)
+        Landmarks 68 điểm cho tất cả mặt của 1 frame (ảnh xám chỉ tính 1 lần).
+        face_rects theo tọa độ ảnh gốc; landmarks tính trên ảnh ở độ phân giải `scale`.
+        Trả về (shapes dlib, pts (N, 68, 2), valid (N,) bool) theo tọa độ hệ `scale`
         """
+        n = len(face_rects)
+        pts = np.zeros((n, 68, 2), dtype=np.float64)
+        valid = np.zeros(n, dtype=bool)
+        shapes = [None] * n
+        if self.predictor is None or n == 0: return shapes, pts, valid
+
         try:
-            if len(frame.shape) == 3:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = frame
-            # QUAN TRỌNG: Ép bộ nhớ liên tục
-            return np.ascontiguousarray(gray)
+            # FrameContext luôn trả về mảng liên tục (C-contiguous) -> an toàn cho dlib trên macOS
+            gray = as_context(frame).gray(scale)
         except Exception:
-            return None
+            return shapes, pts, valid
 
-    def get_landmarks(self, frame, face_rect):
-        """Lấy 68 điểm landmarks"""
-        if self.predictor is None: return None
-        
-        try:
-            # Convert coord (top, right, bottom, left) -> dlib.rectangle
-            t, r, b, l = face_rect
-            rect = dlib.rectangle(l, t, r, b)
-            
-            gray = self._safe_gray(frame)
-            if gray is None: return None
-            
-            return self.predictor(gray, rect)
-        except: return None
-
-    def calculate_ear(self, shape):
-        """Tính tỷ lệ mở mắt (EAR)"""
-        pts = np.array([[shape.part(i).x, shape.part(i).y] for i in range(68)])
-        
-        # Mắt trái (42-47), Mắt phải (36-41)
-        left_eye = pts[42:48]
-        right_eye = pts[36:42]
+        for i, (t, r, b, l) in enumerate(face_rects):
+            try:
+                rect = dlib.rectangle(int(l * scale), int(t * scale), int(r * scale), int(b * scale))
+                shapes[i] = self.predictor(gray, rect)
+                pts[i] = shape_to_array(shapes[i])
+                valid[i] = True
+            except Exception:
+                pass
+        return shapes, pts, valid
 
-        def eye_ratio(e):
-            A = dist.euclidean(e[1], e[5])
-            B = dist.euclidean(e[2], e[4])
-            C = dist.euclidean(e[0], e[3])
-            return (A + B) / (2.0 * C)
+    def _solve_pose(self, image_points, camera_matrix, guess=None):
+        """solvePnP (warm-start từ guess nếu có) -> (rvec, tvec, sai số chiếu lại RMS px) hoặc None nếu thất bại"""
+        if guess is not None:
+            rvec, tvec = guess[0].copy(), guess[1].copy()
+            success, rvec, tvec = cv2.solvePnP(self.model_points, image_points, camera_matrix, self._dist_coeffs,
+                                               rvec, tvec, useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+        else:
+            success, rvec, tvec = cv2.solvePnP(self.model_points, image_points, camera_matrix, self._dist_coeffs,
+                                               flags=cv2.SOLVEPNP_ITERATIVE)
+        if not success or not np.all(np.isfinite(rvec)) or not np.all(np.isfinite(tvec)):
+            return None
+        projected, _ = cv2.projectPoints(self.model_points, rvec, tvec, camera_matrix, self._dist_coeffs)
+        err = np.sqrt(np.mean(np.sum((projected.reshape(-1, 2) - image_points) ** 2, axis=1)))
+        return rvec, tvec, float(err)
 
-        return (eye_ratio(left_eye) + eye_ratio(right_eye)) / 2.0
+    @staticmethod
+    def _diverged(pose, guess, image_points):
+        """Warm-start hội tụ sai: mặt nằm sau camera, sai số chiếu lại lớn so với cỡ mặt, hoặc tư thế nhảy quá xa lần trước"""
+        if pose[1][2, 0] <= 0: return True  # Nghiệm gương: khớp điểm ảnh nhưng ở sau camera
+        eye_dist = max(float(np.linalg.norm(image_points[2] - image_points[3])), 1.0)
+        if pose[2] > Config.POSE_MAX_REPROJ * eye_dist: return True
+        # Góc quay giữa 2 tư thế: R_new * R_old^T
+        delta, _ = cv2.Rodrigues(cv2.Rodrigues(pose[0])[0] @ cv2.Rodrigues(guess[0])[0].T)
+        return np.degrees(np.linalg.norm(delta)) > Config.POSE_MAX_JUMP_DEG
 
-    def calculate_pose(self, frame, shape):
-        """Tính góc quay đầu (Yaw) """
+    def head_yaw(self, image_points, size, key=None):
+        """
+        Góc quay đầu (Yaw, độ). key: định danh mặt (track) -> warm-start từ tư thế lần trước;
+        warm-start thất bại / hội tụ sai thì giải lại từ đầu (không dùng guess), không giữ tư thế sai vào cache
+        """
         try:
-            image_points = np.array([
-                (shape.part(30).x, shape.part(30).y),     # Nose
-                (shape.part(8).x, shape.part(8).y),       # Chin
-                (shape.part(36).x, shape.part(36).y),     # Left Eye
-                (shape.part(45).x, shape.part(45).y),     # Right Eye
-                (shape.part(48).x, shape.part(48).y),     # Left Mouth
-                (shape.part(54).x, shape.part(54).y)      # Right Mouth
-            ], dtype=np.float64)
-
-            # Camera Matrix (Cache)
-            h, w = frame.shape[:2]
-            if (w, h) not in self._camera_matrix_cache:
-                focal_length = w
-                center = (w / 2, h / 2)
-                self._camera_matrix_cache[(w, h)] = np.array([
-                    [focal_length, 0, center[0]],
-                    [0, focal_length, center[1]],
-                    [0, 0, 1]], dtype=np.float64)
-            
-            camera_matrix = self._camera_matrix_cache[(w, h)]
-            dist_coeffs = np.zeros((4, 1))
-
-            success, rot_vec, _ = cv2.solvePnP(self.model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
-            
-            if not success: return 0.0
-            
-            rmat, _ = cv2.Rodrigues(rot_vec)
+            image_points = np.asarray(image_points, dtype=np.float64)
+            camera_matrix = self._camera_matrix(*size)
+            guess = self._poses.get(key) if key is not None else None
+            pose = self._solve_pose(image_points, camera_matrix, guess) if guess is not None else None
+            if pose is None or self._diverged(pose, guess, image_points):
+                cold = self._solve_pose(image_points, camera_matrix)
+                if cold is not None: pose = cold
+            if pose is None:
+                self._poses.pop(key, None)
+                return 0.0
+            rvec, tvec, _ = pose
+
+            if key is not None:
+                self._poses[key] = (rvec, tvec)
+                self._poses.move_to_end(key)
+                while len(self._poses) > self.MAX_POSE_CACHE: self._poses.popitem(last=False)
+
+            rmat, _ = cv2.Rodrigues(rvec)
             # Tính Yaw: atan2(R[2,0], R[0,0]) -> Xoay trái phải
             yaw = np.arctan2(rmat[2, 0], rmat[0, 0]) * 180.0 / np.pi
             return float(yaw)
-        except: return 0.0
+        except Exception:
+            self._poses.pop(key, None)
+            return 0.0
 
-    def analyze_action(self, frame, face_rect):
-        """API chính gọi từ bên ngoài"""
-        shape = self.get_landmarks(frame, face_rect)
-        if shape is None: return {"valid": False, "ear": 1.0, "yaw": 0.0}
+    def analyze_landmarks(self, pts, valid, size, keys=None):
+        """EAR + yaw từ landmarks đã có (pts (N, 68, 2) trên ảnh kích thước size = (w, h))"""
+        n = len(pts)
+        if not n or not valid.any():
+            return [{"valid": False, "ear": 1.0, "yaw": 0.0} for _ in range(n)]
 
-        ear = self.calculate_ear(shape)
-        yaw = self.calculate_pose(frame, shape)
-        
-        return {"valid": True, "ear": ear, "yaw": yaw}
\ No newline at end of file
+        ears = eye_aspect_ratios(pts)
+        keys = keys if keys is not None else [None] * n
+        out = []
+        for i in range(n):
+            if not valid[i]:
+                out.append({"valid": False, "ear": 1.0, "yaw": 0.0}); continue
+            yaw = self.head_yaw(pts[i, POSE_POINTS], size, keys[i])
+            out.append({"valid": True, "ear": float(ears[i]), "yaw": yaw})
+        return out
+
+    def analyze_batch(self, frame, face_rects, keys=None, scale=1.0):
+        """
+        API theo lô: tất cả mặt của 1 frame -> list {"valid", "ear", "yaw"} cùng thứ tự.
+        keys (tuỳ chọn, vd track_id) để warm-start solvePnP cho từng mặt.
+        """
+        ctx = as_context(frame)
+        _, pts, valid = self.landmarks(ctx, face_rects, scale)
+        h, w = ctx.shape[:2]
+        return self.analyze_landmarks(pts, valid, (int(w * scale), int(h * scale)), keys)
+
+    def analyze_action(self, frame, face_rect, key=None):
+        """API 1 mặt (giữ tương thích) - gọi analyze_batch khi có nhiều mặt trong frame"""
+        return self.analyze_batch(frame, [face_rect], [key])[0]
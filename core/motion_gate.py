@@ -0,0 +1,51 @@
+import time
+import cv2
+import numpy as np
+from app.config import Config
+
+class MotionGate:
+    """
+    Cổng chuyển động rẻ tiền đặt trước FaceDetector.detect:
+    so sánh ảnh xám cực nhỏ (~80x60) giữa các frame bằng frame-difference.
+    - moved(): có chuyển động so với frame trước (dùng cho idle / thức dậy)
+    - changed_since_reference(): cảnh đã đổi so với lần detect gần nhất chưa (bỏ qua detect nếu không)
+    """
+    def __init__(self):
+        self._prev = None
+        self._reference = None
+        self.last_motion = time.time()
+        self.last_ratio = 0.0
+
+    def _tiny(self, ctx):
+        tiny = ctx.gray(Config.MOTION_SCALE)
+        return cv2.GaussianBlur(tiny, (5, 5), 0)
+
+    @staticmethod
+    def _changed_ratio(a, b):
+        if a is None or b is None or a.shape != b.shape: return 1.0
+        diff = cv2.absdiff(a, b)
+        return np.count_nonzero(diff > Config.MOTION_PIXEL_THRESH) / float(diff.size)
+
+    def update(self, ctx, touch=True):
+        """
+        Cập nhật với frame mới, trả về True nếu có chuyển động so với frame trước.
+        touch=False: không làm mới mốc last_motion (quiet_for tiếp tục tăng)
+        """
+        tiny = self._tiny(ctx)
+        self.last_ratio = self._changed_ratio(tiny, self._prev)
+        self._prev = tiny
+        moved = self.last_ratio >= Config.MOTION_AREA_FRAC
+        if moved and touch: self.last_motion = time.time()
+        return moved
+
+    def changed_since_reference(self):
+        """Cảnh hiện tại khác ảnh tham chiếu (lúc detect gần nhất)?"""
+        return self._changed_ratio(self._prev, self._reference) >= Config.MOTION_AREA_FRAC
+
+    def set_reference(self):
+        """Gọi ngay sau khi detect: ảnh hiện tại thành mốc so sánh"""
+        self._reference = self._prev
+
+    def quiet_for(self):
+        """Số giây kể từ lần cuối có chuyển động"""
+        return time.time() - self.last_motion
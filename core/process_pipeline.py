@@ -0,0 +1,337 @@
+import time
+import queue
+import signal
+import itertools
+import threading
+import logging
+import multiprocessing as mp
+import numpy as np
+from app.config import Config
+from core.attendance_pipeline import AttendancePipeline, encode_with_quality, encode_with_landmarks
+from core.face_encoder import FaceEncoder
+from core.face_quality import FaceQualityGate
+from core.face_matcher import FaceMatcher
+from core.frame_context import FrameContext
+from utils.shared_ring import SharedFrameRing
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def _worker_main(tasks, results):
+    """
+    Vòng lặp của 1 tiến trình worker: nhận (owner, seq, ring, slot, kind, key, args), đọc frame từ shared memory,
+    trả về (owner, seq, key, payload, ms, error). Model chỉ nạp khi cần (worker chỉ encode thì không nạp shape predictor).
+    owner = pipeline gửi task (nhiều camera dùng chung 1 pool), ring = (tên, shape, số slot) của pipeline đó.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C do tiến trình chính xử lý
+    from core.face_detector import FaceDetector
+    from core.liveness_detector import ActionLivenessDetector
+
+    rings = {}
+    det = live = None
+    gate = FaceQualityGate()
+    try:
+        while True:
+            task = tasks.get()
+            if task is None: break
+            owner, seq, (ring_name, shape, slots), slot, kind, key, args = task
+            t0 = time.perf_counter()
+            payload, err = None, None
+            try:
+                ring = rings.get(ring_name)
+                if ring is None:
+                    ring = rings[ring_name] = SharedFrameRing.attach(ring_name, shape, slots)
+                ctx = FrameContext(ring.view(slot))
+                if kind == "detect":
+                    det = det or FaceDetector()
+                    det_scale, upsample, rois = args
+                    rects = det.detect(ctx, scale=1.0, det_scale=det_scale, upsample=upsample, rois=rois)
+                    payload = (rects, det.last_pixels)
+                elif kind == "encode":
+                    locs, scale, use_gate, shared = args
+                    encode = None
+                    if shared:
+                        # 1 lần landmark 68 điểm ở LANDMARK_SCALE (predictor đã cần cho liveness)
+                        live = live or ActionLivenessDetector()
+                        rects = [tuple(int(v / scale) for v in loc) for loc in locs]
+                        encode = lambda keep: encode_with_landmarks(ctx, live, [rects[i] for i in keep])
+                    vecs, scores = encode_with_quality(ctx, locs, scale, gate if use_gate else None, encode=encode)
+                    payload = ([None if v is None else np.asarray(v, dtype=np.float32) for v in vecs], scores)
+                elif kind == "liveness":
+                    live = live or ActionLivenessDetector()
+                    tids = [tid for tid, _ in args]
+                    acts = live.analyze_batch(ctx, [rect for _, rect in args], keys=tids, scale=Config.LANDMARK_SCALE)
+                    payload = dict(zip(tids, acts))
+            except Exception as e:
+                err = f"{type(e).__name__}: {e}"
+            results.put((owner, seq, key, payload, (time.perf_counter() - t0) * 1000.0, err))
+    finally:
+        for ring in rings.values(): ring.close()
+
+
+class AIWorkerPool:
+    """
+    Pool tiến trình worker dùng chung cho 1 hoặc nhiều pipeline (nhiều camera trong cùng phiên):
+    số tiến trình theo số core (AI_PROCESS_WORKERS), không theo số camera.
+    Kết quả trên hàng đợi chung được chia về hộp thư của từng pipeline (owner).
+    """
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or Config.AI_PROCESS_WORKERS)
+        # spawn: an toàn với Tkinter (không fork tiến trình đang có luồng UI)
+        self._mp = mp.get_context("spawn")
+        self.tasks = self._mp.Queue()
+        self.results = self._mp.Queue()
+        self.procs = []
+        self._inbox = {}
+        self._owners = itertools.count()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.procs: return
+            for i in range(self.workers):
+                p = self._mp.Process(target=_worker_main, name=f"AI-Proc-{i}", daemon=True,
+                                     args=(self.tasks, self.results))
+                p.start()
+                self.procs.append(p)
+        logger.info(f"🧩 Khởi động {self.workers} AI worker")
+
+    def register(self):
+        owner = next(self._owners)
+        with self._lock: self._inbox[owner] = []
+        return owner
+
+    def unregister(self, owner):
+        with self._lock: self._inbox.pop(owner, None)
+
+    def put(self, task):
+        self.tasks.put(task)
+
+    def alive(self):
+        return not self.procs or any(p.is_alive() for p in self.procs)
+
+    def collect(self, owner, timeout=0.0):
+        """Lấy các kết quả của `owner` (chờ tối đa timeout giây nếu hộp thư đang trống)"""
+        with self._lock:
+            wait = 0.0 if self._inbox.get(owner) else timeout
+            while True:
+                try:
+                    item = self.results.get(timeout=wait) if wait > 0 else self.results.get_nowait()
+                except queue.Empty:
+                    break
+                wait = 0.0
+                box = self._inbox.get(item[0])
+                if box is not None: box.append(item[1:])  # Pipeline đã đóng -> bỏ
+            out = self._inbox.get(owner, [])
+            if owner in self._inbox: self._inbox[owner] = []
+            return out
+
+    def close(self):
+        # Bỏ task chưa làm, báo từng worker dừng, chờ có giới hạn rồi mới terminate
+        try:
+            while True: self.tasks.get_nowait()
+        except queue.Empty: pass
+        for _ in self.procs: self.tasks.put(None)
+        for p in self.procs: p.join(timeout=2.0)
+        for p in self.procs:
+            if p.is_alive():
+                logger.warning(f"{p.name} không dừng kịp -> terminate")
+                p.terminate(); p.join(timeout=1.0)
+        for q in (self.tasks, self.results):
+            q.cancel_join_thread(); q.close()
+        self.procs = []
+
+
+class _Job:
+    """1 frame đang xử lý: slot trong ring + các task còn chờ worker"""
+    def __init__(self, seq, slot, ctx):
+        self.seq, self.slot, self.ctx = seq, slot, ctx
+        self.created = time.time()
+        self.detect = False
+        self.stage = 1           # 1: chờ detect, 2: chờ encode + liveness
+        self.pending = set()
+        self.late = set()        # Task đã quá hạn (kết quả bị bỏ) nhưng worker có thể vẫn đang đọc slot
+        self.results = {}
+        self.work_ms = {}
+        self.encode_tracks = {}  # key task encode -> các track tương ứng
+
+
+class ProcessAttendancePipeline(AttendancePipeline):
+    """
+    Chế độ đa tiến trình của AttendancePipeline (Config.AI_PROCESS_WORKERS > 0):
+    - Frame được ghi vào ring shared memory, worker (tiến trình riêng, không tranh GIL với UI) chạy
+      detect / encode / landmarks + solvePnP và trả kết quả kèm số thứ tự frame (seq)
+    - Nhiều frame cùng lúc ở giai đoạn detect; encode và liveness của 1 frame chia nhỏ cho nhiều worker
+    - Kết quả được ráp lại ĐÚNG thứ tự seq trên luồng gọi -> tracker / danh tính / liveness / check-in
+      vẫn là logic của AttendancePipeline, chạy tuần tự như chế độ luồng
+    """
+    def __init__(self, use_liveness, checked_in, on_checkin, roster_ids=None, workers=None, pool=None):
+        # pool: AIWorkerPool dùng chung (nhiều camera); không truyền thì pipeline tự tạo và tự đóng
+        self.pool = pool or AIWorkerPool(workers)
+        self._own_pool = pool is None
+        self.workers = self.pool.workers
+        super().__init__(use_liveness, checked_in, on_checkin, roster_ids=roster_ids)
+        self.owner = self.pool.register()
+        self.ring = None
+        self._ring_info = None
+        self.jobs = {}
+        self._head = 0  # seq kế tiếp cần hoàn tất
+        self._late = {}  # seq frame đã xong nhưng còn task quá hạn -> (slot còn giữ, key task chưa về)
+
+    def _create_engines(self):
+        # Detect / encode / liveness chạy ở worker; tiến trình chính chỉ giữ gallery + matcher
+        self.enc = FaceEncoder(); self.mat = FaceMatcher(self.enc)
+        self.det = self.live = None
+
+    def _shared_landmarks(self):
+        # Worker tự nạp shape predictor; ở đây chỉ cần biết có chế độ liveness hay không
+        return Config.SHARED_LANDMARKS and self.use_liveness
+
+    def _start(self, shape):
+        slots = Config.AI_RING_SLOTS or self.workers + 2
+        self.ring = SharedFrameRing(shape, slots)
+        self._ring_info = (self.ring.name, self.ring.shape, slots)
+        self.pool.start()
+        logger.info(f"🧩 Pipeline #{self.owner}: ring {slots} slot {shape}")
+
+    # --- GỬI FRAME ---
+    def submit(self, frame, ctx=None):
+        """Ghi frame vào ring + giao task. Trả về seq, hoặc None nếu ring đầy (bỏ frame, camera realtime)"""
+        if self.ring is None: self._start(frame.shape)
+        elif frame.shape != self.ring.shape:
+            logger.warning(f"Kích thước frame đổi {frame.shape} != {self.ring.shape}, bỏ qua"); return None
+        slot = self.ring.acquire()
+        if slot is None: return None
+
+        job = _Job(self._seq, slot, FrameContext(self.ring.write(slot, frame)))
+        self._seq += 1
+        if ctx is None or ctx is not self._checked_ctx:
+            self.motion.update(job.ctx)
+        if self._should_detect():
+            job.detect = True
+            self._dispatch(job, "detect", ("detect", 0), self._plan_detection(frame.shape))
+        self.jobs[job.seq] = job
+        return job.seq
+
+    def _dispatch(self, job, kind, key, args):
+        job.pending.add(key)
+        self.pool.put((self.owner, job.seq, self._ring_info, job.slot, kind, key, args))
+
+    def _chunks(self, items):
+        n = min(len(items), self.workers)
+        return [items[i::n] for i in range(n)]
+
+    def _liveness_chunks(self, targets):
+        # Chia theo track_id -> 1 track thường vào cùng 1 nhóm mỗi frame (nhóm nào vào worker nào thì tuỳ hàng đợi)
+        n = min(len(targets), self.workers)
+        groups = [[] for _ in range(n)]
+        for tid, rect in targets: groups[tid % n].append((tid, rect))
+        return [g for g in groups if g]
+
+    # --- NHẬN KẾT QUẢ ---
+    def poll(self, timeout=0.0):
+        """Nhận kết quả từ worker và hoàn tất các frame theo đúng thứ tự. Trả về list (seq, draw)"""
+        for seq, key, payload, ms, err in self.pool.collect(self.owner, timeout):
+            job = self.jobs.get(seq)
+            if job is None or key in job.late:
+                self._late_result(job, seq, key)  # Task quá hạn: chỉ dùng để biết worker đã thôi đọc slot
+                continue
+            if err: logger.error(f"AI worker lỗi ({key[0]} #{seq}): {err}")
+            job.pending.discard(key)
+            job.results[key] = payload
+            job.work_ms[key] = ms
+
+        if not self.pool.alive():
+            raise RuntimeError("Tất cả AI worker đã dừng")
+        return self._drain()
+
+    def _drain(self):
+        out = []
+        while self._head in self.jobs:
+            job = self.jobs[self._head]
+            if job.pending and time.time() - job.created > Config.AI_TASK_TIMEOUT:
+                logger.warning(f"Frame #{job.seq} chờ worker quá {Config.AI_TASK_TIMEOUT}s -> bỏ phần còn thiếu")
+                job.late |= job.pending
+                job.pending.clear()
+            if job.pending: break
+            if job.stage == 1:
+                job.stage = 2
+                self._stage_two(job)
+                if job.pending: break
+            out.append((job.seq, self._finish(job)))
+            del self.jobs[job.seq]
+            if job.late:
+                # Worker quá hạn có thể vẫn đang đọc slot: chưa trả slot (frame sau ghi đè -> kết quả đọc frame lẫn)
+                self._late[job.seq] = (job.slot, job.late)
+            else:
+                self.ring.release(job.slot)
+            self._head += 1
+        return out
+
+    def _late_result(self, job, seq, key):
+        if job is not None:
+            job.late.discard(key)
+            return
+        entry = self._late.get(seq)
+        if entry is None: return
+        slot, keys = entry
+        keys.discard(key)
+        if not keys:
+            del self._late[seq]
+            self.ring.release(slot)
+
+    def _stage_two(self, job):
+        """Frame đến lượt: cập nhật tracker rồi giao encode + liveness (chia cho nhiều worker)"""
+        scale = self.scale
+        found = job.results.pop(("detect", 0), None) if job.detect else None
+        if found is not None:
+            rects, pixels = found
+            assigned, need = self._apply_detections(rects, job.work_ms.get(("detect", 0), 0.0), pixels)
+            idx = self._chunks(need) if need else []
+            for ci, chunk in enumerate(idx):
+                key = ("encode", ci)
+                job.encode_tracks[key] = [assigned[i] for i in chunk]
+                self._dispatch(job, "encode", key, ([self._to_small(rects[i]) for i in chunk], scale,
+                                                    self.quality is not None, self._shared_landmarks()))
+            self.tracker.init_visual(job.ctx.bgr(scale), scale)
+        else:
+            # Không detect (hoặc worker detect lỗi) -> giữ box bằng tracker, lỗi thì detect lại ở frame sau
+            self._force_detect = self.tracker.predict(job.ctx.bgr(scale), scale) or job.detect
+
+        # Liveness cho track đã biết danh tính; track mới có danh tính sẽ được đo từ frame kế tiếp
+        targets = [(tr.track_id, tr.rect) for tr in self._liveness_targets()]
+        for ci, chunk in enumerate(self._liveness_chunks(targets) if targets else []):
+            self._dispatch(job, "liveness", ("liveness", ci), chunk)
+
+    def _finish(self, job):
+        for key, tracks in job.encode_tracks.items():
+            found = job.results.get(key)
+            if found: self._apply_identities(tracks, *found)
+
+        acts = {}
+        for key, payload in job.results.items():
+            if key[0] == "liveness" and payload: acts.update(payload)
+        draw = self._draw(lambda tr: acts.get(tr.track_id))
+
+        # Độ trễ tính toán của frame = detect + nhánh song song chậm nhất
+        detect_ms = job.work_ms.get(("detect", 0), 0.0)
+        rest = max((ms for key, ms in job.work_ms.items() if key[0] != "detect"), default=0.0)
+        if metrics.enabled:
+            for key, ms in job.work_ms.items(): metrics.observe(f"{key[0]}_ms", ms)
+            # Từ lúc ghi frame vào ring tới khi ráp xong (gồm cả thời gian chờ hàng đợi worker)
+            metrics.observe("ai_tick_ms", (time.time() - job.created) * 1000.0)
+        self._observe(detect_ms + rest)
+        self.last_allocations = job.ctx.allocations
+        return draw
+
+    # --- DỪNG ---
+    def close(self):
+        super().close()
+        self.pool.unregister(self.owner)
+        if self._own_pool:
+            self.pool.close()
+        self.jobs.clear()
+        self._late.clear()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -0,0 +1,71 @@
+import logging
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class ResolutionController:
+    """
+    Chọn độ phân giải detect (scale + số lần upsample HOG) cho từng frame.
+
+    Độ phân giải hiệu dụng eff = scale * 2^upsample; HOG của dlib bắt được mặt >= HOG_MIN_FACE / eff (px ảnh gốc).
+    - Chất lượng: eff nhỏ nhất đủ bắt mặt cỡ MIN_FACE_PX (hoặc cỡ mặt nhỏ nhất đang thấy, nếu lớn hơn)
+    - Ngân sách: ước lượng ms/pixel từ các lần detect trước, không chọn mức vượt ngân sách còn lại của tick
+    - Quét toàn khung định kỳ (FULL_SCAN_EVERY) để bắt mặt mới ở xa; giữa các lần đó chỉ detect ROI quanh track
+    """
+    def __init__(self):
+        self.levels = sorted(Config.DETECT_LEVELS)
+        self.default = min(self.levels, key=lambda e: abs(e - Config.DETECT_DEFAULT_LEVEL))
+        self.ms_per_px = None      # EWMA chi phí detect trên 1 pixel (ở độ phân giải detect)
+        self.other_ms = 0.0        # EWMA thời gian các bước khác trong tick (encode, liveness...)
+        self.min_face = None       # EWMA chiều cao mặt nhỏ nhất đang thấy (px ảnh gốc)
+        self.detections = 0
+        self.current = self.default
+
+    @staticmethod
+    def split(eff):
+        """eff -> (scale, upsample): ưu tiên không upsample khi scale <= 1"""
+        if eff <= 1.0: return eff, 0
+        return eff / 2.0, 1
+
+    def is_full_scan(self, has_tracks):
+        return not has_tracks or self.detections % max(1, Config.FULL_SCAN_EVERY) == 0
+
+    def choose(self, frame_shape, full_scan):
+        """Trả về (det_scale, upsample) cho lần detect này"""
+        self.detections += 1
+        if not Config.ADAPTIVE_DETECTION:
+            self.current = self.default
+            return self.split(self.current)
+
+        # 1. Mức chất lượng tối thiểu
+        target = Config.MIN_FACE_PX
+        if not full_scan and self.min_face:
+            target = max(target, 0.8 * self.min_face)  # Chỉ cần bắt lại những mặt đang thấy
+        need = Config.HOG_MIN_FACE / float(target)
+        quality = next((e for e in self.levels if e >= need), self.levels[-1])
+
+        # 2. Giới hạn theo ngân sách độ trễ
+        level = quality
+        if self.ms_per_px is not None:
+            h, w = frame_shape[:2]
+            budget = max(Config.TICK_LATENCY_BUDGET_MS - self.other_ms, 0.25 * Config.TICK_LATENCY_BUDGET_MS)
+            fits = [e for e in self.levels if self.ms_per_px * w * h * e * e <= budget]
+            cap = fits[-1] if fits else self.levels[0]
+            level = min(quality, cap)
+
+        if level != self.current:
+            logger.debug(f"Detect resolution {self.current:.2f} -> {level:.2f} (cần {quality:.2f})")
+        self.current = level
+        return self.split(level)
+
+    def observe(self, detect_ms, detect_pixels, tick_ms, face_heights):
+        """Cập nhật sau mỗi tick có detect: thời gian detect, số pixel đã quét, tổng thời gian tick, cỡ mặt"""
+        a = Config.DETECT_EWMA_ALPHA
+        if detect_pixels > 0:
+            rate = detect_ms / float(detect_pixels)
+            self.ms_per_px = rate if self.ms_per_px is None else (1 - a) * self.ms_per_px + a * rate
+        other = max(0.0, tick_ms - detect_ms)
+        self.other_ms = (1 - a) * self.other_ms + a * other
+        if face_heights:
+            smallest = float(min(face_heights))
+            self.min_face = smallest if self.min_face is None else (1 - a) * self.min_face + a * smallest
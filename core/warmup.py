@@ -0,0 +1,105 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ModelWarmup:
+    """
+    Nạp nền các phần nặng trong lúc menu chính đang chờ người dùng:
+    OpenCV / NumPy -> dlib HOG + encoder (import face_recognition) -> gallery + index
+    -> shape predictor 68 điểm -> chạy thử 1 lượt detect / encode / landmark trên ảnh giả.
+    Mọi thứ được nạp vào cache dùng chung của tiến trình (module face_recognition, GalleryService,
+    load_shape_predictor) nên cửa sổ mở sau đó không phải nạp lại. Cửa sổ mở khi warm-up chưa xong
+    chỉ chờ đúng bước đang nạp (các cache đều có khóa).
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.steps = [
+            ("OpenCV / NumPy", self._load_cv),
+            ("Detector + encoder (dlib)", self._load_face_models),
+            ("Gallery", self._load_gallery),
+            ("Shape predictor 68 điểm", self._load_predictor),
+            ("Chạy thử", self._dummy_inference),
+        ]
+        self.progress = (0, len(self.steps), "")  # (số bước xong, tổng, bước đang chạy)
+        self.timings = {}   # bước -> ms
+        self.errors = {}    # bước -> lỗi (warm-up lỗi không chặn app, cửa sổ sẽ tự nạp lại)
+        self.total_ms = None
+        self.done = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.done.is_set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True, name="Warmup")
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def run(self):
+        t_start = time.perf_counter()
+        n = len(self.steps)
+        for i, (name, fn) in enumerate(self.steps):
+            self.progress = (i, n, name)
+            t0 = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.warning(f"Warm-up '{name}' lỗi: {e}")
+            self.timings[name] = (time.perf_counter() - t0) * 1000.0
+        self.progress = (n, n, "")
+        self.total_ms = (time.perf_counter() - t_start) * 1000.0
+        self.done.set()
+        logger.info(f"🔥 Warm-up xong sau {self.total_ms / 1000:.1f}s: "
+                    + ", ".join(f"{k} {v:.0f}ms" for k, v in self.timings.items()))
+
+    # --- CÁC BƯỚC ---
+    def _load_cv(self):
+        import cv2, numpy
+
+    def _load_face_models(self):
+        # face_recognition nạp HOG detector, pose predictor và mạng encoder của dlib ngay khi import
+        import face_recognition
+        import core.face_detector, core.face_encoder
+
+    def _load_gallery(self):
+        from core.gallery_service import GalleryService
+        GalleryService.instance()
+
+    def _load_predictor(self):
+        from core.liveness_detector import load_shape_predictor
+        load_shape_predictor()
+
+    def _dummy_inference(self):
+        # Lượt đầu của dlib / OpenCV cấp phát buffer, khởi tạo thread pool... -> làm trước ở đây
+        import numpy as np
+        import face_recognition
+        from core.face_detector import FaceDetector
+        from core.gallery_service import GalleryService
+        from core.liveness_detector import ActionLivenessDetector
+
+        frame = np.full((480, 640, 3), 128, dtype=np.uint8)
+        FaceDetector().detect(frame)
+        face_recognition.face_encodings(frame[:, :, ::-1].copy(), [(140, 400, 340, 240)])
+        live = ActionLivenessDetector()
+        if live.predictor is not None:
+            live.analyze_action(frame, (140, 400, 340, 240))
+        svc = GalleryService.instance()
+        if len(svc): svc.search(np.zeros((1, 128), dtype=np.float32))
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import deque
+from app.config import Config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class AttendanceWriter:
+    """
+    Ghi điểm danh nền (write-behind) để luồng AI không bao giờ chờ SQLite:
+    - submit(): lọc trùng theo (phiên, MSSV) trong RAM, ghi nối 1 dòng vào journal (os.write vào page cache,
+      không fsync) rồi đưa vào hàng đợi -> trả về ngay
+    - Luồng "AttendanceWriter" gom lượt chờ, đủ CHECKIN_BATCH_SIZE hoặc lượt cũ nhất chờ quá
+      CHECKIN_FLUSH_INTERVAL giây thì: fsync journal 1 lần cho cả lô -> executemany trong 1 transaction
+      -> hàng đợi rỗng thì cắt journal về 0
+    - start() phát lại journal còn sót (app crash / mất điện trước khi commit); INSERT OR IGNORE nên phát
+      lại nhiều lần cũng không sinh bản ghi trùng
+    Commit lỗi (DB bị khóa, đầy đĩa...) thì lô quay lại đầu hàng đợi và thử lại sau, journal vẫn giữ.
+    """
+    def __init__(self, db, journal_path=None, batch_size=None, flush_interval=None):
+        self.db = db
+        self.journal_path = journal_path or Config.CHECKIN_JOURNAL_PATH
+        self.batch_size = batch_size or Config.CHECKIN_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.CHECKIN_FLUSH_INTERVAL
+        self._pending = deque()      # (session_id, student_id, method, checkin_time) chưa commit
+        self._oldest = 0.0           # Thời điểm lượt đầu hàng đợi được nhận
+        self._seen = set()           # (session_id, student_id) đã nhận -> lọc trùng
+        self._cond = threading.Condition()
+        self._fd = None
+        self._stopping = False
+        self._thread = None
+        self.committed = 0
+
+    # --- VÒNG ĐỜI ---
+    def start(self):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        self.replay()
+        self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="AttendanceWriter")
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Commit nốt hàng đợi rồi dừng. Lượt chưa commit được vẫn nằm trong journal cho lần mở sau"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def load_session(self, session_id):
+        """Nạp MSSV đã có trong DB của phiên vào bộ lọc trùng (khi tiếp tục 1 phiên cũ)"""
+        ids = self.db.get_checked_in_ids(session_id)
+        with self._cond:
+            self._seen.update((session_id, sid) for sid in ids)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    # --- GỌI TỪ LUỒNG AI ---
+    def submit(self, session_id, student_id, method="Auto"):
+        """Nhận 1 lượt điểm danh. False nếu SV đã điểm danh phiên này (không chạm tới đĩa / DB)"""
+        key = (session_id, student_id)
+        with self._cond:
+            if key in self._seen: return False
+            self._seen.add(key)
+            row = (session_id, student_id, method, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()))
+            os.write(self._fd, (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+            if not self._pending: self._oldest = time.monotonic()
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size: self._cond.notify()
+        logger.info(f"Điểm danh (chờ ghi): Session#{session_id}, Student={student_id}")
+        return True
+
+    # --- LUỒNG GHI ---
+    def _next_batch(self):
+        """Chờ tới khi đủ lô / hết hạn / dừng. Trả về lô cần commit, None khi đã dừng và hết việc"""
+        with self._cond:
+            while True:
+                if self._pending and (self._stopping or len(self._pending) >= self.batch_size
+                                      or time.monotonic() - self._oldest >= self.flush_interval):
+                    break
+                if self._stopping: return None
+                timeout = None
+                if self._pending: timeout = self._oldest + self.flush_interval - time.monotonic()
+                self._cond.wait(timeout)
+            # Phần còn lại (nếu có) giữ mốc _oldest cũ -> commit tiếp ngay ở vòng sau
+            return [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            self.db.close()  # Kết nối SQLite của luồng này
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None: return
+            t0 = time.perf_counter()
+            try:
+                os.fsync(self._fd)  # 1 lần fsync cho cả lô (group commit)
+                self.committed += self.db.mark_attendance_many(batch)
+            except Exception as e:
+                logger.error(f"Ghi {len(batch)} lượt điểm danh lỗi (sẽ thử lại): {e}")
+                metrics.inc("checkin_commit_errors")
+                with self._cond:
+                    self._pending.extendleft(reversed(batch))
+                    if self._stopping: return  # Để journal phát lại ở lần mở sau
+                    self._cond.wait(1.0)
+                continue
+            metrics.observe("checkin_commit_ms", (time.perf_counter() - t0) * 1000.0)
+            metrics.observe("checkin_batch", len(batch))
+            with self._cond:
+                # Mọi dòng trong journal đều đã commit -> cắt (submit ghi journal dưới cùng khóa này)
+                if not self._pending: os.ftruncate(self._fd, 0)
+
+    # --- PHÁT LẠI JOURNAL ---
+    def replay(self):
+        """Commit các lượt còn trong journal (lần chạy trước dừng đột ngột). Trả về số lượt ghi mới"""
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0: return 0
+        rows = []
+        with open(self.journal_path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    rows.append(tuple(json.loads(line)))
+                except ValueError:
+                    logger.warning("Bỏ qua dòng journal hỏng (ghi dở lúc crash)")
+        added = self.db.mark_attendance_many(rows) if rows else 0
+        with self._cond:
+            self._seen.update((r[0], r[1]) for r in rows)
+        os.truncate(self.journal_path, 0)
+        logger.info(f"♻️ Phát lại journal điểm danh: {len(rows)} dòng, {added} lượt mới")
+        return added
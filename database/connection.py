@@ -0,0 +1,118 @@
+import atexit
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class ConnectionManager:
+    """
+    Kết nối SQLite dùng lâu dài, mỗi luồng 1 kết nối (sqlite3.Connection không nên dùng chung giữa các luồng):
+    - Mở 1 lần / luồng rồi giữ lại -> không còn open / close (và fsync khi đóng) mỗi lần gọi
+    - PRAGMA: journal_mode=WAL (đọc không chặn ghi), synchronous=NORMAL (chỉ fsync khi checkpoint),
+      busy_timeout để luồng ghi chờ khóa thay vì báo "database is locked" ngay, foreign_keys=ON
+    - Câu lệnh đã prepare được sqlite3 cache theo chuỗi SQL (DB_STATEMENT_CACHE câu / kết nối)
+    - Chế độ autocommit: mỗi câu lệnh lẻ tự commit; nhiều câu cần nguyên tử thì dùng transaction()
+    Mỗi file DB có 1 manager dùng chung (for_path), các DatabaseManager cùng file dùng lại kết nối của nhau.
+    """
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, db_path):
+        with cls._registry_lock:
+            mgr = cls._registry.get(db_path)
+            if mgr is None:
+                mgr = cls._registry[db_path] = cls(db_path)
+            return mgr
+
+    @classmethod
+    def close_everything(cls):
+        with cls._registry_lock:
+            managers = list(cls._registry.values())
+        for mgr in managers: mgr.close_all()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []   # (luồng, kết nối) để đóng khi luồng đã chết / khi thoát app
+
+    # --- KẾT NỐI ---
+    def conn(self):
+        """Kết nối của luồng hiện tại (mở + cấu hình lần đầu)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._prune()
+                self._conns.append((threading.current_thread(), conn))
+        return conn
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=Config.DB_BUSY_TIMEOUT_MS / 1000.0,
+                               isolation_level=None, cached_statements=Config.DB_STATEMENT_CACHE,
+                               check_same_thread=False)  # Chỉ để close_all() đóng được từ luồng khác
+        conn.row_factory = sqlite3.Row
+        mode = conn.execute(f"PRAGMA journal_mode={Config.DB_JOURNAL_MODE}").fetchone()[0]
+        if mode.upper() != Config.DB_JOURNAL_MODE.upper():
+            logger.warning(f"SQLite không bật được journal_mode={Config.DB_JOURNAL_MODE} (đang là {mode})")
+        conn.execute(f"PRAGMA synchronous={Config.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={int(Config.DB_BUSY_TIMEOUT_MS)}")
+        conn.execute("PRAGMA foreign_keys=ON")  # ON DELETE CASCADE (SQLite mặc định tắt, phải bật mỗi kết nối)
+        logger.debug(f"Mở kết nối SQLite cho luồng {threading.current_thread().name}")
+        return conn
+
+    def _prune(self):
+        """Đóng kết nối của các luồng đã kết thúc (gọi khi đang giữ _lock)"""
+        alive = []
+        for thread, conn in self._conns:
+            if thread.is_alive(): alive.append((thread, conn))
+            else: conn.close()
+        self._conns = alive
+
+    def close(self):
+        """Đóng kết nối của luồng hiện tại"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None: return
+        self._local.conn = None
+        with self._lock:
+            self._conns = [(t, c) for t, c in self._conns if c is not conn]
+        conn.close()
+
+    def close_all(self):
+        """Đóng mọi kết nối (khi thoát app). Kết nối WAL cuối cùng đóng sẽ checkpoint vào file chính"""
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for _, conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Đóng kết nối SQLite lỗi: {e}")
+        self._local = threading.local()
+
+    # --- TRANSACTION ---
+    @contextmanager
+    def transaction(self, immediate=True):
+        """
+        with mgr.transaction() as conn: ...  -> COMMIT khi thoát bình thường, ROLLBACK nếu có exception.
+        immediate=True lấy khóa ghi ngay từ BEGIN (tránh lỗi nâng khóa đọc -> ghi giữa chừng).
+        Lồng nhau thì khối trong chạy chung transaction của khối ngoài.
+        """
+        conn = self.conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+atexit.register(ConnectionManager.close_everything)
@@ -1,8 +1,9 @@
 import sqlite3
-import pandas as pd
 import os
-from datetime import datetime
 from app.config import Config
+from database.connection import ConnectionManager
+from database.migrations import migrate
+from database.exporter import AttendanceExporter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,122 +14,115 @@ class DatabaseManager:
         self.db_path = Config.DB_PATH
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         os.makedirs(Config.EXPORT_DIR, exist_ok=True)
+        self.pool = ConnectionManager.for_path(self.db_path)
         self.init_db()
         logger.info(f" DatabaseManager initialized: {self.db_path}")
 
     def get_conn(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Kết nối dùng lâu dài của luồng hiện tại (không đóng sau khi dùng)"""
+        return self.pool.conn()
+
+    def transaction(self):
+        """with db.transaction() as conn: ... -> nhiều câu lệnh trong 1 lần commit"""
+        return self.pool.transaction()
+
+    def close(self):
+        """Đóng kết nối của luồng hiện tại (luồng sắp kết thúc)"""
+        self.pool.close()
 
     def init_db(self):
-        conn = self.get_conn()
-        # 1. Bảng Sinh Viên
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                student_id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                class_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        # 2. Bảng Phiên Học (Session)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                subject_name TEXT NOT NULL,
-                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                end_time TIMESTAMP
-            );
-        """)
-        # 3. Bảng Nhật Ký (Logs)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS attendance_logs (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id INTEGER NOT NULL,
-                student_id TEXT NOT NULL,
-                checkin_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                verification_method TEXT DEFAULT 'Auto',
-                FOREIGN KEY(session_id) REFERENCES sessions(session_id),
-                FOREIGN KEY(student_id) REFERENCES students(student_id),
-                UNIQUE(session_id, student_id)
-            );
-        """)
-        conn.commit()
-        conn.close()
+        # Tạo bảng / nâng schema theo PRAGMA user_version (xem database/migrations.py)
+        version = migrate(self.get_conn())
+        logger.debug(f"Schema v{version}")
 
     # --- QUẢN LÝ SINH VIÊN ---
     def add_student(self, sid, name, cls):
-        conn = self.get_conn()
         try:
-            conn.execute("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)", (sid, name, cls))
-            conn.commit()
+            self.get_conn().execute("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)", (sid, name, cls))
             logger.info(f"Thêm sinh viên thành công: {sid}")
             return True
         except sqlite3.IntegrityError:
             logger.warning(f"Sinh viên {sid} đã tồn tại")
             return False
-        finally:
-            conn.close()
 
     def get_all_students(self):
-        conn = self.get_conn()
-        res = conn.execute("SELECT * FROM students ORDER BY created_at DESC").fetchall()
-        conn.close()
+        res = self.get_conn().execute("SELECT * FROM students ORDER BY created_at DESC").fetchall()
         return [dict(r) for r in res]
 
+    def get_class_names(self):
+        res = self.get_conn().execute("SELECT DISTINCT class_name FROM students ORDER BY class_name").fetchall()
+        return [r[0] for r in res]
+
+    def get_student_ids_by_classes(self, class_names):
+        """Danh sách MSSV thuộc các lớp (dùng làm roster cho phiên điểm danh)"""
+        class_names = [c for c in class_names if c]
+        if not class_names: return []
+        marks = ",".join("?" * len(class_names))
+        res = self.get_conn().execute(f"SELECT student_id FROM students WHERE class_name IN ({marks})", class_names).fetchall()
+        return [r[0] for r in res]
+
     def delete_student(self, sid):
-        conn = self.get_conn()
         try:
-            conn.execute("DELETE FROM attendance_logs WHERE student_id = ?", (sid,))
-            conn.execute("DELETE FROM students WHERE student_id = ?", (sid,))
-            conn.commit()
+            # Lượt điểm danh của SV bị xóa theo (ON DELETE CASCADE)
+            self.get_conn().execute("DELETE FROM students WHERE student_id = ?", (sid,))
             logger.info(f" Xóa sinh viên: {sid}")
             return True
         except Exception as e:
             logger.error(f"Error deleting student {sid}: {e}")
             return False
-        finally:
-            conn.close()
 
     def update_student(self, sid, name, cls):
-        conn = self.get_conn()
         try:
-            conn.execute("UPDATE students SET name=?, class_name=? WHERE student_id=?", (name, cls, sid))
-            conn.commit()
+            self.get_conn().execute("UPDATE students SET name=?, class_name=? WHERE student_id=?", (name, cls, sid))
             return True
         except:
             return False
-        finally:
-            conn.close()
 
     # --- QUẢN LÝ ĐIỂM DANH (SESSION) ---
     def create_session(self, subject):
         """Tạo phiên học mới, trả về Session ID"""
-        conn = self.get_conn()
-        cursor = conn.execute("INSERT INTO sessions (subject_name) VALUES (?)", (subject,))
-        conn.commit()
-        session_id = cursor.lastrowid
-        conn.close()
-        return session_id
+        cursor = self.get_conn().execute("INSERT INTO sessions (subject_name) VALUES (?)", (subject,))
+        return cursor.lastrowid
 
     def mark_attendance(self, session_id, student_id, method="Auto"):
         """Điểm danh. Nếu đã có trong phiên này rồi thì trả về False (Bỏ qua)"""
-        conn = self.get_conn()
         try:
-            conn.execute(
+            self.get_conn().execute(
                 "INSERT INTO attendance_logs (session_id, student_id, verification_method) VALUES (?, ?, ?)",
                 (session_id, student_id, method)
             )
-            conn.commit()
             logger.info(f"Điểm danh thành công: Session#{session_id}, Student={student_id}")
             return True
-        except sqlite3.IntegrityError:
-            logger.warning(f"Sinh viên {student_id} đã điểm danh phiên #{session_id}")
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e): logger.warning(f"Sinh viên {student_id} đã điểm danh phiên #{session_id}")
+            else: logger.warning(f"Không ghi được điểm danh {student_id} phiên #{session_id}: {e}")
             return False
-        finally:
-            conn.close()
-    
+
+    def mark_attendance_many(self, rows):
+        """
+        Ghi nhiều lượt điểm danh trong 1 transaction. rows: (session_id, student_id, method, checkin_time UTC).
+        Lượt đã có trong phiên được bỏ qua. Trả về số lượt ghi mới
+        """
+        sql = ("INSERT OR IGNORE INTO attendance_logs (session_id, student_id, verification_method, checkin_time) "
+               "VALUES (?, ?, ?, ?)")
+        with self.transaction() as conn:
+            before = conn.total_changes
+            try:
+                conn.executemany(sql, rows)
+            except sqlite3.IntegrityError:
+                # OR IGNORE không bỏ qua lỗi khóa ngoại (MSSV / phiên đã bị xóa) -> ghi từng lượt, bỏ lượt lỗi
+                for row in rows:
+                    try:
+                        conn.execute(sql, row)
+                    except sqlite3.IntegrityError as e:
+                        logger.warning(f"Bỏ lượt điểm danh {row[1]} phiên #{row[0]}: {e}")
+            return conn.total_changes - before
+
+    def get_checked_in_ids(self, session_id):
+        """MSSV đã điểm danh trong phiên (khi mở lại / tiếp tục 1 phiên)"""
+        res = self.get_conn().execute("SELECT student_id FROM attendance_logs WHERE session_id = ?", (session_id,)).fetchall()
+        return [r[0] for r in res]
+
     def log_attendance(self, student_id, method="Auto", session_id=None):
         """
         Alias method cho mark_attendance để tương thích với code cũ.
@@ -136,12 +130,10 @@ class DatabaseManager:
         """
         if session_id is None:
             # Tìm session đang active (chưa end_time)
-            conn = self.get_conn()
-            result = conn.execute(
+            result = self.get_conn().execute(
                 "SELECT session_id FROM sessions WHERE end_time IS NULL ORDER BY start_time DESC LIMIT 1"
             ).fetchone()
-            conn.close()
-            
+
             if result:
                 session_id = result[0]
                 logger.debug(f"Phiên điểm danh #{session_id}")
@@ -149,33 +141,25 @@ class DatabaseManager:
                 # Tạo session mới
                 session_id = self.create_session("Auto Attendance")
                 logger.info(f"Tạo phiên điểm danh #{session_id}")
-        
+
         return self.mark_attendance(session_id, student_id, method)
-            
+
     def close_session(self, session_id):
-        conn = self.get_conn()
-        conn.execute("UPDATE sessions SET end_time = CURRENT_TIMESTAMP WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
+        self.get_conn().execute("UPDATE sessions SET end_time = CURRENT_TIMESTAMP WHERE session_id = ?", (session_id,))
         logger.info(f"Đóng phiên điểm danh #{session_id}")
 
+    def get_sessions(self, limit=50):
+        """Các phiên gần nhất (cho bộ lọc xuất dữ liệu)"""
+        res = self.get_conn().execute(
+            "SELECT session_id, subject_name, start_time FROM sessions ORDER BY session_id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in res]
+
     def export_excel(self):
-        conn = self.get_conn()
+        """Xuất toàn bộ điểm danh ra XLSX trên luồng hiện tại (giao diện dùng AttendanceExporter chạy nền)"""
+        exporter = AttendanceExporter(self, "xlsx")
         try:
-            query = """
-            SELECT s.subject_name, l.checkin_time, st.student_id, st.name, st.class_name
-            FROM attendance_logs l
-            JOIN sessions s ON l.session_id = s.session_id
-            JOIN students st ON l.student_id = st.student_id
-            ORDER BY l.checkin_time DESC
-            """
-            df = pd.read_sql_query(query, conn)
-            path = os.path.join(Config.EXPORT_DIR, f"Export_attendance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-            df.to_excel(path, index=False)
-            logger.info(f"Export attendance to {path}")
-            return True, path
+            exporter.run()
+            return True, exporter.path
         except Exception as e:
             logger.error(f"Export failed: {e}")
             return False, str(e)
-        finally:
-            conn.close()
\ No newline at end of file
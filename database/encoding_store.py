@@ -0,0 +1,335 @@
+import os
+import json
+import pickle
+import threading
+import logging
+import numpy as np
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class EncodingStore:
+    """
+    Kho vector khuôn mặt dạng nhị phân, chỉ ghi nối (append-only), thay cho file pickle.
+
+    Mỗi thế hệ (generation) g gồm:
+    - vectors.<g>.f32   : các bản ghi float32 độ dài cố định (DIM * 4 byte) -> memory-map được
+    - ids.<g>.txt       : file phụ chứa user_id, mỗi dòng 1 bản ghi (cùng thứ tự với vectors)
+    - tombstones.<g>.u32: chỉ số bản ghi đã xóa (uint32, chỉ ghi nối)
+    - MANIFEST.json     : số bản ghi / số byte ĐÃ COMMIT của từng file
+
+    Commit an toàn khi mất điện: ghi nối dữ liệu -> fsync -> ghi MANIFEST mới vào file tạm
+    rồi os.replace (nguyên tử). Phần đuôi chưa có trong MANIFEST sẽ bị cắt bỏ khi mở lại.
+    Xóa = thêm tombstone; khi tỉ lệ bản ghi chết cao, compaction chạy nền sẽ ghi thế hệ mới.
+    """
+    DIM = 128
+    MANIFEST = "MANIFEST.json"
+    FORMAT = 1
+
+    def __init__(self, root=None):
+        self.root = root or Config.GALLERY_DIR
+        self._lock = threading.RLock()
+        self._manifest = None      # None = kho chưa mở (hoặc mở lỗi) -> không cho ghi
+        self._last_gen = -1        # Thế hệ lớn nhất đã cấp (compaction ghi ngoài khóa, không được trùng số)
+        self._ids = []             # record -> user_id (kể cả bản ghi đã xóa)
+        self._dead = set()         # record đã bị tombstone
+        self._by_id = {}           # user_id -> [record còn sống]
+        self._compacting = None
+        self._compact_lock = threading.Lock()  # 1 compaction tại 1 thời điểm
+
+    # --- ĐƯỜNG DẪN ---
+    def _path(self, kind, gen=None):
+        gen = self._manifest["generation"] if gen is None else gen
+        ext = {"vectors": "f32", "ids": "txt", "tombstones": "u32"}[kind]
+        return os.path.join(self.root, f"{kind}.{gen}.{ext}")
+
+    @property
+    def live_count(self):
+        return len(self._ids) - len(self._dead)
+
+    @property
+    def dead_count(self):
+        return len(self._dead)
+
+    # --- MỞ / KHÔI PHỤC ---
+    def open(self, legacy_pickle=None):
+        """
+        Mở kho (tạo mới nếu chưa có). Nếu chưa có MANIFEST mà có file pickle cũ thì migrate 1 lần.
+        """
+        with self._lock:
+            try:
+                return self._open(legacy_pickle)
+            except BaseException:
+                # Mở / migrate lỗi: kho coi như chưa mở -> _commit từ chối ghi thay vì tạo thế hệ thiếu file
+                self._manifest = None
+                self._ids, self._dead, self._by_id = [], set(), {}
+                raise
+
+    def _open(self, legacy_pickle):
+        os.makedirs(self.root, exist_ok=True)
+        manifest_path = os.path.join(self.root, self.MANIFEST)
+        if not os.path.exists(manifest_path):
+            self._manifest = {"format": self.FORMAT, "dim": self.DIM, "generation": 0,
+                              "count": 0, "ids_bytes": 0, "tombstones": 0}
+            self._last_gen = 0
+            legacy_pickle = legacy_pickle if legacy_pickle is not None else Config.ENCODINGS_PATH
+            if legacy_pickle and os.path.exists(legacy_pickle):
+                # MANIFEST chỉ được ghi sau khi migrate xong: lỗi giữa chừng -> lần mở sau migrate lại
+                self.migrate_from_pickle(legacy_pickle)
+                return self
+            self._create_generation_files(0)
+            self._write_manifest(self._manifest)
+        else:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("dim") != self.DIM:
+                raise ValueError(f"Gallery store dim={manifest.get('dim')} != {self.DIM}")
+            self._manifest = manifest
+            self._last_gen = manifest["generation"]
+        self._recover()
+        self._load_metadata()
+        return self
+
+    def _create_generation_files(self, gen):
+        for kind in ("vectors", "ids", "tombstones"):
+            open(self._path(kind, gen), "wb").close()
+
+    def _recover(self):
+        """Cắt phần đuôi chưa commit (ghi dở khi crash) và dọn file của thế hệ bỏ dở"""
+        m = self._manifest
+        committed = {
+            "vectors": m["count"] * self.DIM * 4,
+            "ids": m["ids_bytes"],
+            "tombstones": m["tombstones"] * 4,
+        }
+        for kind, size in committed.items():
+            path = self._path(kind)
+            if not os.path.exists(path):
+                raise IOError(f"Thiếu file gallery: {path}")
+            if os.path.getsize(path) > size:
+                logger.warning(f"Cắt phần ghi dở của {os.path.basename(path)} ({os.path.getsize(path)} -> {size} byte)")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        current = {os.path.basename(self._path(k)) for k in committed}
+        for name in os.listdir(self.root):
+            if name == self.MANIFEST or name in current: continue
+            if name.split(".")[0] in committed or name.endswith(".tmp"):
+                os.remove(os.path.join(self.root, name))
+
+    def _load_metadata(self):
+        with open(self._path("ids"), "r", encoding="utf-8") as f:
+            self._ids = f.read().splitlines()
+        if len(self._ids) != self._manifest["count"]:
+            raise IOError("File ids không khớp số bản ghi trong MANIFEST")
+        self._dead = set(np.fromfile(self._path("tombstones"), dtype=np.uint32).tolist())
+        self._by_id = {}
+        for rec, uid in enumerate(self._ids):
+            if rec not in self._dead:
+                self._by_id.setdefault(uid, []).append(rec)
+
+    # --- ĐỌC ---
+    def load(self):
+        """
+        Trả về (ids, vectors) của các bản ghi còn sống.
+        vectors là memory-map chỉ đọc (không có tombstone) hoặc mảng đã lọc.
+        """
+        with self._lock:
+            count = self._manifest["count"]
+            if count == 0:
+                return [], np.zeros((0, self.DIM), dtype=np.float32)
+            vectors = np.memmap(self._path("vectors"), dtype=np.float32, mode="r", shape=(count, self.DIM))
+            if not self._dead:
+                return list(self._ids), vectors
+            live = np.ones(count, dtype=bool)
+            live[list(self._dead)] = False
+            ids = [uid for rec, uid in enumerate(self._ids) if live[rec]]
+            return ids, vectors[live]
+
+    # --- GHI ---
+    def append(self, user_id, encoding):
+        """Thêm 1 vector (O(1) I/O: ghi nối 512 byte + 1 dòng id + MANIFEST nhỏ)"""
+        self._commit(appends=[(user_id, encoding)])
+
+    def replace(self, user_id, encoding):
+        """Xóa các vector cũ của user_id và thêm vector mới trong CÙNG 1 commit"""
+        self._commit(appends=[(user_id, encoding)], deletes=[user_id])
+
+    def delete(self, user_id):
+        """Tombstone mọi vector của user_id. Trả về số bản ghi đã xóa"""
+        return self._commit(deletes=[user_id])
+
+    def _commit(self, appends=(), deletes=()):
+        with self._lock:
+            if self._manifest is None:
+                raise IOError(f"Kho gallery {self.root} chưa được mở (hoặc mở lỗi)")
+            m = dict(self._manifest)
+            dead_recs = [rec for uid in deletes for rec in self._by_id.get(uid, [])]
+            if not appends and not dead_recs:
+                return 0
+
+            if not m["count"] and not m["tombstones"]:
+                # Thế hệ chưa có bản ghi: đảm bảo đủ 3 file trước khi MANIFEST trỏ tới (_recover coi thiếu là hỏng)
+                for kind in ("vectors", "ids", "tombstones"):
+                    open(self._path(kind), "ab").close()
+
+            if appends:
+                vecs = np.asarray([e for _, e in appends], dtype=np.float32).reshape(-1, self.DIM)
+                id_bytes = "".join(f"{uid}\n" for uid, _ in appends).encode("utf-8")
+                self._append_bytes(self._path("vectors"), vecs.tobytes())
+                self._append_bytes(self._path("ids"), id_bytes)
+                m["count"] += len(appends)
+                m["ids_bytes"] += len(id_bytes)
+            if dead_recs:
+                self._append_bytes(self._path("tombstones"), np.asarray(dead_recs, dtype=np.uint32).tobytes())
+                m["tombstones"] += len(dead_recs)
+
+            self._write_manifest(m)
+
+            # Chỉ cập nhật trạng thái RAM sau khi commit thành công
+            self._manifest = m
+            for uid in deletes:
+                self._by_id.pop(uid, None)
+            self._dead.update(dead_recs)
+            for uid, _ in appends:
+                self._by_id.setdefault(uid, []).append(len(self._ids))
+                self._ids.append(uid)
+
+        if dead_recs: self._maybe_compact()
+        return len(dead_recs)
+
+    def _append_bytes(self, path, data):
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            if Config.STORE_FSYNC: os.fsync(f.fileno())
+
+    def _write_manifest(self, manifest):
+        path = os.path.join(self.root, self.MANIFEST)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            if Config.STORE_FSYNC: os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        if not Config.STORE_FSYNC or not hasattr(os, "O_DIRECTORY"): return  # Windows không fsync được thư mục
+        fd = os.open(self.root, os.O_RDONLY | os.O_DIRECTORY)
+        try: os.fsync(fd)
+        finally: os.close(fd)
+
+    # --- COMPACTION ---
+    def _maybe_compact(self):
+        total = len(self._ids)
+        dead = len(self._dead)
+        if dead >= Config.STORE_COMPACT_MIN_DEAD and dead >= Config.STORE_COMPACT_RATIO * total:
+            self.compact_async()
+
+    def compact_async(self):
+        """Chạy compaction trên thread nền (bỏ qua nếu đang chạy)"""
+        if self._compacting is not None and self._compacting.is_alive(): return self._compacting
+        self._compacting = threading.Thread(target=self.compact, daemon=True, name="Gallery-Compact")
+        self._compacting.start()
+        return self._compacting
+
+    def compact(self):
+        """
+        Ghi các bản ghi còn sống sang thế hệ mới rồi chuyển MANIFEST (nguyên tử).
+        Chỉ giữ khóa lúc chụp snapshot và lúc chuyển thế hệ; phần ghi + fsync chạy ngoài khóa
+        -> thêm/xóa (và các search đang chờ sau chúng trong GalleryService) không bị chặn suốt lúc compact.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._manifest is None: return
+                snap = dict(self._manifest)
+                snap_dead = set(self._dead)
+                snap_ids = list(self._ids)
+                gen = self._next_generation()
+            live = [rec for rec in range(snap["count"]) if rec not in snap_dead]
+            if live:
+                # Thế hệ cũ chỉ được ghi nối -> phần đã commit trong snapshot không đổi, đọc ngoài khóa được
+                vectors = np.memmap(self._path("vectors", snap["generation"]), dtype=np.float32, mode="r",
+                                    shape=(snap["count"], self.DIM))[live]
+            else:
+                vectors = np.zeros((0, self.DIM), dtype=np.float32)
+            ids_bytes = self._write_generation_files(gen, [snap_ids[rec] for rec in live], vectors)
+
+            with self._lock:
+                m = self._manifest
+                if m is None or m["generation"] != snap["generation"]:
+                    # Kho đã bị ghi đè / đóng trong lúc compact -> bỏ thế hệ vừa ghi
+                    self._remove_generation(gen)
+                    return
+                # Bản ghi thêm sau snapshot được chép nối tiếp; tombstone mới được đánh lại chỉ số
+                new_rec = {rec: i for i, rec in enumerate(live)}
+                tail = range(snap["count"], m["count"])
+                for i, rec in enumerate(tail): new_rec[rec] = len(live) + i
+                if tail:
+                    tail_vecs = np.fromfile(self._path("vectors"), dtype=np.float32, count=len(tail) * self.DIM,
+                                            offset=snap["count"] * self.DIM * 4)
+                    tail_bytes = "".join(f"{self._ids[rec]}\n" for rec in tail).encode("utf-8")
+                    self._append_bytes(self._path("vectors", gen), tail_vecs.tobytes())
+                    self._append_bytes(self._path("ids", gen), tail_bytes)
+                    ids_bytes += len(tail_bytes)
+                dead = sorted(new_rec[rec] for rec in self._dead - snap_dead)
+                if dead:
+                    self._append_bytes(self._path("tombstones", gen), np.asarray(dead, dtype=np.uint32).tobytes())
+                self._switch_generation({"format": self.FORMAT, "dim": self.DIM, "generation": gen,
+                                         "count": len(live) + len(tail), "ids_bytes": ids_bytes,
+                                         "tombstones": len(dead)})
+                count = self.live_count
+        logger.info(f"Compact gallery: {count} bản ghi, thế hệ #{gen}")
+
+    def rewrite(self, ids, vectors):
+        """Ghi đè toàn bộ kho bằng (ids, vectors) (dùng cho migrate)"""
+        with self._lock:
+            ids = list(ids)
+            gen = self._next_generation()
+            ids_bytes = self._write_generation_files(gen, ids, vectors)
+            self._switch_generation({"format": self.FORMAT, "dim": self.DIM, "generation": gen,
+                                     "count": len(ids), "ids_bytes": ids_bytes, "tombstones": 0})
+
+    def _next_generation(self):
+        self._last_gen = max(self._last_gen, self._manifest["generation"]) + 1
+        return self._last_gen
+
+    def _write_generation_files(self, gen, ids, vectors):
+        """Ghi đủ 3 file của thế hệ gen (chưa có MANIFEST trỏ tới). Trả về số byte file ids"""
+        vecs = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, self.DIM))
+        id_bytes = "".join(f"{uid}\n" for uid in ids).encode("utf-8")
+        self._create_generation_files(gen)
+        self._append_bytes(self._path("vectors", gen), vecs.tobytes())
+        self._append_bytes(self._path("ids", gen), id_bytes)
+        return len(id_bytes)
+
+    def _switch_generation(self, manifest):
+        """Chuyển MANIFEST sang thế hệ mới (nguyên tử) rồi dọn thế hệ cũ. Gọi khi giữ _lock"""
+        old_gen = self._manifest["generation"]
+        self._write_manifest(manifest)
+        self._manifest = manifest
+        self._remove_generation(old_gen)
+        self._load_metadata()
+
+    def _remove_generation(self, gen):
+        for kind in ("vectors", "ids", "tombstones"):
+            try: os.remove(self._path(kind, gen))
+            except OSError: pass  # Windows: file còn đang được mmap -> dọn ở lần open sau
+
+    # --- MIGRATE ---
+    def migrate_from_pickle(self, pkl_path):
+        """
+        Chuyển file face_encodings.pkl cũ sang định dạng mới (chạy 1 lần), đổi tên file cũ thành .migrated.
+        Pickle được đọc và kiểm tra trước khi ghi gì ra đĩa; MANIFEST ghi cuối cùng (trong rewrite)
+        nên pickle hỏng không bao giờ để lại 1 kho rỗng "hợp lệ" thay cho dữ liệu cũ.
+        """
+        with open(pkl_path, "rb") as f:
+            data = pickle.load(f)
+        ids = [str(uid) for uid in data.get("ids", [])]
+        encodings = np.asarray(data.get("encodings", []), dtype=np.float32)
+        if len(encodings) != len(ids) or (len(ids) and encodings.reshape(len(ids), -1).shape[1] != self.DIM):
+            raise ValueError(f"File {pkl_path} hỏng: {len(ids)} id nhưng encodings có dạng {encodings.shape}")
+        self.rewrite(ids, encodings.reshape(len(ids), self.DIM))
+        os.replace(pkl_path, pkl_path + ".migrated")
+        logger.info(f"Migrate {len(ids)} vector từ {pkl_path} sang {self.root}")
+        return len(ids)
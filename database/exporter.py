@@ -0,0 +1,187 @@
+import os
+import csv
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# (cột SQL, tiêu đề trong file)
+COLUMNS = [
+    ("l.session_id", "session_id"),
+    ("s.subject_name", "subject_name"),
+    ("l.checkin_time", "checkin_time"),
+    ("st.student_id", "student_id"),
+    ("st.name", "name"),
+    ("st.class_name", "class_name"),
+    ("l.verification_method", "verification_method"),
+]
+FORMATS = ("xlsx", "csv", "parquet")
+XLSX_MAX_ROWS = 1048576  # Giới hạn dòng / sheet của Excel (kể cả dòng tiêu đề)
+
+def local_day_to_utc(day, add_days=0):
+    """'YYYY-MM-DD' (ngày theo giờ máy) + add_days -> mốc 00:00 giờ máy đó dạng chuỗi UTC như checkin_time"""
+    start = datetime.strptime(day, "%Y-%m-%d") + timedelta(days=add_days)
+    return start.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def build_query(session_ids=None, classes=None, subject=None, date_from=None, date_to=None):
+    """
+    SQL + tham số cho dữ liệu xuất theo bộ lọc (None / rỗng = không lọc).
+    date_from / date_to: 'YYYY-MM-DD' theo giờ máy (cả 2 đầu đều tính). checkin_time lưu UTC -> đổi
+    2 mốc ngày sang UTC ở đây (so sánh thẳng cột với tham số nên vẫn đi idx_logs_time).
+    Trả về (sql_chọn_dòng, sql_đếm, params)
+    """
+    where, params = [], []
+    if session_ids:
+        where.append(f"l.session_id IN ({','.join('?' * len(session_ids))})"); params += list(session_ids)
+    if classes:
+        where.append(f"st.class_name IN ({','.join('?' * len(classes))})"); params += list(classes)
+    if subject:
+        where.append("s.subject_name LIKE ?"); params.append(f"%{subject}%")
+    if date_from:
+        where.append("l.checkin_time >= ?"); params.append(local_day_to_utc(date_from))
+    if date_to:
+        where.append("l.checkin_time < ?"); params.append(local_day_to_utc(date_to, add_days=1))
+    body = """
+        FROM attendance_logs l
+        JOIN sessions s ON l.session_id = s.session_id
+        JOIN students st ON l.student_id = st.student_id
+    """ + (" WHERE " + " AND ".join(where) if where else "")
+    select = f"SELECT {', '.join(c for c, _ in COLUMNS)} {body} ORDER BY l.checkin_time DESC"
+    return select, f"SELECT COUNT(*) {body}", params
+
+# --- GHI FILE THEO TỪNG LÔ (chỉ giữ 1 lô trong RAM) ---
+class _CsvSink:
+    def __init__(self, path):
+        # utf-8-sig: Excel mở đúng tiếng Việt
+        self.f = open(path, "w", newline="", encoding="utf-8-sig")
+        self.w = csv.writer(self.f)
+        self.w.writerow([h for _, h in COLUMNS])
+
+    def write(self, rows):
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+class _XlsxSink:
+    """openpyxl write_only: dòng được ghi thẳng ra file tạm của sheet, không giữ cả workbook trong RAM"""
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self.path = path
+        self.wb = Workbook(write_only=True)
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        self.ws = self.wb.create_sheet(title="Attendance" if self.sheets == 1 else f"Attendance_{self.sheets}")
+        self.ws.append([h for _, h in COLUMNS])
+        self.rows = 1
+
+    def write(self, rows):
+        for row in rows:
+            if self.rows >= XLSX_MAX_ROWS: self._new_sheet()  # Quá giới hạn Excel -> sang sheet mới
+            self.ws.append(list(row))
+            self.rows += 1
+
+    def close(self):
+        self.wb.save(self.path)
+
+class _ParquetSink:
+    """Mỗi lô = 1 row group (pyarrow là tuỳ chọn, chỉ cần khi xuất Parquet)"""
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Xuất Parquet cần cài pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([(h, pa.int64() if h == "session_id" else pa.string()) for _, h in COLUMNS])
+        self.w = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        cols = list(zip(*rows))
+        self.w.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(c, type=f.type) for c, f in zip(cols, self.schema)], schema=self.schema))
+
+    def close(self):
+        self.w.close()
+
+SINKS = {"xlsx": _XlsxSink, "csv": _CsvSink, "parquet": _ParquetSink}
+
+class AttendanceExporter:
+    """
+    Xuất điểm danh theo luồng (streaming): đọc cursor từng lô EXPORT_CHUNK_ROWS dòng và ghi ngay ra file
+    (XLSX write_only / CSV / Parquet) -> RAM không phụ thuộc số năm dữ liệu.
+    - Đọc trong 1 transaction đọc: WAL cho snapshot nhất quán (đếm + dữ liệu khớp nhau) mà không chặn
+      luồng ghi điểm danh
+    - Ghi ra <file>.part rồi đổi tên khi xong -> không bao giờ để lại file xuất dở
+    - start() chạy trên luồng nền; progress = (số dòng đã ghi, tổng) để UI hiển thị, cancel() để hủy
+    """
+    def __init__(self, db, fmt="xlsx", path=None, **filters):
+        if fmt not in SINKS: raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+        self.db = db
+        self.fmt = fmt
+        self.path = path or os.path.join(Config.EXPORT_DIR,
+                                         f"Export_attendance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}")
+        self.filters = filters
+        self.progress = (0, None)
+        self.error = None
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_thread, daemon=True, name="Exporter")
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run_thread(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Export failed: {e}")
+        finally:
+            self.db.close()  # Kết nối SQLite của luồng xuất
+            self.done.set()
+
+    def run(self):
+        """Xuất đồng bộ trên luồng hiện tại. Trả về số dòng; exception nếu lỗi, 0 nếu bị hủy"""
+        select, count, params = build_query(**self.filters)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".part"
+        written = 0
+        sink = None
+        try:
+            with self.db.pool.transaction(immediate=False) as conn:
+                total = conn.execute(count, params).fetchone()[0]
+                self.progress = (0, total)
+                sink = SINKS[self.fmt](tmp)
+                cursor = conn.execute(select, params)
+                while not self._cancel.is_set():
+                    rows = cursor.fetchmany(Config.EXPORT_CHUNK_ROWS)
+                    if not rows: break
+                    sink.write([tuple(r) for r in rows])
+                    written += len(rows)
+                    self.progress = (written, total)
+                cursor.close()
+            sink.close(); sink = None
+            if self._cancel.is_set():
+                os.remove(tmp)
+                logger.info("Export cancelled")
+                return 0
+            os.replace(tmp, self.path)
+        except BaseException:
+            if sink is not None:
+                try: sink.close()
+                except Exception: pass
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        logger.info(f"Export {written} rows to {self.path}")
+        return written
@@ -0,0 +1,117 @@
+"""
+Migration schema theo phiên bản, lưu trong PRAGMA user_version của file DB.
+Mỗi bước chạy trong 1 transaction riêng và chỉ chạy 1 lần; DB cũ (user_version = 0, bảng tạo bởi
+init_db bản trước) được nâng dần lên bản mới nhất khi mở app. Thêm thay đổi schema = thêm 1 bước
+cuối MIGRATIONS, không sửa bước đã phát hành. database/schema.sql là bản tham khảo của schema cuối.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+def _v1_base_tables(conn):
+    # Schema của init_db bản đầu (IF NOT EXISTS: DB cũ đã có bảng thì giữ nguyên)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            student_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            class_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_name TEXT NOT NULL,
+            start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            end_time TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_logs (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            checkin_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            verification_method TEXT DEFAULT 'Auto',
+            FOREIGN KEY(session_id) REFERENCES sessions(session_id),
+            FOREIGN KEY(student_id) REFERENCES students(student_id),
+            UNIQUE(session_id, student_id)
+        )
+    """)
+
+def _v2_columns_and_cascade(conn):
+    # sessions.room_name: chỉ cần ADD COLUMN
+    if "room_name" not in _columns(conn, "sessions"):
+        conn.execute("ALTER TABLE sessions ADD COLUMN room_name TEXT")
+    # attendance_logs: SQLite không sửa được khóa ngoại tại chỗ -> tạo bảng mới có ON DELETE CASCADE
+    # + confidence_score, chép dữ liệu (giữ nguyên log_id), xóa bảng cũ rồi đổi tên
+    conn.execute("""
+        CREATE TABLE attendance_logs_new (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            checkin_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            verification_method TEXT DEFAULT 'Auto',
+            confidence_score REAL,
+            FOREIGN KEY(session_id) REFERENCES sessions(session_id) ON DELETE CASCADE,
+            FOREIGN KEY(student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+            UNIQUE(session_id, student_id)
+        )
+    """)
+    cols = ", ".join(c for c in _columns(conn, "attendance_logs") if c in _columns(conn, "attendance_logs_new"))
+    conn.execute(f"INSERT INTO attendance_logs_new ({cols}) SELECT {cols} FROM attendance_logs")
+    conn.execute("DROP TABLE attendance_logs")
+    conn.execute("ALTER TABLE attendance_logs_new RENAME TO attendance_logs")
+
+def _v3_indexes(conn):
+    # Lọc / xóa theo SV (lịch sử 1 SV, ON DELETE CASCADE từ students)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_student ON attendance_logs(student_id)")
+    # Báo cáo theo phiên sắp theo giờ: index phủ (không phải đọc bảng). Đã bao cả index đơn (session_id)
+    # trong schema.sql (tiền tố của index này và của UNIQUE(session_id, student_id)) nên không tạo thêm
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_session_time ON attendance_logs(session_id, checkin_time, student_id)")
+    # Xuất / lọc theo khoảng thời gian cả học kỳ, ORDER BY checkin_time không cần sắp xếp tạm
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_time ON attendance_logs(checkin_time)")
+    # Roster theo lớp (get_student_ids_by_classes)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_students_class ON students(class_name)")
+
+# (phiên bản, mô tả, hàm) - chỉ thêm vào cuối
+MIGRATIONS = [
+    (1, "Bảng students / sessions / attendance_logs", _v1_base_tables),
+    (2, "sessions.room_name, attendance_logs.confidence_score, ON DELETE CASCADE", _v2_columns_and_cascade),
+    (3, "Index cho báo cáo / xuất dữ liệu", _v3_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Chạy các bước còn thiếu trên kết nối autocommit (isolation_level=None). Trả về phiên bản sau khi chạy"""
+    if current_version(conn) >= LATEST_VERSION: return current_version(conn)
+    # Dựng lại bảng cần tắt khóa ngoại (PRAGMA này không đổi được bên trong transaction)
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for version, desc, fn in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Đọc lại trong transaction: tiến trình khác có thể vừa migrate xong
+                if current_version(conn) >= version:
+                    conn.rollback(); continue
+                fn(conn)
+                conn.execute(f"PRAGMA user_version={version}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            logger.info(f"🗄️ Schema v{version}: {desc}")
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    # Dữ liệu cũ (trước khi bật khóa ngoại) có thể trỏ tới SV / phiên đã xóa: giữ nguyên, chỉ báo
+    orphans = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if orphans:
+        logger.warning(f"{len(orphans)} dòng điểm danh tham chiếu tới SV / phiên không còn tồn tại")
+    return current_version(conn)
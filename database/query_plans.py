@@ -0,0 +1,68 @@
+"""
+Query plan mong đợi của các đường xuất / báo cáo (EXPLAIN QUERY PLAN): mỗi truy vấn phải đi đúng index,
+không quét toàn bảng và không sắp xếp tạm (USE TEMP B-TREE). Dùng chung cho tests/test_db_migrations.py
+và công cụ dòng lệnh benchmarks/query_plans.py.
+"""
+import random
+import time
+
+from database.exporter import build_query
+
+def _export(expected, **filters):
+    sql, _, params = build_query(**filters)
+    return sql, params, expected
+
+# tên -> (SQL, tham số, chuỗi phải có trong plan)
+QUERIES = {
+    # Xuất dữ liệu (database/exporter.py): đi theo idx_logs_time -> đã sắp theo giờ, không sắp xếp tạm
+    "export_all": _export(["idx_logs_time"]),
+    # Lọc theo lớp: đọc đúng dòng của lớp qua index lớp -> SV, chỉ sắp xếp tập đã lọc (ALLOW_SORT)
+    "export_class": _export(["idx_students_class", "idx_logs_student"], classes=["K01"]),
+    "export_range": _export(["idx_logs_time"], date_from="2024-01-01", date_to="2024-01-31"),
+    "session_report": ("SELECT student_id, checkin_time FROM attendance_logs WHERE session_id = ? ORDER BY checkin_time",
+                       (1,), ["COVERING INDEX idx_logs_session_time"]),
+    "checked_in_ids": ("SELECT student_id FROM attendance_logs WHERE session_id = ?", (1,), ["idx_logs_session_time"]),
+    "student_history": ("SELECT session_id, checkin_time FROM attendance_logs WHERE student_id = ?",
+                        ("SV000001",), ["idx_logs_student"]),
+    "date_range": ("SELECT session_id, student_id FROM attendance_logs WHERE checkin_time BETWEEN ? AND ? "
+                   "ORDER BY checkin_time", ("2024-01-01", "2024-02-01"), ["idx_logs_time"]),
+    "roster_by_class": ("SELECT student_id FROM students WHERE class_name IN (?, ?)", ("K01", "K02"),
+                        ["idx_students_class"]),
+}
+
+# Truy vấn được phép sắp xếp tạm (tập dòng đã lọc nhỏ, rẻ hơn quét cả index thời gian)
+ALLOW_SORT = {"export_class"}
+
+def fill_sample_data(db, students=300, sessions=120, per_session=0.8):
+    """Dữ liệu tổng hợp: students SV, sessions buổi, mỗi buổi ~per_session SV điểm danh"""
+    rng = random.Random(0)
+    ids = [f"SV{i:06d}" for i in range(students)]
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)",
+                         [(sid, sid, f"K{i % 10:02d}") for i, sid in enumerate(ids)])
+        t0 = time.mktime((2024, 1, 1, 7, 0, 0, 0, 0, -1))
+        for k in range(sessions):
+            start = t0 + k * 86400
+            sid = conn.execute("INSERT INTO sessions (subject_name, start_time) VALUES (?, ?)",
+                               (f"Môn {k % 6}", time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start)))).lastrowid
+            rows = [(sid, s, "AI", time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + rng.randint(0, 900))))
+                    for s in ids if rng.random() < per_session]
+            conn.executemany("INSERT INTO attendance_logs (session_id, student_id, verification_method, checkin_time) "
+                             "VALUES (?, ?, ?, ?)", rows)
+
+def plan(conn, sql, params):
+    return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def check(conn, verbose=False):
+    """Trả về list (tên, lý do) của các truy vấn sai plan"""
+    failures = []
+    for name, (sql, params, expected) in QUERIES.items():
+        steps = plan(conn, sql, params)
+        text = " | ".join(steps)
+        problems = [f"thiếu '{e}'" for e in expected if e not in text]
+        problems += [f"'{s}'" for s in steps if s.startswith("SCAN") and "INDEX" not in s]  # Quét toàn bảng
+        if name not in ALLOW_SORT: problems += [f"'{s}'" for s in steps if "TEMP B-TREE" in s]
+        print(f"{'❌' if problems else '✅'} {name:<16} {text}")
+        if verbose and problems: print(f"   {', '.join(problems)}")
+        if problems: failures.append((name, problems))
+    return failures
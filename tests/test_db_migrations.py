@@ -0,0 +1,116 @@
+"""
+Migrations SQLite (database/migrations.py): DB tạo bởi init_db bản đầu phải được nâng lên bản mới nhất
+mà không mất dữ liệu, khóa ngoại ON DELETE CASCADE hoạt động, và các truy vấn xuất / báo cáo đi đúng index
+(database/query_plans.py).
+
+Chạy:  python -m pytest -q tests
+"""
+import sqlite3
+import pytest
+from app.config import Config
+from database.db_manager import DatabaseManager
+from database.query_plans import check, fill_sample_data
+
+# Schema do init_db bản đầu tạo (chưa có user_version, chưa có cột / index mới, khóa ngoại không CASCADE)
+LEGACY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS students (
+        student_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        class_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject_name TEXT NOT NULL,
+        start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        end_time TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS attendance_logs (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        student_id TEXT NOT NULL,
+        checkin_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        verification_method TEXT DEFAULT 'Auto',
+        FOREIGN KEY(session_id) REFERENCES sessions(session_id),
+        FOREIGN KEY(student_id) REFERENCES students(student_id),
+        UNIQUE(session_id, student_id)
+    );
+"""
+
+EXPECTED_INDEXES = {"idx_logs_student", "idx_logs_session_time", "idx_logs_time", "idx_students_class"}
+
+def _open(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "DB_PATH", str(tmp_path / "attendance.db"))
+    monkeypatch.setattr(Config, "EXPORT_DIR", str(tmp_path / "exports"))
+    return DatabaseManager()
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """DB cũ (user_version = 0) có sẵn dữ liệu"""
+    conn = sqlite3.connect(tmp_path / "attendance.db")
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)",
+                     [("SV01", "An", "K01"), ("SV02", "Bình", "K02")])
+    conn.execute("INSERT INTO sessions (subject_name) VALUES ('Toán')")
+    conn.executemany("INSERT INTO attendance_logs (log_id, session_id, student_id, verification_method) VALUES (?, 1, ?, 'AI')",
+                     [(7, "SV01"), (9, "SV02")])
+    conn.commit()
+    conn.close()
+    return tmp_path
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    manager = _open(tmp_path, monkeypatch)
+    yield manager
+    manager.pool.close_all()
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+
+def _indexes(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+def test_migrates_legacy_db(legacy_db, monkeypatch):
+    db = _open(legacy_db, monkeypatch)
+    conn = db.get_conn()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert "room_name" in _columns(conn, "sessions")
+    assert "confidence_score" in _columns(conn, "attendance_logs")
+    assert EXPECTED_INDEXES <= _indexes(conn)
+    # Dữ liệu được chép sang bảng mới, giữ nguyên log_id
+    rows = conn.execute("SELECT log_id, student_id, verification_method FROM attendance_logs ORDER BY log_id").fetchall()
+    assert [tuple(r) for r in rows] == [(7, "SV01", "AI"), (9, "SV02", "AI")]
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+
+    # Mở lại: không chạy lại bước nào
+    db.pool.close_all()
+    assert _open(legacy_db, monkeypatch).get_conn().execute("PRAGMA user_version").fetchone()[0] == 3
+
+def test_delete_cascades(legacy_db, monkeypatch):
+    db = _open(legacy_db, monkeypatch)
+    conn = db.get_conn()
+    assert db.delete_student("SV01")
+    assert db.get_checked_in_ids(1) == ["SV02"]
+    conn.execute("DELETE FROM sessions WHERE session_id = 1")
+    assert conn.execute("SELECT COUNT(*) FROM attendance_logs").fetchone()[0] == 0
+
+def test_mark_attendance_many_skips_foreign_key_errors(db):
+    db.add_student("SV01", "An", "K01")
+    session_id = db.create_session("Toán")
+    rows = [(session_id, "SV01", "AI", "2024-01-01 01:00:00"),
+            (session_id, "SV01", "AI", "2024-01-01 01:00:05"),  # Trùng trong phiên -> bỏ qua
+            (session_id, "SV99", "AI", "2024-01-01 01:00:10"),  # MSSV không tồn tại -> lỗi khóa ngoại
+            (session_id + 1, "SV01", "AI", "2024-01-01 01:00:15")]  # Phiên không tồn tại
+    assert db.mark_attendance_many(rows) == 1
+    assert db.get_checked_in_ids(session_id) == ["SV01"]
+    assert db.mark_attendance_many(rows[:1]) == 0
+
+@pytest.mark.parametrize("legacy", [False, True], ids=["new", "migrated"])
+def test_query_plans_use_indexes(tmp_path, monkeypatch, legacy):
+    if legacy:
+        conn = sqlite3.connect(tmp_path / "attendance.db")
+        conn.executescript(LEGACY_SCHEMA)
+        conn.close()
+    db = _open(tmp_path, monkeypatch)
+    fill_sample_data(db, students=200, sessions=30)
+    assert check(db.get_conn()) == []
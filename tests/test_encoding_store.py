@@ -0,0 +1,86 @@
+"""
+Kho vector append-only (database/encoding_store.py): migrate pickle lỗi không để lại kho hỏng,
+commit đầu tiên luôn tạo đủ file của thế hệ, compaction chạy ngoài khóa không làm mất thao tác thêm / xóa
+xảy ra trong lúc ghi thế hệ mới.
+
+Chạy:  python -m pytest -q tests
+"""
+import os
+import pickle
+import numpy as np
+import pytest
+from app.config import Config
+from database.encoding_store import EncodingStore
+
+@pytest.fixture(autouse=True)
+def _config(monkeypatch):
+    monkeypatch.setattr(Config, "STORE_FSYNC", False)
+    monkeypatch.setattr(Config, "STORE_COMPACT_MIN_DEAD", 10 ** 9)  # Chỉ compact khi test gọi
+
+def _vec(i):
+    return np.full(EncodingStore.DIM, i, dtype=np.float32)
+
+def _write_pickle(path, ids, encodings):
+    with open(path, "wb") as f:
+        pickle.dump({"ids": ids, "encodings": encodings}, f)
+
+def _contents(store):
+    ids, vectors = store.load()
+    return sorted((uid, float(v[0])) for uid, v in zip(ids, vectors))
+
+def test_failed_migration_leaves_store_closed(tmp_path):
+    pkl = str(tmp_path / "face_encodings.pkl")
+    _write_pickle(pkl, ["A", "B"], [_vec(1)])  # 2 id nhưng 1 vector
+    root = str(tmp_path / "gallery")
+
+    store = EncodingStore(root)
+    with pytest.raises(ValueError):
+        store.open(legacy_pickle=pkl)
+    # Kho chưa mở: không được ghi ra 1 thế hệ thiếu file
+    with pytest.raises(IOError):
+        store.append("C", _vec(3))
+    assert not os.path.exists(os.path.join(root, EncodingStore.MANIFEST))
+
+    # Mở lại: vẫn báo lỗi (không bỏ qua migrate), pickle cũ còn nguyên
+    with pytest.raises(ValueError):
+        EncodingStore(root).open(legacy_pickle=pkl)
+    assert os.path.exists(pkl)
+
+    # Sửa pickle -> lần mở sau migrate đủ dữ liệu
+    _write_pickle(pkl, ["A", "B"], [_vec(1), _vec(2)])
+    store = EncodingStore(root).open(legacy_pickle=pkl)
+    assert _contents(store) == [("A", 1.0), ("B", 2.0)]
+    assert os.path.exists(pkl + ".migrated")
+
+def test_first_commit_creates_all_generation_files(tmp_path):
+    root = str(tmp_path / "gallery")
+    store = EncodingStore(root).open(legacy_pickle="")
+    for name in os.listdir(root):
+        if name != EncodingStore.MANIFEST: os.remove(os.path.join(root, name))
+    store.append("A", _vec(1))
+    assert _contents(EncodingStore(root).open(legacy_pickle="")) == [("A", 1.0)]
+
+def test_compact_keeps_writes_made_during_rewrite(tmp_path):
+    root = str(tmp_path / "gallery")
+    store = EncodingStore(root).open(legacy_pickle="")
+    for i in range(10): store.append(f"U{i}", _vec(i))
+    for i in range(6): store.delete(f"U{i}")
+
+    # Ghi thế hệ mới chạy ngoài khóa: mô phỏng thêm / xóa / thay xen vào đúng lúc đó
+    write_files = store._write_generation_files
+    def racing(*args):
+        result = write_files(*args)
+        store.append("N1", _vec(100))
+        store.delete("U7")
+        store.replace("U8", _vec(108))
+        store.append("N2", _vec(101))
+        store.delete("N2")
+        return result
+    store._write_generation_files = racing
+    store.compact()
+
+    expected = [("N1", 100.0), ("U6", 6.0), ("U8", 108.0), ("U9", 9.0)]
+    assert store._manifest["generation"] == 1
+    assert _contents(store) == expected
+    assert _contents(EncodingStore(root).open(legacy_pickle="")) == expected
+    assert sorted(os.listdir(root)) == [EncodingStore.MANIFEST, "ids.1.txt", "tombstones.1.u32", "vectors.1.f32"]
@@ -0,0 +1,86 @@
+"""
+Sự kiện thay đổi gallery (core/gallery_service.py -> core/face_matcher.py): phát ngoài khóa ghi, matcher
+chỉ đăng ký khi có roster và sub-gallery của roster luôn khớp snapshot dù sự kiện tới lệch thứ tự.
+
+Chạy:  python -m pytest -q tests
+"""
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.config import Config
+from core.face_matcher import FaceMatcher
+from core.gallery_service import GalleryService
+from database.encoding_store import EncodingStore
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "STORE_FSYNC", False)
+    monkeypatch.setattr(Config, "INDEX_PATH", str(tmp_path / "index.npz"))
+    svc = GalleryService(store=EncodingStore(str(tmp_path / "gallery")))
+    svc.store.open(legacy_pickle="")
+    return svc
+
+def _vec(seed):
+    return np.random.default_rng(seed).normal(0, 0.1, 128).astype(np.float32)
+
+def _matcher(service, roster=None):
+    matcher = FaceMatcher(SimpleNamespace(service=service))
+    matcher.set_roster(roster)
+    return matcher
+
+def _assert_matches_snapshot(matcher):
+    sub = matcher._roster_gallery()
+    ids, matrix, version = matcher.service.snapshot(matcher.roster)
+    assert matcher._sub_version == version
+    got = dict(zip(sub.ids, sub.matrix))
+    assert sorted(got) == sorted(ids)
+    for uid, vec in zip(ids, matrix):
+        np.testing.assert_allclose(got[uid], vec)
+
+def test_matcher_subscribes_only_with_roster(service):
+    matcher = _matcher(service)
+    assert service._subscribers == []
+    service.enroll("A", _vec(0))
+    assert not matcher._pending
+
+    matcher.set_roster(["A"])
+    assert len(service._subscribers) == 1
+    matcher.set_roster(["A", "B"])
+    assert len(service._subscribers) == 1
+    matcher.close()
+    assert service._subscribers == []
+
+def test_subscriber_may_call_back_into_service(service):
+    seen = []
+    service.subscribe(lambda event: seen.append((event.version, service.snapshot()[2], service.search([_vec(0)]))))
+    worker = threading.Thread(target=service.enroll, args=("A", _vec(0)), daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive(), "subscriber gọi lại service bị deadlock"
+    assert seen[0][0] == seen[0][1] == service.version
+    assert seen[0][2][0][0][0] == "A"
+
+@pytest.mark.parametrize("deliver", ["reversed", "late"])
+def test_roster_survives_out_of_order_events(service, deliver):
+    matcher = _matcher(service, ["A", "B", "C"])
+    service.enroll("A", _vec(1))
+    _assert_matches_snapshot(matcher)
+
+    # Giữ sự kiện lại rồi giao lệch thứ tự như khi nhiều luồng ghi cùng phát sau khi nhả khóa
+    matcher.close()
+    events = []
+    service.subscribe(events.append)
+    service.enroll("B", _vec(2))
+    service.enroll("C", _vec(3))
+    service.remove("A")
+    service.enroll("A", _vec(4))
+    if deliver == "reversed":
+        matcher._pending.extend(reversed(events))
+        _assert_matches_snapshot(matcher)
+    else:
+        # Sự kiện sau tới trước -> hở version -> build lại; sự kiện tới muộn phải bị bỏ qua
+        matcher._pending.extend(events[1:])
+        _assert_matches_snapshot(matcher)
+        matcher._pending.append(events[0])
+        _assert_matches_snapshot(matcher)
@@ -1,4 +1,6 @@
+import time
 import cv2
+import numpy as np
 from PIL import Image, ImageTk
 
 def cv2_to_pil(frame, width=None, height=None):
@@ -14,4 +16,58 @@ def cv2_to_pil(frame, width=None, height=None):
         pil_image = pil_image.resize((width, height), Image.Resampling.LANCZOS)
         
     # Chuyển sang ImageTk
-    return ImageTk.PhotoImage(pil_image)
\ No newline at end of file
+    return ImageTk.PhotoImage(pil_image)
+
+
+class TkFrameRenderer:
+    """
+    Khung hiển thị camera kích thước cố định, vẽ lại tại chỗ (thay cho cv2_to_pil mỗi frame):
+    - canvas: buffer BGR dùng lại mãi; resize_into() resize thẳng vào đó (hoặc vào 1 ô của nó) bằng
+      cv2.resize INTER_AREA / INTER_LINEAR, box vẽ trực tiếp lên canvas
+    - show(): BGR -> RGBA vào buffer có sẵn (PIL Image trỏ thẳng vào buffer đó, không copy)
+      rồi paste vào 1 PhotoImage duy nhất -> không tạo ảnh Tk mới mỗi frame
+    - due() / delay_ms(): giới hạn tần số vẽ (max_fps) độc lập với FPS camera
+    Chỉ gọi trên luồng Tk.
+    """
+    def __init__(self, width, height, max_fps=30):
+        self.size = (width, height)
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self._rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        # Mode RGBA được PIL map thẳng lên buffer numpy (RGB thì PIL luôn copy sang 4 byte / điểm)
+        self._pil = Image.frombuffer("RGBA", self.size, self._rgba, "raw", "RGBA", 0, 1)
+        self.photo = ImageTk.PhotoImage("RGBA", self.size)
+        self.interval = 1.0 / max_fps
+        self._last = 0.0
+        self.frames = 0
+
+    def tile(self, i, cols, rows):
+        """View (không copy) của ô thứ i trong lưới cols x rows trên canvas"""
+        w, h = self.size[0] // cols, self.size[1] // rows
+        x, y = (i % cols) * w, (i // cols) * h
+        return self.canvas[y:y + h, x:x + w]
+
+    def resize_into(self, frame, dst=None):
+        """Resize frame vào dst (mặc định cả canvas), trả về dst để vẽ tiếp"""
+        dst = self.canvas if dst is None else dst
+        h, w = dst.shape[:2]
+        if frame.shape[:2] == (h, w):
+            np.copyto(dst, frame)
+        else:
+            # Thu nhỏ: INTER_AREA (không răng cưa); phóng to: INTER_LINEAR (rẻ hơn LANCZOS nhiều)
+            interp = cv2.INTER_AREA if frame.shape[1] > w else cv2.INTER_LINEAR
+            cv2.resize(frame, (w, h), dst=dst, interpolation=interp)
+        return dst
+
+    def due(self, now=None):
+        now = now or time.perf_counter()
+        return now - self._last >= self.interval
+
+    def delay_ms(self):
+        """Số ms tới lần vẽ kế tiếp được phép (dùng cho widget.after)"""
+        return max(1, int((self._last + self.interval - time.perf_counter()) * 1000))
+
+    def show(self):
+        cv2.cvtColor(self.canvas, cv2.COLOR_BGR2RGBA, dst=self._rgba)
+        self.photo.paste(self._pil)
+        self._last = time.perf_counter()
+        self.frames += 1
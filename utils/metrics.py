@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import deque
+import numpy as np
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class _Histogram:
+    """Cửa sổ trượt METRICS_WINDOW mẫu gần nhất (cho percentile) + tổng tích lũy (cho Prometheus)"""
+    __slots__ = ("values", "count", "total")
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, v):
+        self.values.append(v)
+        self.count += 1
+        self.total += v
+
+
+class _Span:
+    __slots__ = ("_hist", "_t0")
+
+    def __init__(self, hist):
+        self._hist = hist
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.add((time.perf_counter() - self._t0) * 1000.0)
+        return False
+
+
+class _NullSpan:
+    """Span rỗng khi tắt đo: không đọc đồng hồ, không cấp phát"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """
+    Đo hiệu năng nhẹ cho vòng điểm danh (bật bằng Config.METRICS_ENABLED):
+    - span("detect_ms"): thời gian 1 bước -> histogram trượt (p50 / p95 / p99)
+    - observe(): giá trị bất kỳ (số mặt / tick, tuổi frame...), inc(): bộ đếm, gauge(): giá trị tức thời
+    - maybe_report(): định kỳ ghi 1 dòng tóm tắt vào log + file Prometheus (text exposition)
+    Tắt đo: mọi hàm trả về ngay sau 1 lần đọc cờ Config.
+    """
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._hist = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._last_report = time.time()
+
+    @property
+    def enabled(self):
+        return Config.METRICS_ENABLED
+
+    def _histogram(self, name):
+        h = self._hist.get(name)
+        if h is None:
+            with self._lock:
+                h = self._hist.setdefault(name, _Histogram(Config.METRICS_WINDOW))
+        return h
+
+    # --- GHI ---
+    def span(self, name):
+        if not Config.METRICS_ENABLED: return NULL_SPAN
+        return _Span(self._histogram(name))
+
+    def observe(self, name, value):
+        if Config.METRICS_ENABLED: self._histogram(name).add(value)
+
+    def inc(self, name, n=1):
+        if not Config.METRICS_ENABLED: return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if Config.METRICS_ENABLED: self._gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self._hist, self._counters, self._gauges = {}, {}, {}
+
+    # --- ĐỌC ---
+    def snapshot(self):
+        """{"hist": {name: {count, mean, p50, p95, p99}}, "counters": {...}, "gauges": {...}}"""
+        with self._lock:
+            hists = list(self._hist.items())
+            counters, gauges = dict(self._counters), dict(self._gauges)
+        out = {}
+        for name, h in sorted(hists):
+            values = np.fromiter(list(h.values), dtype=np.float64)
+            if not len(values): continue
+            p50, p95, p99 = np.percentile(values, [q * 100 for q in self.QUANTILES])
+            out[name] = {"count": h.count, "sum": h.total, "mean": float(values.mean()),
+                         "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+        return {"hist": out, "counters": counters, "gauges": gauges}
+
+    def summary_lines(self, snap=None):
+        snap = snap or self.snapshot()
+        lines = [f"{name:<16} {h['p50']:7.1f} {h['p95']:7.1f} {h['p99']:7.1f}" for name, h in snap["hist"].items()]
+        extra = {**snap["counters"], **snap["gauges"]}
+        if extra: lines.append(" ".join(f"{k}={v}" for k, v in sorted(extra.items())))
+        return lines
+
+    def summary_line(self, snap=None):
+        snap = snap or self.snapshot()
+        parts = [f"{name} {h['p50']:.1f}/{h['p95']:.1f}/{h['p99']:.1f}" for name, h in snap["hist"].items()]
+        parts += [f"{k}={v}" for k, v in sorted({**snap["counters"], **snap["gauges"]}.items())]
+        return " | ".join(parts)
+
+    def prometheus_text(self, snap=None):
+        snap = snap or self.snapshot()
+        name_of = lambda n: "attendance_" + re.sub(r"[^a-zA-Z0-9_]", "_", n)
+        lines = []
+        for name, h in snap["hist"].items():
+            m = name_of(name)
+            lines.append(f"# TYPE {m} summary")
+            for q in self.QUANTILES:
+                lines.append(f'{m}{{quantile="{q}"}} {h[f"p{int(q * 100)}"]:.6g}')
+            lines.append(f"{m}_sum {h['sum']:.6g}")
+            lines.append(f"{m}_count {h['count']}")
+        for name, v in sorted(snap["counters"].items()):
+            lines += [f"# TYPE {name_of(name)}_total counter", f"{name_of(name)}_total {v}"]
+        for name, v in sorted(snap["gauges"].items()):
+            lines += [f"# TYPE {name_of(name)} gauge", f"{name_of(name)} {v}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, snap=None):
+        # Ghi file tạm rồi os.replace -> node_exporter (textfile collector) không đọc phải file ghi dở
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text(snap))
+        os.replace(tmp, path)
+
+    def maybe_report(self):
+        """Gọi thường xuyên từ vòng AI; chỉ thực sự báo cáo mỗi METRICS_REPORT_EVERY giây"""
+        if not Config.METRICS_ENABLED: return
+        now = time.time()
+        if now - self._last_report < Config.METRICS_REPORT_EVERY: return
+        self._last_report = now
+        snap = self.snapshot()
+        logger.info("📊 p50/p95/p99 ms: " + self.summary_line(snap))
+        if Config.METRICS_PROM_PATH:
+            try: self.write_prometheus(Config.METRICS_PROM_PATH, snap)
+            except Exception as e: logger.error(f"Ghi metrics thất bại: {e}")
+
+# Dùng chung toàn tiến trình
+metrics = Metrics()
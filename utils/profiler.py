@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import cProfile
+import pstats
+import threading
+import logging
+from collections import Counter
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class AIProfiler:
+    """
+    Profiler bật bằng cấu hình (AI_PROFILE / biến môi trường ATTENDANCE_PROFILE) cho các luồng AI-Worker:
+    - Lấy mẫu: 1 luồng nền đọc stack của luồng AI mỗi AI_PROFILE_INTERVAL giây (không chèn hook vào code
+      đang chạy -> chi phí rất thấp), ghi file collapsed stack (flamegraph.pl / speedscope đọc được)
+    - cProfile (AI_PROFILE_CPROFILE): mỗi luồng AI tự bật cProfile trong cửa sổ đo, gộp thành 1 file .prof
+    Cửa sổ đo: từ AI_PROFILE_DELAY giây sau khi bắt đầu phiên, kéo dài AI_PROFILE_SECONDS (0 = tới hết phiên).
+    File ghi vào PROFILE_DIR: profile_s<session>_<thời điểm>.collapsed / .prof
+
+    Lưu ý chế độ đa tiến trình: luồng AI-Worker chỉ điều phối, detect / encode chạy ở tiến trình worker
+    nên không nằm trong profile này.
+    """
+    def __init__(self, session_id=None, thread_prefix="AI-Worker"):
+        self.thread_prefix = thread_prefix
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(Config.PROFILE_DIR, f"profile_s{session_id if session_id is not None else 'x'}_{stamp}")
+        self.collapsed_path = base + ".collapsed"
+        self.prof_path = base + ".prof"
+
+        self.samples = Counter()
+        self._profiles = []   # cProfile.Profile của từng luồng AI
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._start = self._end = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._written = set()
+
+    # --- VÒNG ĐỜI ---
+    def start(self):
+        now = time.time()
+        self._start = now + Config.AI_PROFILE_DELAY
+        self._end = self._start + Config.AI_PROFILE_SECONDS if Config.AI_PROFILE_SECONDS > 0 else None
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True, name="AI-Profiler")
+        self._thread.start()
+        window = f"{Config.AI_PROFILE_SECONDS:.0f}s" if self._end else "tới hết phiên"
+        logger.info(f"🔬 Profiler luồng {self.thread_prefix}: bắt đầu sau {Config.AI_PROFILE_DELAY:.0f}s, đo {window}")
+        return self
+
+    def stop(self):
+        """Kết thúc đo (nếu chưa) và ghi file. Gọi sau khi các luồng AI đã dừng"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._write_samples()
+        self._write_cprofile()
+
+    def in_window(self, now=None):
+        now = now or time.time()
+        return self._start is not None and now >= self._start and (self._end is None or now < self._end)
+
+    # --- cProfile (gọi từ chính luồng AI) ---
+    def tick(self):
+        """Gọi mỗi vòng lặp của luồng AI: bật / tắt cProfile của luồng đó theo cửa sổ đo"""
+        if not Config.AI_PROFILE_CPROFILE: return
+        prof = getattr(self._local, "prof", None)
+        if prof is False: return  # Luồng này không bật được cProfile
+        enabled = getattr(self._local, "enabled", False)
+        active = self.in_window()
+        if active and not enabled:
+            new = prof is None
+            if new: prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                # Python 3.12+: mỗi tiến trình chỉ 1 cProfile hoạt động (và nó đã thấy mọi luồng)
+                self._local.prof = False; return
+            if new:
+                with self._lock: self._profiles.append(prof)
+            self._local.prof, self._local.enabled = prof, True
+        elif not active and enabled:
+            prof.disable()
+            self._local.enabled = False
+
+    def thread_exit(self):
+        """Gọi khi luồng AI thoát (cProfile phải được tắt trên đúng luồng đã bật)"""
+        if getattr(self._local, "enabled", False):
+            self._local.prof.disable()
+            self._local.enabled = False
+
+    # --- LẤY MẪU STACK ---
+    def _targets(self):
+        return {t.ident: t.name for t in threading.enumerate()
+                if t.name.startswith(self.thread_prefix) and t.ident is not None}
+
+    def _sample_loop(self):
+        targets, refreshed = {}, 0.0
+        while not self._stop.wait(Config.AI_PROFILE_INTERVAL):
+            now = time.time()
+            if self._end is not None and now >= self._end: break
+            if not self.in_window(now): continue
+            if now - refreshed > 1.0:
+                targets, refreshed = self._targets(), now
+            frames = sys._current_frames()
+            for ident, name in targets.items():
+                frame = frames.get(ident)
+                if frame is not None: self.samples[self._collapse(name, frame)] += 1
+        # Hết cửa sổ đo -> ghi ngay (phiên có thể còn chạy lâu); cProfile ghi khi luồng AI đã dừng
+        self._write_samples()
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        stack.append(thread_name)
+        return ";".join(reversed(stack))
+
+    # --- GHI FILE ---
+    def _once(self, kind):
+        with self._lock:
+            if kind in self._written: return False
+            self._written.add(kind)
+            return True
+
+    def _write_samples(self):
+        if not self.samples or not self._once("samples"): return
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        with open(self.collapsed_path, "w", encoding="utf-8") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        logger.info(f"🔬 Đã ghi {sum(self.samples.values())} mẫu stack: {self.collapsed_path}")
+
+    def _write_cprofile(self):
+        if not self._profiles or not self._once("cprofile"): return
+        stats = None
+        for prof in self._profiles:
+            try:
+                if stats is None: stats = pstats.Stats(prof)
+                else: stats.add(prof)
+            except TypeError:
+                pass  # Luồng chưa kịp chạy code nào trong cửa sổ đo
+        if stats is not None:
+            os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+            stats.dump_stats(self.prof_path)
+            logger.info(f"🔬 Đã ghi cProfile: {self.prof_path}")
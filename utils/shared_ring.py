@@ -0,0 +1,54 @@
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+
+class SharedFrameRing:
+    """
+    Vòng N slot frame BGR uint8 (kích thước cố định) trong multiprocessing.shared_memory.
+    Tiến trình chính ghi frame vào slot trống và chỉ gửi số slot qua Queue -> worker đọc trực tiếp, không pickle ảnh.
+    Slot được giữ (acquire) tới khi frame xử lý xong mới release -> worker không bao giờ đọc phải frame bị ghi đè.
+    """
+    def __init__(self, shape, slots, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = name is None
+        size = int(np.prod(self.shape)) * slots
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self._free = deque(range(slots))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def attach(cls, name, shape, slots):
+        """Mở lại ring đã tạo (phía worker)"""
+        return cls(shape, slots, name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # --- QUẢN LÝ SLOT (chỉ tiến trình chính) ---
+    def acquire(self):
+        """Lấy 1 slot trống, None nếu tất cả đang bận"""
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def write(self, slot, frame):
+        view = self._frames[slot]
+        np.copyto(view, frame)
+        return view
+
+    def view(self, slot):
+        return self._frames[slot]
+
+    def close(self):
+        self._frames = None  # Bỏ tham chiếu tới buffer trước khi đóng
+        self.shm.close()
+        if self.owner:
+            try: self.shm.unlink()
+            except FileNotFoundError: pass
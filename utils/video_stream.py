@@ -1,39 +1,215 @@
+import os
 import cv2
 import threading
-import queue
 import time
 
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class ImageSequenceCapture:
+    """Thư mục ảnh (sắp theo tên) đọc như 1 video - cùng giao diện tối thiểu với cv2.VideoCapture"""
+    def __init__(self, directory, fps=30.0):
+        self.files = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                            if f.lower().endswith(IMAGE_EXTS))
+        self.fps = fps
+        self.pos = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS: return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT: return len(self.files)
+        return 0.0
+
+    def grab(self):
+        if self.pos >= len(self.files): return False
+        self.pos += 1
+        return True
+
+    def read(self, image=None):
+        while self.pos < len(self.files):
+            frame = cv2.imread(self.files[self.pos])
+            self.pos += 1
+            if frame is not None: return True, frame
+        return False, None
+
+    def release(self):
+        self.files = []
+
+
+class FrameLease:
+    """
+    Frame mượn từ VideoStream (không copy): giữ (pin) buffer cho tới khi release().
+    frame là view chỉ đọc - cần vẽ / sửa thì resize hoặc copy ra mảng riêng.
+    Dùng được với `with stream.latest() as f: ...`
+    """
+    __slots__ = ("frame", "seq", "timestamp", "_stream", "_idx")
+
+    def __init__(self, stream, idx, frame, seq, timestamp):
+        self._stream, self._idx = stream, idx
+        self.frame, self.seq, self.timestamp = frame, seq, timestamp
+
+    def release(self):
+        if self._stream is not None:
+            self._stream._unpin(self._idx)
+            self._stream = None
+            self.frame = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
 class VideoStream:
-    def __init__(self, src=0, width=640, height=480):
+    """
+    Luồng camera với "slot frame mới nhất":
+    - Luồng capture đọc thẳng vào 1 vòng buffer cấp phát sẵn, luôn ghi đè bằng frame mới nhất (không ngủ chờ người đọc)
+    - Mỗi frame có seq tăng dần + thời điểm chụp; người đọc chờ được "frame mới hơn seq N"
+    - Người đọc mượn (lease) buffer thay vì copy; buffer đang bị mượn không bị ghi đè
+
+    src: chỉ số webcam / URL, file video, hoặc thư mục ảnh (phát lại không cần camera).
+    Với file / thư mục ảnh, pacing:
+    - "realtime": phát đúng FPS của file (như camera thật, người đọc chậm thì mất frame)
+    - "fast": nhanh nhất có thể nhưng không bỏ frame - frame tiếp theo chỉ được đọc khi
+      frame trước đã được mượn -> mỗi lần chạy xử lý đúng cùng 1 dãy frame (benchmark lặp lại được)
+    """
+    def __init__(self, src=0, width=640, height=480, buffers=4, pacing="realtime", fps=30.0):
         self.src = src
-        self.stream = cv2.VideoCapture(src)
-        self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-        self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-        
-        # Hàng đợi chỉ chứa 1 frame mới nhất để tránh lag (drop frame cũ)
-        self.q = queue.Queue(maxsize=1)
+        if pacing not in ("realtime", "fast"):
+            raise ValueError(f"pacing không hợp lệ: {pacing}")
+        self.is_file = isinstance(src, str) and os.path.exists(src)
+        if self.is_file and os.path.isdir(src):
+            self.stream = ImageSequenceCapture(src, fps)
+        else:
+            self.stream = cv2.VideoCapture(src)
+        if self.is_file:
+            if not self.stream.isOpened():
+                raise IOError(f"Không mở được nguồn {src}")
+            self.fps = self.stream.get(cv2.CAP_PROP_FPS) or fps
+        else:
+            self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.fps = fps
+        self.pacing = pacing if self.is_file else "realtime"
+
+        # Vòng buffer: 1 slot đang là "mới nhất" + các slot đang bị mượn + ít nhất 1 slot trống để ghi
+        self._buffers = [None] * max(3, buffers)
+        self._pins = [0] * len(self._buffers)
+        self._latest = None
+        self._seq = 0
+        self._ts = 0.0
+        self._taken = 0   # seq lớn nhất đã có người mượn (pacing "fast")
+        self._cond = threading.Condition()
+        self._thread = None
+        self.dropped = 0  # Số frame bỏ vì mọi buffer đều đang bị mượn
+        self.eof = False  # File / thư mục ảnh đã phát hết
         self.stopped = False
 
     def start(self):
-        t = threading.Thread(target=self.update, daemon=True)
-        t.start()
+        self._thread = threading.Thread(target=self.update, daemon=True, name="VideoStream")
+        self._thread.start()
         return self
 
+    @property
+    def seq(self):
+        return self._seq
+
+    def _free_buffer(self):
+        with self._cond:
+            n = len(self._buffers)
+            start = 0 if self._latest is None else self._latest + 1
+            for k in range(n):
+                i = (start + k) % n
+                if i != self._latest and self._pins[i] == 0:
+                    return i
+        return None
+
+    def _end(self):
+        self.eof = self.is_file
+        self.stop()
+
     def update(self):
+        t0, n = time.time(), 0
         while not self.stopped:
-            if not self.q.full():
-                ret, frame = self.stream.read()
-                if not ret:
-                    self.stop()
-                    return
-                self.q.put(frame)
-            else:
-                # Nếu queue đầy, chờ một chút để thread chính kịp lấy ra
-                time.sleep(0.01)
+            if self.pacing == "realtime" and self.is_file:
+                # Phát lại theo FPS của file: frame thứ n ra lúc t0 + n / fps
+                delay = t0 + n / self.fps - time.time()
+                if delay > 0: time.sleep(delay)
+            n += 1
+
+            idx = self._free_buffer()
+            if idx is None:
+                # Mọi buffer đang bị giữ -> vẫn lấy frame khỏi camera (giữ độ tươi) nhưng bỏ đi
+                if not self.stream.grab():
+                    self._end(); return
+                self.dropped += 1
+                continue
+
+            buf = self._buffers[idx]
+            # Đọc thẳng vào buffer có sẵn; lần đầu (hoặc đổi kích thước) OpenCV cấp buffer mới
+            ret, frame = self.stream.read(buf) if buf is not None else self.stream.read()
+            if not ret:
+                self._end()
+                return
+            if frame is not buf:
+                self._buffers[idx] = frame
+
+            with self._cond:
+                self._latest = idx
+                self._seq += 1
+                self._ts = time.time()
+                self._cond.notify_all()
+                if self.pacing == "fast":
+                    # Chờ người đọc mượn frame này rồi mới đọc frame kế (không bỏ frame nào)
+                    self._cond.wait_for(lambda: self._taken >= self._seq or self.stopped)
+
+    # --- PHÍA NGƯỜI ĐỌC ---
+    def _lease_latest(self):
+        # Gọi khi đang giữ self._cond
+        idx = self._latest
+        self._pins[idx] += 1
+        if self._seq > self._taken:
+            self._taken = self._seq
+            self._cond.notify_all()
+        view = self._buffers[idx].view()
+        view.flags.writeable = False
+        return FrameLease(self, idx, view, self._seq, self._ts)
+
+    def _unpin(self, idx):
+        with self._cond:
+            self._pins[idx] -= 1
+
+    def latest(self):
+        """Mượn frame mới nhất (không chờ). None nếu chưa có frame nào"""
+        with self._cond:
+            if self._latest is None: return None
+            return self._lease_latest()
+
+    def wait_for(self, after_seq, timeout=None):
+        """Chờ tới khi có frame với seq > after_seq rồi mượn nó. None nếu hết thời gian / camera dừng"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq or self.stopped, timeout):
+                return None
+            if self._seq <= after_seq or self._latest is None: return None
+            return self._lease_latest()
 
     def read(self):
-        return self.q.get() if not self.q.empty() else None
+        """Tương thích API cũ: bản copy của frame mới nhất (None nếu chưa có)"""
+        lease = self.latest()
+        if lease is None: return None
+        with lease:
+            return lease.frame.copy()
 
     def stop(self):
-        self.stopped = True
-        self.stream.release()
\ No newline at end of file
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+        # Chờ luồng capture thoát khỏi read() trước khi giải phóng camera
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self.stream.release()